@@ -0,0 +1,165 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import urllib.request
+from collections import namedtuple
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+Alert = namedtuple('Alert', ['recipient', 'subject', 'body'])
+
+
+class AlertDropped(Exception):
+    """
+    Raised for alerts which did not fit in the dispatcher queue.
+    """
+
+
+class ConsoleAlertBackend:
+    """
+    Writes alerts to the standard output.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def send(self, alert):
+        stream = self.stream or sys.stdout
+        stream.write('To: {}\n{}\n{}\n'.format(alert.recipient, alert.subject, alert.body))
+        stream.flush()
+
+
+class SMTPAlertBackend:
+    """
+    Mails alerts through Django's email settings.
+    """
+
+    def __init__(self, from_email=None):
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+
+    def send(self, alert):
+        send_mail(alert.subject, alert.body, self.from_email, [alert.recipient])
+
+
+class WebhookAlertBackend:
+    """
+    Posts alerts as JSON to a webhook.
+    """
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        data = json.dumps(alert._asdict()).encode('utf-8')
+        request = urllib.request.Request(self.url, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def get_alert_backend():
+    options = getattr(settings, 'DISCREPANCY_ALERTS', {})
+    backend_class = import_string(options.get('BACKEND', 'api.alerts.SMTPAlertBackend'))
+    return backend_class(**options.get('OPTIONS', {}))
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts through a backend from a pool of threads fed by
+    a bounded queue. Submitting blocks while the queue is full, up to
+    `enqueue_timeout` seconds, after which the alert is dropped.
+    """
+
+    def __init__(self, backend, workers=4, max_queue_size=1000, enqueue_timeout=5.0):
+        self.backend = backend
+        self.enqueue_timeout = enqueue_timeout
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def submit(self, alert, callback):
+        """
+        Queues the alert for delivery. The callback is called with the
+        alert and the error, or None once the alert is delivered.
+        Returns whether the alert was queued.
+        """
+        try:
+            self._queue.put((alert, callback), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('dropped')
+            callback(alert, AlertDropped('The alert queue is full.'))
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+
+            alert, callback = job
+            error = None
+            try:
+                self.backend.send(alert)
+                self._count('sent')
+            except Exception as e:
+                logger.exception('Failed to deliver alert to %s', alert.recipient)
+                self._count('failed')
+                error = e
+
+            try:
+                callback(alert, error)
+            except Exception:
+                logger.exception('Alert callback failed')
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        Waits until every queued alert has been handled.
+        """
+        self._queue.join()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+            }
+
+
+def create_alert_dispatcher():
+    options = getattr(settings, 'DISCREPANCY_ALERTS', {})
+    return AlertDispatcher(
+        get_alert_backend(),
+        workers=options.get('WORKERS', 4),
+        max_queue_size=options.get('MAX_QUEUE_SIZE', 1000),
+        enqueue_timeout=options.get('ENQUEUE_TIMEOUT', 5.0),
+    )
@@ -5,4 +5,6 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        import api.signals
\ No newline at end of file
+        import api.checks
+        import api.db
+        import api.signals
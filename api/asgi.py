@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from .db import check_persistent_connections
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class ReadPathASGIHandler(ASGIHandler):
+    """
+    ASGI handler which serves the read-only polling endpoints from a
+    dedicated pool of `DB_CONCURRENCY` threads, each holding at most
+    one database connection. Waiting requests only cost a future on
+    the event loop; once `MAX_WAITING` requests are queued or running,
+    new ones are shed with 503 instead of piling up. Other requests are
+    run in the threads Django runs them in. Either way the thread
+    closes and checks its own connection. Streaming responses, e.g. the exports,
+    are iterated in a thread of their own instead of the event loop.
+    """
+
+    def __init__(self):
+        super().__init__()
+        options = getattr(settings, 'ASGI_READ_PATH', {})
+        self.read_url_names = set(options.get('URL_NAMES', []))
+        self.max_waiting = options.get('MAX_WAITING', 1000)
+        self.read_executor = ThreadPoolExecutor(
+            max_workers=options.get('DB_CONCURRENCY', 10), thread_name_prefix='read-path')
+        self.waiting = 0
+
+    def is_read_path(self, request):
+        if request.method not in READ_METHODS:
+            return False
+        try:
+            return resolve(request.path_info).url_name in self.read_url_names
+        except Resolver404:
+            return False
+
+    def get_sync_response(self, request):
+        # the request signals run in other threads, so the thread serving
+        # the request drops and checks its connection itself
+        close_old_connections()
+        check_persistent_connections()
+        try:
+            return super().get_response(request)
+        finally:
+            close_old_connections()
+
+    async def get_response(self, request):
+        if not self.is_read_path(request):
+            return await sync_to_async(self.get_sync_response)(request)
+
+        if self.waiting >= self.max_waiting:
+            logger.warning('Shed %s %s, %d requests are waiting for the database',
+                           request.method, request.path, self.waiting)
+            response = HttpResponse('Too many requests are waiting, retry later.', status=503,
+                                    content_type='text/plain')
+            response['Retry-After'] = '1'
+            return response
+
+        self.waiting += 1
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.read_executor, self.get_sync_response, request)
+        finally:
+            self.waiting -= 1
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        # Django 3.0 iterates streaming responses on the event loop, where
+        # their queries raise SynchronousOnlyOperation. One thread reads
+        # every part, so the rows come through one connection and cursor.
+        loop = asyncio.get_event_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='streaming-response')
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': response_headers(response),
+            })
+            parts = iter(response)
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, None)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(executor, close_streaming_response, response)
+            executor.shutdown(wait=False)
+
+
+def response_headers(response):
+    """
+    Returns the headers and cookies of the response as ASGI headers,
+    as Django's ASGIHandler.send_response encodes them.
+    """
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+def close_streaming_response(response):
+    # the thread ends with the response, so its connection is closed too
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+def get_asgi_application():
+    import django
+    django.setup(set_prefix=False)
+    return ReadPathASGIHandler()
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from .cache import CacheStats, LRUCache
+
+TOKEN_AUTH_CACHE = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+TOKEN_CACHE_KEY = 'api:token:{}'
+
+token_auth_cache_stats = CacheStats('token_auth')
+local_token_cache = LRUCache(
+    max_size=TOKEN_AUTH_CACHE.get('MAX_SIZE', 10000),
+    ttl=TOKEN_AUTH_CACHE.get('TTL', 60),
+)
+
+
+def shared_token_cache():
+    alias = TOKEN_AUTH_CACHE.get('SHARED_CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+# the fields the permissions need; the others, e.g. the password hash, are
+# never cached and are loaded from the database when a view reads them
+CACHED_USER_FIELDS = ['id', 'username', 'is_active', 'is_authority']
+
+
+def cache_entry(token):
+    """
+    Returns a plain, picklable copy of the token and the cached fields
+    of its user.
+    """
+    user = token.user
+    return (token.created, tuple(getattr(user, name) for name in CACHED_USER_FIELDS))
+
+
+def from_cache_entry(key, entry):
+    """
+    Rebuilds fresh token and user instances from a cache entry, so
+    that requests never share a mutable user object.
+    """
+    created, user_values = entry
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, CACHED_USER_FIELDS, user_values)
+    token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id', 'created'], [key, user.pk, created])
+    token.user = user
+    return user, token
+
+
+def create_tokens(users, batch_size=1000):
+    """
+    Creates an API token for every user in bulk. Returns the keys
+    keyed by user id.
+    """
+    tokens = [Token(user=user) for user in users]
+    for token in tokens:
+        # bulk_create skips Token.save(), which generates the key
+        token.key = token.generate_key()
+    Token.objects.bulk_create(tokens, batch_size=batch_size)
+    return {token.user_id: token.key for token in tokens}
+
+
+def invalidate_token(key):
+    local_token_cache.delete(key)
+    shared_cache = shared_token_cache()
+    if shared_cache is not None:
+        shared_cache.delete(TOKEN_CACHE_KEY.format(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which caches the token and its user in a
+    bounded in-process tier and, when configured, a shared cache tier.
+    Entries are invalidated by signals when the token is deleted or
+    the user changes, and expire after a short TTL in other processes.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = local_token_cache.get(key)
+        if entry is None:
+            shared_cache = shared_token_cache()
+            if shared_cache is not None:
+                entry = shared_cache.get(TOKEN_CACHE_KEY.format(key))
+                if entry is not None:
+                    local_token_cache.set(key, entry)
+
+        if entry is not None:
+            token_auth_cache_stats.hit()
+            return from_cache_entry(key, entry)
+
+        token_auth_cache_stats.miss()
+        user, token = super().authenticate_credentials(key)
+
+        entry = cache_entry(token)
+        local_token_cache.set(key, entry)
+        shared_cache = shared_token_cache()
+        if shared_cache is not None:
+            shared_cache.set(TOKEN_CACHE_KEY.format(key), entry, TOKEN_AUTH_CACHE.get('SHARED_TTL', 300))
+        return user, token
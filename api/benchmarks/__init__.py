@@ -0,0 +1,4 @@
+"""
+Seeds a throwaway database at several scales and times the report
+endpoints against it. Run it with `python manage.py benchmark`.
+"""
@@ -0,0 +1,50 @@
+"""
+Helpers shared by the benchmark management commands, which run against
+a throwaway copy of the database and write their results as JSON.
+"""
+import json
+import platform
+from collections import OrderedDict
+from contextlib import contextmanager
+import django
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """
+    Points the default connection at its test database for the duration
+    of the block, so a benchmark never writes to the configured one.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def write_results(command, output, results, database=None, **fields):
+    """
+    Writes the results with the versions they were measured with to the
+    file named `output`, or to the output of the command when it is `-`.
+    """
+    data = OrderedDict([('run_on', timezone.now().isoformat())])
+    if database is not None:
+        data['database'] = database
+    data['python'] = platform.python_version()
+    data['django'] = django.get_version()
+    data.update(fields)
+    data['results'] = results
+
+    content = json.dumps(data, indent=2)
+    if output == '-':
+        command.stdout.write(content)
+    else:
+        with open(output, 'w') as f:
+            f.write(content + '\n')
+        command.stdout.write(command.style.SUCCESS('Wrote the results to {}'.format(output)))
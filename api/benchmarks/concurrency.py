@@ -0,0 +1,136 @@
+"""
+Holds many keep-alive connections open against a running server and
+measures the throughput and latency of a polling endpoint, to compare
+a WSGI and an ASGI deployment. Run it with
+`python manage.py benchmark_concurrency`.
+"""
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+from .runner import percentile
+
+
+class Target:
+    """
+    A server to load, written as NAME=URL, e.g. asgi=http://127.0.0.1:8001.
+    """
+
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = port
+
+    @classmethod
+    def parse(cls, value):
+        name, sep, url = value.partition('=')
+        parts = urlsplit(url)
+        if not sep or not name or parts.scheme != 'http' or not parts.hostname:
+            raise ValueError('{} is not a valid target, expected NAME=http://HOST:PORT'.format(value))
+        return cls(name, parts.hostname, parts.port or 80)
+
+    def __str__(self):
+        return '{}=http://{}:{}'.format(self.name, self.host, self.port)
+
+
+def build_request(target, path, token=None):
+    lines = ['GET {} HTTP/1.1'.format(path), 'Host: {}:{}'.format(target.host, target.port), 'Accept: application/json']
+    if token:
+        lines.append('Authorization: Token {}'.format(token))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def read_response(reader):
+    """
+    Reads one response and returns its status and whether the server
+    keeps the connection open.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('The server closed the connection')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+async def poll(target, request, deadline, latencies, statuses):
+    """
+    Sends the request over one connection until the deadline,
+    reconnecting whenever the server closes it.
+    """
+    writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(target.host, target.port)
+            started = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            statuses['error'] += 1
+            keep_alive = False
+            # do not spin on a server which refuses connections
+            await asyncio.sleep(0.1)
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(target, path, token, connections, duration):
+    request = build_request(target, path, token)
+    latencies = []
+    statuses = Counter()
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[poll(target, request, deadline, latencies, statuses) for _ in range(connections)])
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = [latency * 1000 for latency in latencies] or [0.0]
+    return OrderedDict([
+        ('target', str(target)),
+        ('connections', connections),
+        ('seconds', round(elapsed, 3)),
+        ('requests', len(latencies)),
+        ('rps', round(statuses[200] / elapsed, 1)),
+        ('p50_ms', round(percentile(latencies_ms, 50), 3)),
+        ('p99_ms', round(percentile(latencies_ms, 99), 3)),
+        ('errors', sum(count for status, count in statuses.items() if status != 200)),
+        ('statuses', OrderedDict((str(status), count) for status, count in sorted(statuses.items(), key=str))),
+    ])
+
+
+def run_load_test(targets, path, token=None, connections=1000, duration=30):
+    """
+    Loads every target in turn and returns one result per target. The
+    requests per second only count successful responses; shed (503)
+    and failed requests are reported as errors.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return [loop.run_until_complete(load(target, path, token, connections, duration)) for target in targets]
+    finally:
+        loop.close()
@@ -0,0 +1,95 @@
+"""
+Times the same request with a new database connection per request
+and with a persistent connection, to show the latency the connection
+setup adds. Run it with `python manage.py benchmark_connections`.
+"""
+import statistics
+import time
+from collections import OrderedDict
+from io import BytesIO
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+from api.db import connection_stats
+from api.models import District
+from .runner import percentile
+
+
+def wsgi_get(handler, path, query_string=''):
+    """
+    Sends a GET through the WSGI handler like a server would, so the
+    request signals open and close connections as in production. The
+    test client disconnects them.
+    """
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'testserver',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        # fires request_finished, which closes the expired connections
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+def set_conn_max_age(max_age):
+    for connection in connections.all():
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+
+def time_requests(handler, path, requests, warmup):
+    # a new query string per request misses the response cache, so
+    # every request reads the database
+    for i in range(warmup):
+        wsgi_get(handler, path, 'warmup={}'.format(i))
+    connection_stats.reset()
+    timings = []
+    for i in range(requests):
+        started = time.perf_counter()
+        status = wsgi_get(handler, path, 'request={}'.format(i))
+        timings.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            raise RuntimeError('GET {} answered {}'.format(path, status))
+    stats = connection_stats.as_dict().get(DEFAULT_DB_ALIAS, {})
+    return OrderedDict([
+        ('requests', requests),
+        ('connections_opened', stats.get('opened', 0)),
+        ('median_ms', round(statistics.median(timings), 3)),
+        ('p95_ms', round(percentile(timings, 95), 3)),
+        ('max_ms', round(max(timings), 3)),
+    ])
+
+
+def run_connection_benchmark(requests=200, warmup=5, conn_max_age=60):
+    """
+    Returns the timings of the district list with `CONN_MAX_AGE` 0,
+    which connects on every request, and with `conn_max_age`, and the
+    median time saved per request.
+    """
+    District.objects.bulk_create([District(name='district{}'.format(d)) for d in range(10)])
+    handler = WSGIHandler()
+    path = reverse('district_list')
+    old_max_ages = [(connection, connection.settings_dict['CONN_MAX_AGE']) for connection in connections.all()]
+
+    results = OrderedDict()
+    try:
+        for name, max_age in (('per_request', 0), ('persistent', conn_max_age)):
+            set_conn_max_age(max_age)
+            results[name] = time_requests(handler, path, requests, warmup)
+    finally:
+        for connection, max_age in old_max_ages:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+    results['saved_ms_per_request'] = round(results['per_request']['median_ms'] - results['persistent']['median_ms'], 3)
+    return results
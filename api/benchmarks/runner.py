@@ -0,0 +1,157 @@
+import statistics
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from api.authentication import create_tokens, local_token_cache
+from api.cache import warm_schedule_cache
+from api.datagen import DataGenerator, START_DATE
+from api.models import Report
+
+ENDPOINTS = [
+    'school_report_create',
+    'estimate_report_list_create',
+    'authority_report_list',
+    'authority_report_discrepancy_list',
+]
+
+
+class Scale:
+    """
+    The size of a seeded database, written as
+    DISTRICTSxSCHOOLS_PER_DISTRICTxDAYS, e.g. 4x100x30.
+    """
+
+    def __init__(self, districts, schools_per_district, days):
+        self.districts = districts
+        self.schools_per_district = schools_per_district
+        self.days = days
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            districts, schools_per_district, days = (int(part) for part in value.lower().split('x'))
+        except ValueError:
+            raise ValueError('{} is not a valid scale, expected DISTRICTSxSCHOOLSxDAYS'.format(value))
+        if min(districts, schools_per_district, days) < 1:
+            raise ValueError('{} is not a valid scale, every part must be positive'.format(value))
+        return cls(districts, schools_per_district, days)
+
+    def __str__(self):
+        return '{}x{}x{}'.format(self.districts, self.schools_per_district, self.days)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(samples):
+    timings = [duration for duration, _ in samples]
+    queries = [count for _, count in samples]
+    return OrderedDict([
+        ('requests', len(samples)),
+        ('queries', queries[-1]),
+        ('max_queries', max(queries)),
+        ('min_ms', round(min(timings), 3)),
+        ('median_ms', round(statistics.median(timings), 3)),
+        ('p95_ms', round(percentile(timings, 95), 3)),
+        ('max_ms', round(max(timings), 3)),
+    ])
+
+
+def measure(send, expected_status):
+    """
+    Sends one request and returns its duration in milliseconds and
+    the number of queries it made.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = send()
+        duration = (time.perf_counter() - started) * 1000
+    if response.status_code != expected_status:
+        raise RuntimeError('{} returned {}: {}'.format(
+            response.request['PATH_INFO'], response.status_code, response.content[:200]))
+    return duration, len(queries)
+
+
+def reset_database():
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+    local_token_cache.clear()
+
+
+def run_scale(scale, repeat=20, warmup=2, seed=0):
+    """
+    Seeds the database at the given scale and times every endpoint.
+    Returns the seeded row counts and the timings of each endpoint,
+    leaving out the warmup requests.
+    """
+    reset_database()
+    generator = DataGenerator(seed=seed)
+    seeded = time.perf_counter()
+    authorities, schools = generator.create_schools(scale.districts, scale.districts * scale.schools_per_district)
+    generator.create_days(schools, START_DATE, scale.days)
+    seed_seconds = time.perf_counter() - seeded
+
+    # reports are created for the days after the seeded ones, so every
+    # request is new and links to an estimate like in production
+    district_schools = [school for school in schools if school.district_id == authorities[0].district_id]
+    requests = repeat + warmup
+    first_day = START_DATE + timedelta(days=scale.days)
+    report_days = [first_day + timedelta(days=i) for i in range(-(-requests // len(district_schools)))]
+    for for_date in report_days:
+        generator.create_day(district_schools, for_date, with_actuals=False)
+
+    tokens = create_tokens([authorities[0].user] + [school.user for school in district_schools])
+    warm_schedule_cache()
+
+    def client_for(user_id):
+        return Client(HTTP_AUTHORIZATION='Token {}'.format(tokens[user_id]))
+
+    authority_client = client_for(authorities[0].pk)
+    school_clients = [client_for(school.pk) for school in district_schools]
+    anonymous_client = Client()
+
+    def create_report(i):
+        for_date = report_days[i // len(school_clients)]
+        return school_clients[i % len(school_clients)].post(
+            reverse('school_report_create'),
+            {'student_count': 40, 'for_date': for_date.isoformat()},
+            content_type='application/json',
+        )
+
+    scenarios = OrderedDict([
+        ('school_report_create', (create_report, 201)),
+        ('estimate_report_list_create',
+         (lambda i: anonymous_client.get(reverse('estimate_report_list_create')), 200)),
+        ('authority_report_list',
+         (lambda i: authority_client.get(reverse('authority_report_list')), 200)),
+        ('authority_report_discrepancy_list',
+         (lambda i: authority_client.get(reverse('authority_report_discrepancy_list')), 200)),
+    ])
+
+    endpoints = OrderedDict()
+    for name, (send, expected_status) in scenarios.items():
+        samples = [measure(lambda: send(i), expected_status) for i in range(requests)]
+        endpoints[name] = summarize(samples[warmup:])
+
+    return OrderedDict([
+        ('scale', str(scale)),
+        ('districts', scale.districts),
+        ('schools', len(schools)),
+        ('days', scale.days),
+        ('reports', Report.objects.count()),
+        ('seed_seconds', round(seed_seconds, 3)),
+        ('endpoints', endpoints),
+    ])
+
+
+def run_benchmark(scales, repeat=20, warmup=2, seed=0):
+    return [run_scale(scale, repeat=repeat, warmup=warmup, seed=seed) for scale in scales]
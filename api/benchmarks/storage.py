@@ -0,0 +1,130 @@
+"""
+Measures the size of the report item and schedule tables with the item
+names stored in every row and after the migrations replaced them by
+menu item ids. Run it with `python manage.py benchmark_storage`.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+from django.db import connection as default_connection
+from django.db.migrations.executor import MigrationExecutor
+from api.datagen import MENU, START_DATE
+
+# the last migration storing the item names in the rows
+NAMES_MIGRATION = ('api', '0014_partition_reports')
+TABLES = ['api_reportitem', 'api_schedule', 'api_menuitem']
+
+
+def table_size(cursor, table):
+    """
+    Returns the bytes the table takes on disk with its indexes, and
+    with its partitions on PostgreSQL, 0 when it does not exist.
+    """
+    vendor = cursor.db.vendor
+    if vendor == 'postgresql':
+        # a partitioned table takes no space itself, only its partitions do
+        cursor.execute(
+            'SELECT CASE WHEN relkind = %s THEN ('
+            'SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(pg_class.oid)'
+            ') ELSE pg_total_relation_size(pg_class.oid) END '
+            'FROM pg_class WHERE oid = to_regclass(%s)', ['p', table])
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    elif vendor == 'sqlite':
+        # needs SQLite built with the dbstat table, as Python's usually is
+        cursor.execute(
+            'SELECT COALESCE(SUM(pgsize), 0) FROM dbstat '
+            'WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)', [table])
+    else:
+        raise NotImplementedError('Table sizes are not measured on {}'.format(vendor))
+    return int(cursor.fetchone()[0])
+
+
+def table_sizes(connection):
+    """
+    Returns the size of every table in `TABLES` after compacting them,
+    so that the space of the dropped columns and of the rows the
+    conversion updated is not counted.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for table in TABLES:
+                cursor.execute('SELECT to_regclass(%s)', [table])
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute('VACUUM FULL {}'.format(connection.ops.quote_name(table)))
+        elif connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        return OrderedDict((table, table_size(cursor, table)) for table in TABLES)
+
+
+def migrate(connection, targets):
+    executor = MigrationExecutor(connection)
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+def seed_reports(apps, schools, days, items_per_report):
+    """
+    Creates a district with a menu for every day of the week and the
+    reports of its schools, using the models of the migration state,
+    and returns the number of report items.
+    """
+    CustomUser = apps.get_model('api', 'CustomUser')
+    District = apps.get_model('api', 'District')
+    School = apps.get_model('api', 'School')
+    Schedule = apps.get_model('api', 'Schedule')
+    Report = apps.get_model('api', 'Report')
+    ReportItem = apps.get_model('api', 'ReportItem')
+
+    district = District.objects.create(name='storage')
+    menus = {day: [MENU[(day + i) % len(MENU)] for i in range(items_per_report)] for day in range(7)}
+    Schedule.objects.bulk_create([
+        Schedule(district=district, day=day, item=item) for day, items in menus.items() for item in items
+    ])
+
+    usernames = ['storage{}'.format(s) for s in range(schools)]
+    CustomUser.objects.bulk_create([
+        CustomUser(username=username, email='{}@example.com'.format(username), password='!')
+        for username in usernames
+    ])
+    user_ids = list(CustomUser.objects.filter(username__in=usernames).values_list('id', flat=True))
+    School.objects.bulk_create([
+        School(user_id=user_id, name='School {}'.format(user_id), district=district) for user_id in user_ids
+    ])
+
+    dates = [START_DATE + timedelta(days=day) for day in range(days)]
+    Report.objects.bulk_create([
+        Report(school_id=user_id, student_count=40, for_date=for_date, added_by_school=True)
+        for user_id in user_ids for for_date in dates
+    ])
+    items = ReportItem.objects.bulk_create([
+        ReportItem(report_id=report_id, for_date=for_date, item=item)
+        for report_id, for_date in Report.objects.values_list('id', 'for_date').iterator()
+        for item in menus[for_date.weekday()]
+    ])
+    return len(items)
+
+
+def run_storage_benchmark(schools=100, days=100, items_per_report=3, connection=default_connection):
+    """
+    Migrates a database back to the item names, seeds it, measures the
+    tables, then migrates it forward, which converts the names to menu
+    item ids, and measures them again. Returns the sizes and the bytes
+    saved per report item.
+    """
+    executor = MigrationExecutor(connection)
+    latest = executor.loader.graph.leaf_nodes(NAMES_MIGRATION[0])
+
+    apps = migrate(connection, [NAMES_MIGRATION])
+    report_items = seed_reports(apps, schools, days, items_per_report)
+    before = table_sizes(connection)
+    migrate(connection, latest)
+    after = table_sizes(connection)
+
+    saved = sum(before.values()) - sum(after.values())
+    return OrderedDict([
+        ('report_items', report_items),
+        ('before', before),
+        ('after', after),
+        ('saved_bytes', saved),
+        ('saved_bytes_per_report_item', round(saved / report_items, 2) if report_items else 0.0),
+    ])
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from .checks import is_shared_cache
+from .conditional import get_versions, model_scope
+from .models import District, Schedule
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    """
+    Thread safe hit and miss counters of an in-process cache.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class LRUCache:
+    """
+    Thread safe in-process cache holding at most `max_size` entries,
+    each for at most `ttl` seconds. The least recently used entry is
+    evicted first.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+schedule_cache_stats = CacheStats('schedule')
+
+# holds menu item ids, the older `api:schedule` keys held their names
+SCHEDULE_CACHE_KEY = 'api:schedule_items:{}:{}'
+SCHEDULE_CACHE_TIMEOUT = getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 60 * 60)
+
+
+def schedule_cache_key(district_id, day):
+    return SCHEDULE_CACHE_KEY.format(district_id, day)
+
+
+def get_schedule_items(district_id, day):
+    """
+    Returns the ids of the menu items of a district for a day of the
+    week, reading the schedule table only on a cache miss.
+    """
+    key = schedule_cache_key(district_id, day)
+    items = cache.get(key)
+    if items is not None:
+        schedule_cache_stats.hit()
+        return items
+
+    schedule_cache_stats.miss()
+    items = list(Schedule.objects.filter(district_id=district_id, day=day).values_list('item_id', flat=True))
+    cache.set(key, items, SCHEDULE_CACHE_TIMEOUT)
+    return items
+
+
+def invalidate_schedule_items(district_id, day):
+    cache.delete(schedule_cache_key(district_id, day))
+
+
+def warm_schedule_cache():
+    """
+    Loads the schedules of every district for every day of the
+    week into the cache with one query per table.
+    """
+    try:
+        schedules = defaultdict(list)
+        for district_id, day, item_id in Schedule.objects.values_list('district_id', 'day', 'item_id'):
+            schedules[(district_id, day)].append(item_id)
+        district_ids = list(District.objects.values_list('id', flat=True))
+    except DatabaseError:
+        # the tables may not exist yet, e.g. before the first migrate
+        logger.warning('Skipped warming the schedule cache, the database is not ready')
+        return
+
+    for district_id in district_ids:
+        for day in range(7):
+            schedules.setdefault((district_id, day), [])
+    cache.set_many(
+        {schedule_cache_key(district_id, day): items for (district_id, day), items in schedules.items()},
+        SCHEDULE_CACHE_TIMEOUT,
+    )
+
+
+def warm_schedule_cache_on_startup():
+    """
+    Warms the schedule cache when `SCHEDULE_CACHE_WARM_ON_STARTUP` is
+    set. The WSGI and ASGI entry points call it, so management commands
+    and tests never read the configured database on startup.
+    """
+    if not getattr(settings, 'SCHEDULE_CACHE_WARM_ON_STARTUP', False):
+        return
+
+    def warm():
+        try:
+            warm_schedule_cache()
+        finally:
+            connections.close_all()
+
+    # uvicorn imports the application inside its event loop, where
+    # Django refuses to query, so the queries run in their own thread
+    thread = threading.Thread(target=warm, name='schedule-cache-warmup')
+    thread.start()
+    thread.join()
+
+
+response_cache_stats = CacheStats('response')
+
+RESPONSE_CACHE_KEY = 'api:response:{}:{}'
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60)
+RESPONSE_CACHE_LOCAL_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_LOCAL_TIMEOUT', 5)
+# headers stored along with the rendered content
+CACHED_HEADERS = ['ETag', 'Last-Modified', 'Cache-Control', 'Vary']
+
+
+def response_cache_timeout():
+    """
+    Returns how long a rendered response is cached. With a cache per
+    process, a worker which missed a change keeps its old versions,
+    so its responses are only kept for a few seconds.
+    """
+    if is_shared_cache():
+        return RESPONSE_CACHE_TIMEOUT
+    return min(RESPONSE_CACHE_TIMEOUT, RESPONSE_CACHE_LOCAL_TIMEOUT)
+
+
+class CachedResponseMixin:
+    """
+    Caches the rendered content of successful GET responses per URL,
+    query string, format and user. The key holds the versions of
+    `cache_models`, so saving or deleting any of their rows, which
+    bumps the versions through signals, invalidates the responses.
+    Authentication and permissions still run on every request.
+    """
+    cache_models = []
+
+    def get_response_cache_key(self, request):
+        versions = get_versions([model_scope(model) for model in self.cache_models])
+        parts = [request.get_full_path(), request.user.pk, request.accepted_renderer.format]
+        return RESPONSE_CACHE_KEY.format(
+            '.'.join(str(version) for version in versions),
+            hashlib.sha1(repr(parts).encode('utf-8')).hexdigest(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response_cache_stats.miss()
+            self.response_cache_key = key
+            return super().get(request, *args, **kwargs)
+
+        response_cache_stats.hit()
+        content, content_type, headers = cached
+        response = HttpResponse(content, content_type=content_type)
+        for header, value in headers.items():
+            response[header] = value
+        return get_conditional_response(request, etag=headers.get('ETag'), response=response)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if key is not None and response.status_code == 200:
+            response.render()
+            headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+            cache.set(key, (response.content, response['Content-Type'], headers), response_cache_timeout())
+        return response
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+from django.utils.module_loading import import_string
+from .routers import read_replica_options
+
+# each process has its own copy of these, or none at all
+LOCAL_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+    Returns whether the processes serving the API share the cache, so
+    that what one of them writes, e.g. a version, the others read.
+    """
+    backend = import_string(settings.CACHES[alias]['BACKEND'])
+    return not issubclass(backend, LOCAL_CACHE_BACKENDS)
+
+
+def conditional_requests_enabled():
+    """
+    Returns whether the list endpoints answer conditional requests,
+    which they do unless disabled.
+    """
+    return getattr(settings, 'CONDITIONAL_REQUESTS', {}).get('ENABLED') is not False
+
+
+def versioned_etags():
+    """
+    Returns whether the ETags are built from the versions kept in the
+    cache, which needs a shared cache unless forced. Otherwise they are
+    hashes of the listed data, which each process computes alike.
+    """
+    enabled = getattr(settings, 'CONDITIONAL_REQUESTS', {}).get('ENABLED')
+    return enabled is True or (enabled is None and is_shared_cache())
+
+
+@register(Tags.caches)
+def check_read_replica_cache(app_configs, **kwargs):
+    if read_replica_options()['ALIASES'] and not is_shared_cache():
+        return [Error(
+            'Read replicas need a shared default cache.',
+            hint='The clients pinned to the primary after a write are kept in the cache, so with a cache per '
+                 'process a client may read a lagging replica from another worker. Configure a shared cache '
+                 'backend or unset READ_REPLICA[\'ALIASES\'].',
+            id='api.E001',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_conditional_requests_cache(app_configs, **kwargs):
+    if getattr(settings, 'CONDITIONAL_REQUESTS', {}).get('ENABLED') and not is_shared_cache():
+        return [Warning(
+            'Versioned ETags are forced with a cache per process.',
+            hint='The versions behind the ETags are kept in the cache, so with several workers one of them may '
+                 'answer 304 Not Modified for data another one changed. Only force them this way when a '
+                 'single process serves the API, otherwise leave ENABLED unset so the ETags hash the data.',
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,139 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from .checks import conditional_requests_enabled, versioned_etags
+from .routers import current_replica, read_from_primary, read_replica_options
+
+VERSION_KEY = 'api:version:{}'
+# versions are kept until evicted, which is safe as they restart from the clock
+VERSION_TIMEOUT = None
+
+
+def version_key(scope):
+    return VERSION_KEY.format(scope)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """
+    Returns the version of every scope. A version is the time in
+    milliseconds of the last change, so a counter which was evicted
+    starts again from a value greater than any it held before.
+    """
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = now_ms()
+            cache.add(key, version, VERSION_TIMEOUT)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump_version(scope):
+    key = version_key(scope)
+    cache.set(key, max(now_ms(), (cache.get(key) or 0) + 1), VERSION_TIMEOUT)
+
+
+def bump_versions_on_commit(*scopes):
+    """
+    Bumps the versions once the current transaction commits, so that
+    no reader can pair a new version with the old data.
+    """
+    scopes = [scope for scope in scopes if scope is not None]
+
+    def bump():
+        for scope in scopes:
+            bump_version(scope)
+    transaction.on_commit(bump)
+
+
+def district_scope(district_id):
+    return 'district:{}'.format(district_id) if district_id is not None else None
+
+
+def school_scope(school_id):
+    return 'school:{}'.format(school_id) if school_id is not None else None
+
+
+def model_scope(model):
+    return 'model:{}'.format(model._meta.label_lower)
+
+
+class ConditionalListMixin:
+    """
+    Answers list requests carrying a matching `If-None-Match` or
+    `If-Modified-Since` with 304 Not Modified, without serializing.
+    The ETag is built from the request URL, the user, an aggregate
+    fingerprint of the filtered queryset and the versions of
+    `get_version_scopes()`, which signals bump on every change. The
+    versions have to be shared by the workers, so without a shared
+    cache the ETag is a hash of the listed data instead, which still
+    saves sending it but not loading it, see `versioned_etags()`.
+    """
+    # the field whose maximum is the last modification of a row, if any
+    last_modified_field = None
+
+    def get_version_scopes(self):
+        return []
+
+    def get_fingerprint(self, queryset):
+        aggregates = {'count': Count('pk'), 'max_pk': Max('pk')}
+        if self.last_modified_field is not None:
+            aggregates['last_modified'] = Max(self.last_modified_field)
+        return queryset.order_by().aggregate(**aggregates)
+
+    def get_validators(self, request, queryset):
+        """
+        Returns the ETag and the last modification time of the response.
+        """
+        versions = get_versions(self.get_version_scopes())
+        # a lagging replica would tag its old rows with the new versions
+        if current_replica() is not None and versions and \
+                now_ms() - max(versions) < read_replica_options()['PIN_SECONDS'] * 1000:
+            read_from_primary()
+        fingerprint = self.get_fingerprint(queryset)
+        parts = [request.get_full_path(), request.user.pk, fingerprint['count'], fingerprint['max_pk']] + versions
+        etag = '"{}"'.format(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+        modified = [version / 1000 for version in versions]
+        if fingerprint.get('last_modified') is not None:
+            modified.append(fingerprint['last_modified'].timestamp())
+        last_modified = int(max(modified)) if modified else None
+        return etag, last_modified
+
+    def get_content_etag(self, request, data):
+        """
+        Returns the ETag of the listed data in the accepted format.
+        """
+        parts = [request.get_full_path(), request.user.pk, request.accepted_media_type, data]
+        return '"{}"'.format(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        if not conditional_requests_enabled():
+            return super().list(request, *args, **kwargs)
+        if versioned_etags():
+            etag, last_modified = self.get_validators(request, self.filter_queryset(self.get_queryset()))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = super().list(request, *args, **kwargs)
+        else:
+            response = super().list(request, *args, **kwargs)
+            etag, last_modified = self.get_content_etag(request, response.data), None
+            response = get_conditional_response(request, etag=etag, response=response)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # clients have to revalidate, which is cheap, before reusing a response
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,178 @@
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from .models import CustomUser, District, Authority, School, MenuItem, Schedule, Report, ReportItem, AuthorityReport
+from .rollups import rebuild_summaries
+
+BATCH_SIZE = 1000
+MENU = ['idly', 'dosa', 'rice', 'sambar', 'egg', 'chappati', 'dal', 'curd', 'vada', 'pongal']
+ITEMS_PER_DAY = 3
+DEFAULT_PASSWORD = 'mdm-fixture'
+START_DATE = date(2020, 8, 3)
+
+
+class DataGenerator:
+    """
+    Generates synthetic districts, authorities, schools, menus and
+    daily reports with batched bulk inserts. The actual reports, the
+    estimates and the authority reports of a day are consistent with
+    each other; about one estimate in `discrepancy_rate` is off by
+    more than 10%. The same seed always produces the same data.
+    """
+
+    def __init__(self, seed=0, batch_size=BATCH_SIZE, password=DEFAULT_PASSWORD, discrepancy_rate=0.2):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.password = password
+        self.discrepancy_rate = discrepancy_rate
+        self.counts = Counter()
+        self.seconds = 0.0
+        # menu item ids keyed by (district id, day of the week)
+        self.menus = {}
+
+    def bulk_create(self, model, objects):
+        # some backends, like SQLite, limit the rows of a single insert
+        batch_size = max(1, min(self.batch_size, connection.ops.bulk_batch_size(model._meta.concrete_fields, objects)))
+        started = time.perf_counter()
+        model.objects.bulk_create(objects, batch_size=batch_size)
+        self.seconds += time.perf_counter() - started
+        self.counts[model._meta.label] += len(objects)
+        return objects
+
+    @property
+    def rows(self):
+        return sum(self.counts.values())
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def check_empty(self, num_districts):
+        names = ['district{}'.format(d) for d in range(num_districts)]
+        return not District.objects.filter(name__in=names).exists()
+
+    @transaction.atomic
+    def create_schools(self, num_districts, num_schools):
+        """
+        Creates the districts with their menu and authority and spreads
+        the schools over them. Every user shares one password, so it is
+        hashed only once however many users are created.
+        Returns the authorities and the schools.
+        """
+        password = make_password(self.password)
+
+        districts = self.bulk_create(District, [District(name='district{}'.format(d)) for d in range(num_districts)])
+        if any(district.pk is None for district in districts):
+            districts = list(District.objects.filter(name__in=[district.name for district in districts]).order_by('id'))
+        menu_item_ids = MenuItem.objects.get_ids(MENU)
+        for district in districts:
+            for day in range(7):
+                self.menus[(district.pk, day)] = [menu_item_ids[item] for item in self.rng.sample(MENU, ITEMS_PER_DAY)]
+        self.bulk_create(Schedule, [
+            Schedule(district_id=district_id, day=day, item_id=item_id)
+            for (district_id, day), item_ids in self.menus.items()
+            for item_id in item_ids
+        ])
+
+        usernames = ['authority{}'.format(d) for d in range(num_districts)]
+        usernames += ['school{}-{}'.format(s % num_districts, s // num_districts) for s in range(num_schools)]
+        users = self.bulk_create(CustomUser, [
+            CustomUser(username=username, email='{}@mdm.local'.format(username), password=password,
+                       is_authority=username.startswith('authority'))
+            for username in usernames
+        ])
+        if any(user.pk is None for user in users):
+            users_by_name = CustomUser.objects.in_bulk(usernames, field_name='username')
+            users = [users_by_name[username] for username in usernames]
+
+        authorities = self.bulk_create(Authority, [
+            Authority(user=user, district=district) for user, district in zip(users, districts)
+        ])
+        schools = self.bulk_create(School, [
+            School(user=user, name='School {}'.format(user.username[len('school'):]),
+                   district=authorities[s % num_districts].district, authority=authorities[s % num_districts])
+            for s, user in enumerate(users[num_districts:])
+        ])
+        return authorities, schools
+
+    def menu(self, district_id, day):
+        """
+        Returns the menu item ids of a district for a day of the week,
+        the first items of `MENU` for districts created elsewhere.
+        """
+        if (district_id, day) not in self.menus:
+            ids = MenuItem.objects.get_ids(MENU[:ITEMS_PER_DAY])
+            self.menus[(district_id, day)] = [ids[item] for item in MENU[:ITEMS_PER_DAY]]
+        return self.menus[(district_id, day)]
+
+    def reload_reports(self, reports, for_date, added_by_school):
+        """
+        Fills in the primary keys of bulk created reports on backends
+        which do not return them from a bulk insert.
+        """
+        if connection.features.can_return_rows_from_bulk_insert or not reports:
+            return
+        ids = {}
+        school_ids = [report.school_id for report in reports]
+        for i in range(0, len(school_ids), self.batch_size):
+            ids.update(Report.objects.filter(
+                school_id__in=school_ids[i:i + self.batch_size], for_date=for_date, added_by_school=added_by_school,
+            ).values_list('school_id', 'id'))
+        for report in reports:
+            report.pk = ids[report.school_id]
+
+    @transaction.atomic
+    def create_day(self, schools, for_date, with_actuals=True):
+        """
+        Creates the estimate report of every school for a day and, with
+        `with_actuals`, the report of the school and the authority
+        report comparing both. The reports hold the menu of the day and
+        the daily district summaries are rebuilt.
+        """
+        actual_reports = []
+        if with_actuals:
+            actual_reports = self.bulk_create(Report, [
+                Report(school=school, student_count=self.rng.randint(20, 60), for_date=for_date, added_by_school=True)
+                for school in schools
+            ])
+            self.reload_reports(actual_reports, for_date, True)
+
+        estimates = []
+        for i, school in enumerate(schools):
+            actual = actual_reports[i] if actual_reports else None
+            student_count = actual.student_count if actual else self.rng.randint(20, 60)
+            if self.rng.random() < self.discrepancy_rate:
+                student_count = max(0, student_count - self.rng.randint(6, 15))
+            estimates.append(Report(school=school, student_count=student_count, for_date=for_date, actual_report=actual))
+        self.bulk_create(Report, estimates)
+        self.reload_reports(estimates, for_date, False)
+
+        self.bulk_create(ReportItem, [
+            ReportItem(report=report, for_date=for_date, item_id=item_id)
+            for report in actual_reports + estimates
+            for item_id in self.menu(report.school.district_id, for_date.weekday())
+        ])
+
+        authority_reports = []
+        for actual, estimate in zip(actual_reports, estimates):
+            authority_report = AuthorityReport(
+                school_id=actual.school_id, estimate=estimate, actual=actual, for_date=for_date)
+            authority_report.update_discrepancy()
+            authority_reports.append(authority_report)
+        self.bulk_create(AuthorityReport, authority_reports)
+        rebuild_summaries(for_date, for_date)
+
+    def create_days(self, schools, start_date, num_days, progress=None):
+        """
+        Creates the reports of `num_days` days, one transaction per day.
+        The progress callback is called with each day once it is written.
+        """
+        for day in range(num_days):
+            for_date = start_date + timedelta(days=day)
+            self.create_day(schools, for_date)
+            if progress is not None:
+                progress(for_date)
+
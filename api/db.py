@@ -0,0 +1,141 @@
+import threading
+from collections import Counter
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+class ConnectionStats:
+    """
+    Thread safe counters of the database connections opened, reused
+    and found unusable by this process, per database alias.
+    """
+
+    def __init__(self):
+        self.opened = Counter()
+        self.reused = Counter()
+        self.unusable = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, counter, alias):
+        with self._lock:
+            counter[alias] += 1
+
+    def reset(self):
+        with self._lock:
+            self.opened.clear()
+            self.reused.clear()
+            self.unusable.clear()
+
+    def as_dict(self):
+        with self._lock:
+            aliases = sorted(set(self.opened) | set(self.reused) | set(self.unusable))
+            stats = {}
+            for alias in aliases:
+                uses = self.opened[alias] + self.reused[alias]
+                stats[alias] = {
+                    'opened': self.opened[alias],
+                    'reused': self.reused[alias],
+                    'unusable': self.unusable[alias],
+                    'reuse_ratio': self.reused[alias] / uses if uses else 0.0,
+                }
+            return stats
+
+
+connection_stats = ConnectionStats()
+
+
+class CountReuse:
+    """
+    Execute wrapper of a connection kept open from an earlier request.
+    It counts the connection as reused once a query runs on it, then
+    removes itself, so connections left idle are not counted.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        self.remove()
+        connection_stats.count(connection_stats.reused, self.connection.alias)
+        return execute(sql, params, many, context)
+
+    def remove(self):
+        if self in self.connection.execute_wrappers:
+            self.connection.execute_wrappers.remove(self)
+
+
+def pending_reuse(connection):
+    return next((wrapper for wrapper in connection.execute_wrappers if isinstance(wrapper, CountReuse)), None)
+
+
+@receiver(connection_created)
+def count_opened_connection(sender, connection, **kwargs):
+    # a new connection replaced the one that could have been reused
+    wrapper = pending_reuse(connection)
+    if wrapper is not None:
+        wrapper.remove()
+    connection_stats.count(connection_stats.opened, connection.alias)
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    """
+    Runs after Django closed the connections older than `CONN_MAX_AGE`
+    and checks the ones left open, with `CONN_HEALTH_CHECKS`, so that
+    a connection the server or a proxy dropped while idle is replaced
+    before the request uses it instead of failing the request. The
+    read path of the ASGI handler calls it from its own threads, whose
+    connections the request signals do not reach.
+    """
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if connection.settings_dict.get('CONN_HEALTH_CHECKS') and not connection.is_usable():
+            connection.close()
+            connection_stats.count(connection_stats.unusable, connection.alias)
+        elif pending_reuse(connection) is None:
+            connection.execute_wrappers.append(CountReuse(connection))
+
+
+def iterate_rows(queryset, fields, chunk_size):
+    """
+    Iterates over `fields` of the rows of the queryset, ordered by id,
+    without holding them all in memory. Behind a transaction pooling
+    proxy, where `DISABLE_SERVER_SIDE_CURSORS` is set, the rows are
+    read in pages of `chunk_size` after the last id instead of from a
+    server side cursor. `fields` has to include 'id'.
+    """
+    queryset = queryset.order_by('id')
+    connection = connections[queryset.db]
+    if not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+        return
+
+    id_index = fields.index('id')
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        rows = list(page.values_list(*fields)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][id_index]
+
+
+def update_in_batches(queryset, batch_size, **values):
+    """
+    Updates the rows of the queryset with `values` one range of
+    `batch_size` ids at a time, so that no statement touches the whole
+    table. Outside a transaction every range is committed on its own.
+    Returns the number of rows updated.
+    """
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        updated += queryset.filter(id__gte=start, id__lt=start + batch_size).update(**values)
+    return updated
@@ -0,0 +1,30 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Filters the queryset by the query parameters declared in the
+    view's `filter_lookups`, a mapping of query parameter to ORM lookup.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filter_lookups = getattr(view, 'filter_lookups', {})
+        for param, lookup in filter_lookups.items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, TypeError, DjangoValidationError):
+                raise ValidationError({param: ['Invalid value.']})
+        return queryset
+
+
+REPORT_FILTER_LOOKUPS = {
+    'for_date__gte': 'for_date__gte',
+    'for_date__lte': 'for_date__lte',
+    'school': 'school',
+    'district': 'school__district',
+}
@@ -0,0 +1,34 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import make_password
+
+# below this many passwords handing them to the pool costs more than it saves
+MIN_PARALLEL_PASSWORDS = 8
+
+# one pool per size, shared by the requests of the process so that
+# concurrent enrollments do not start more hashing threads than CPUs
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def hashing_executor(workers):
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        return _executors[workers]
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hashes the passwords with the configured hasher, spread over a
+    shared pool of threads. The hashers do their work in C without
+    holding the GIL, e.g. hashlib.pbkdf2_hmac, so the threads run in
+    parallel.
+    """
+    passwords = list(passwords)
+    if workers == 1 or len(passwords) < MIN_PARALLEL_PASSWORDS:
+        return [make_password(password) for password in passwords]
+
+    workers = workers or os.cpu_count() or 1
+    return list(hashing_executor(workers).map(make_password, passwords))
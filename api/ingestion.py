@@ -0,0 +1,144 @@
+from django.db import transaction
+from .models import MenuItem, Report, ReportItem, School, AuthorityReport
+from .serializers import EstimateReportBulkItemSerializer
+from .notifications import enqueue_discrepancy_notifications
+from .rollups import apply_summary_deltas, discrepancy_deltas, merge_deltas, report_deltas
+
+BATCH_SIZE = 1000
+
+
+def _report_key(report):
+    return (report.school_id, report.for_date)
+
+
+def _fetch_ids(reports):
+    """
+    Fills in the primary keys of bulk created estimate reports on
+    backends that do not return them from a bulk insert.
+    """
+    missing = [report for report in reports if report.pk is None]
+    if not missing:
+        return
+
+    ids = {}
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
+        ids.update(
+            ((school_id, for_date), report_id) for school_id, for_date, report_id in
+            Report.objects.filter(
+                added_by_school=False,
+                school_id__in={report.school_id for report in batch},
+                for_date__in={report.for_date for report in batch},
+            ).values_list('school_id', 'for_date', 'id')
+        )
+    for report in missing:
+        report.pk = ids[_report_key(report)]
+
+
+def validate_estimate_rows(rows, authority):
+    """
+    Validates the rows of a bulk estimate upload together. Only the
+    schools under `authority` are accepted. Returns the per-row errors
+    keyed by row index, the valid rows as (index, validated_data) pairs
+    and the district of each school.
+    """
+    errors = {}
+    valid_rows = []
+    for index, row in enumerate(rows):
+        serializer = EstimateReportBulkItemSerializer(data=row)
+        if serializer.is_valid():
+            valid_rows.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+
+    school_ids = {data['school'] for _, data in valid_rows}
+    for_dates = {data['for_date'] for _, data in valid_rows}
+    school_districts = dict(
+        School.objects.filter(user_id__in=school_ids, authority=authority).values_list('user_id', 'district_id'))
+    existing = set(
+        Report.objects.filter(added_by_school=False, school_id__in=school_ids, for_date__in=for_dates)
+        .values_list('school_id', 'for_date')
+    )
+
+    accepted = []
+    for index, data in valid_rows:
+        key = (data['school'], data['for_date'])
+        if data['school'] not in school_districts:
+            errors[index] = {'school': ['Invalid pk "{}" - object does not exist.'.format(data['school'])]}
+        elif key in existing:
+            errors[index] = {'non_field_errors': ['An estimate report for this school and date already exists.']}
+        else:
+            existing.add(key)
+            accepted.append((index, data))
+    return errors, accepted, school_districts
+
+
+@transaction.atomic
+def bulk_create_estimate_reports(rows, authority):
+    """
+    Creates estimate reports for schools under `authority` with their
+    items in set-based queries, links them to the matching actual
+    reports and creates the authority reports. Returns one result per
+    input row.
+    """
+    errors, accepted, school_districts = validate_estimate_rows(rows, authority)
+
+    reports = [
+        Report(school_id=data['school'], student_count=data['student_count'], for_date=data['for_date'])
+        for _, data in accepted
+    ]
+
+    actual_reports = {}
+    for i in range(0, len(reports), BATCH_SIZE):
+        batch = reports[i:i + BATCH_SIZE]
+        actual_reports.update(
+            (_report_key(actual), actual) for actual in
+            Report.objects.filter(
+                added_by_school=True,
+                school_id__in={report.school_id for report in batch},
+                for_date__in={report.for_date for report in batch},
+            ).only('id', 'school_id', 'for_date', 'student_count')
+        )
+    for report in reports:
+        report.actual_report = actual_reports.get(_report_key(report))
+
+    Report.objects.bulk_create(reports, batch_size=BATCH_SIZE)
+    _fetch_ids(reports)
+
+    item_ids = MenuItem.objects.get_ids(
+        item['item'] for _, data in accepted for item in data.get('items', []))
+    items = [
+        ReportItem(report_id=report.pk, for_date=report.for_date, item_id=item_ids[item['item']])
+        for report, (_, data) in zip(reports, accepted)
+        for item in data.get('items', [])
+    ]
+    ReportItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+
+    authority_reports = []
+    for report in reports:
+        if report.actual_report is None:
+            continue
+        authority_report = AuthorityReport(
+            school_id=report.school_id, estimate=report, actual=report.actual_report, for_date=report.for_date)
+        authority_report.update_discrepancy()
+        authority_reports.append(authority_report)
+    AuthorityReport.objects.bulk_create(authority_reports, batch_size=BATCH_SIZE)
+
+    # bulk_create does not send post_save, so queue the notifications here
+    discrepant = [authority_report for authority_report in authority_reports if authority_report.discrepant]
+    if any(authority_report.pk is None for authority_report in discrepant):
+        ids = dict(AuthorityReport.objects.filter(
+            estimate_id__in=[authority_report.estimate_id for authority_report in discrepant]
+        ).values_list('estimate_id', 'id'))
+        for authority_report in discrepant:
+            authority_report.pk = ids[authority_report.estimate_id]
+    enqueue_discrepancy_notifications(discrepant)
+    apply_summary_deltas(merge_deltas(
+        report_deltas(reports, school_districts), discrepancy_deltas(authority_reports, school_districts)))
+
+    results = [None] * len(rows)
+    for index, row_errors in errors.items():
+        results[index] = {'index': index, 'status': 'error', 'errors': row_errors}
+    for report, (index, _) in zip(reports, accepted):
+        results[index] = {'index': index, 'status': 'created', 'id': report.pk}
+    return results
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import AuthorityReport
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored discrepancy ratio and flag of existing authority reports in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of authority reports updated per batch.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+
+        while True:
+            # keyset pagination on the primary key keeps every batch an index range scan
+            batch = list(
+                AuthorityReport.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .select_related('estimate', 'actual')
+                .only('id', 'discrepancy_ratio', 'discrepant', 'estimate', 'actual',
+                      'estimate__student_count', 'actual__student_count')[:batch_size]
+            )
+            if not batch:
+                break
+
+            for authority_report in batch:
+                authority_report.update_discrepancy()
+            with transaction.atomic():
+                AuthorityReport.objects.bulk_update(batch, ['discrepancy_ratio', 'discrepant'])
+
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write('Backfilled {} authority reports'.format(updated))
+
+        self.stdout.write(self.style.SUCCESS('Finished backfilling {} authority reports'.format(updated)))
@@ -0,0 +1,48 @@
+from argparse import ArgumentTypeError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.benchmarks.commands import test_database, write_results
+from api.benchmarks.runner import Scale, run_benchmark
+
+
+def scale_argument(value):
+    try:
+        return Scale.parse(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway test database at several scales, times the report endpoints '
+            'and writes the timings and query counts as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', dest='scales', type=scale_argument, action='append',
+                            help='DISTRICTSxSCHOOLSxDAYS to seed, e.g. 4x100x30. May be given more than once.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per endpoint and scale.')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Untimed requests sent before the timed ones.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random data, so runs can be compared.')
+        parser.add_argument('--output', default='benchmark.json',
+                            help='File the JSON results are written to, - for the standard output.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database between runs.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['warmup'] < 0:
+            raise CommandError('--repeat must be positive and --warmup must not be negative')
+        scales = options['scales'] or [Scale(1, 10, 5), Scale(2, 50, 10), Scale(4, 100, 20)]
+
+        with test_database(keepdb=options['keepdb']):
+            results = run_benchmark(scales, repeat=options['repeat'], warmup=options['warmup'], seed=options['seed'])
+
+        for result in results:
+            self.stdout.write('{} ({} reports)'.format(result['scale'], result['reports']))
+            for name, timings in result['endpoints'].items():
+                self.stdout.write('  {:<36} {:>4} queries  median {:>9.2f} ms  p95 {:>9.2f} ms'.format(
+                    name, timings['queries'], timings['median_ms'], timings['p95_ms']))
+
+        write_results(self, options['output'], results, database=connection.vendor,
+                      repeat=options['repeat'], warmup=options['warmup'], seed=options['seed'])
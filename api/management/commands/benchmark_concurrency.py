@@ -0,0 +1,44 @@
+from argparse import ArgumentTypeError
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks.commands import write_results
+from api.benchmarks.concurrency import Target, run_load_test
+
+
+def target_argument(value):
+    try:
+        return Target.parse(value)
+    except ValueError as e:
+        raise ArgumentTypeError(str(e))
+
+
+class Command(BaseCommand):
+    help = ('Polls an endpoint of running servers over many keep-alive connections and writes '
+            'the requests per second, latency percentiles and errors as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', dest='targets', type=target_argument, action='append',
+                            help='NAME=URL of a running server, e.g. asgi=http://127.0.0.1:8001. '
+                                 'May be given more than once.')
+        parser.add_argument('--path', default='/api/districts/',
+                            help='Path to poll, e.g. /api/authorities/me/reports/.')
+        parser.add_argument('--token', help='Authentication token sent with every request.')
+        parser.add_argument('--connections', type=int, default=1000,
+                            help='Concurrent connections held open against each target.')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to load each target for.')
+        parser.add_argument('--output', default='benchmark_concurrency.json',
+                            help='File the JSON results are written to, - for the standard output.')
+
+    def handle(self, *args, **options):
+        if not options['targets']:
+            raise CommandError('Give at least one --target')
+        if options['connections'] < 1 or options['duration'] <= 0:
+            raise CommandError('--connections and --duration must be positive')
+
+        results = run_load_test(options['targets'], options['path'], token=options['token'],
+                                connections=options['connections'], duration=options['duration'])
+        for result in results:
+            self.stdout.write('{:<40} {:>9.1f} req/s  p50 {:>9.2f} ms  p99 {:>9.2f} ms  {} errors'.format(
+                result['target'], result['rps'], result['p50_ms'], result['p99_ms'], result['errors']))
+
+        write_results(self, options['output'], results, path=options['path'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.benchmarks.commands import test_database, write_results
+from api.benchmarks.connections import run_connection_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Times a request against a throwaway test database with a new connection per request '
+            'and with a persistent connection, and writes the timings as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Timed requests per mode.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Untimed requests sent before the timed ones.')
+        parser.add_argument('--conn-max-age', type=int, default=60,
+                            help='CONN_MAX_AGE of the persistent mode.')
+        parser.add_argument('--output', default='benchmark_connections.json',
+                            help='File the JSON results are written to, - for the standard output.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0 or options['conn_max_age'] < 1:
+            raise CommandError('--requests and --conn-max-age must be positive and --warmup must not be negative')
+
+        with test_database():
+            results = run_connection_benchmark(
+                requests=options['requests'], warmup=options['warmup'], conn_max_age=options['conn_max_age'])
+
+        for name in ('per_request', 'persistent'):
+            timings = results[name]
+            self.stdout.write('{:<12} {:>4} connections  median {:>9.2f} ms  p95 {:>9.2f} ms'.format(
+                name, timings['connections_opened'], timings['median_ms'], timings['p95_ms']))
+        self.stdout.write('Saved {:.2f} ms per request'.format(results['saved_ms_per_request']))
+
+        write_results(self, options['output'], results, database=connection.vendor)
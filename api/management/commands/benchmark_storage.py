@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.benchmarks.commands import test_database, write_results
+from api.benchmarks.storage import run_storage_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Measures the report item and schedule tables of a throwaway test database with the item names '
+            'in every row and after converting them to menu item ids, and writes the sizes as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=100,
+                            help='Schools reporting every day.')
+        parser.add_argument('--days', type=int, default=100,
+                            help='Days of reports per school.')
+        parser.add_argument('--items', type=int, default=3,
+                            help='Menu items per report.')
+        parser.add_argument('--output', default='benchmark_storage.json',
+                            help='File the JSON results are written to, - for the standard output.')
+
+    def handle(self, *args, **options):
+        if options['schools'] < 1 or options['days'] < 1 or options['items'] < 1:
+            raise CommandError('--schools, --days and --items must be positive')
+
+        with test_database():
+            try:
+                results = run_storage_benchmark(
+                    schools=options['schools'], days=options['days'], items_per_report=options['items'])
+            except NotImplementedError as e:
+                raise CommandError(e)
+
+        for table in results['before']:
+            self.stdout.write('{:<16} {:>14,} bytes before  {:>14,} bytes after'.format(
+                table, results['before'][table], results['after'][table]))
+        self.stdout.write('Saved {:,} bytes, {:.2f} bytes per report item'.format(
+            results['saved_bytes'], results['saved_bytes_per_report_item']))
+
+        write_results(self, options['output'], results, database=connection.vendor)
@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.datagen import BATCH_SIZE, DEFAULT_PASSWORD, START_DATE, DataGenerator
+from .rebuild_district_summaries import date_argument
+
+
+class Command(BaseCommand):
+    help = ('Generates synthetic districts, schools and a range of daily reports with bulk inserts, '
+            'e.g. to reproduce production sized datasets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--districts', type=int, default=38, help='Number of districts.')
+        parser.add_argument('--schools', type=int, default=40000,
+                            help='Number of schools, spread evenly over the districts.')
+        parser.add_argument('--days', type=int, default=365, help='Number of days of reports.')
+        parser.add_argument('--from', dest='start_date', type=date_argument, default=START_DATE,
+                            help='First day of reports, as YYYY-MM-DD.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random data.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per insert.')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password shared by every generated user.')
+
+    def handle(self, *args, **options):
+        if min(options['districts'], options['schools'], options['batch_size']) < 1 or options['days'] < 0:
+            raise CommandError('--districts, --schools and --batch-size must be positive, --days must not be negative')
+
+        generator = DataGenerator(seed=options['seed'], batch_size=options['batch_size'], password=options['password'])
+        if not generator.check_empty(options['districts']):
+            raise CommandError('The database already holds generated districts, generate into an empty database')
+
+        started = time.perf_counter()
+        authorities, schools = generator.create_schools(options['districts'], options['schools'])
+        self.stdout.write('Created {} districts and {} schools ({:.0f} rows/s)'.format(
+            len(authorities), len(schools), generator.rows_per_second))
+
+        def progress(for_date):
+            rows = generator.rows
+            self.stdout.write('{}: {} rows, {:.0f} rows/s'.format(for_date, rows, generator.rows_per_second))
+
+        generator.create_days(schools, options['start_date'], options['days'], progress=progress)
+
+        elapsed = time.perf_counter() - started
+        for label, count in sorted(generator.counts.items()):
+            self.stdout.write('  {:<24} {:>12}'.format(label, count))
+        self.stdout.write(self.style.SUCCESS('Generated {} rows in {:.1f}s, {:.0f} rows/s overall'.format(
+            generator.rows, elapsed, generator.rows / elapsed if elapsed else 0.0)))
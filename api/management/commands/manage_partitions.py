@@ -0,0 +1,68 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from api.management.commands.rebuild_district_summaries import date_argument
+from api.partitions import (
+    PARTITIONED_TABLES, add_months, create_partition, default_months, detach_partition, is_partitioned,
+    list_partitions, month_range, month_start, partition_name, supports_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = ('Creates the monthly partitions of the report tables for the coming months and for dates '
+            'stored in the default partition, and archives the months before --archive-before.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='Months after the current one to create partitions for.')
+        parser.add_argument('--archive-before', type=date_argument,
+                            help='Detach the partitions of the months before this one, as YYYY-MM-DD. '
+                                 'Their authority reports are kept but no longer listed.')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop the detached partitions instead of moving them to the archive schema.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only print what would be done.')
+
+    def handle(self, *args, **options):
+        if not supports_partitions(connection):
+            raise CommandError('Partitions need PostgreSQL, the database is {}'.format(connection.vendor))
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+        archive_before = options['archive_before'] and month_start(options['archive_before'])
+        today = date.today()
+
+        with connection.cursor() as cursor:
+            if not all(is_partitioned(cursor, table) for table in PARTITIONED_TABLES):
+                raise CommandError('The report tables are not partitioned, run migrate first')
+
+            months = set(month_range(today, add_months(today, options['ahead'])))
+            for table in PARTITIONED_TABLES:
+                months.update(default_months(cursor, table))
+            if archive_before is not None:
+                months = {month for month in months if month >= archive_before}
+            for month in sorted(months):
+                for table in PARTITIONED_TABLES:
+                    if month in list_partitions(cursor, table):
+                        continue
+                    self.stdout.write('Creating {}'.format(partition_name(table, month)))
+                    if not options['dry_run']:
+                        with transaction.atomic():
+                            create_partition(cursor, table, month)
+
+            if archive_before is None:
+                return
+            old_months = sorted({
+                month for table in PARTITIONED_TABLES for month in list_partitions(cursor, table)
+                if month < archive_before
+            })
+            for month in old_months:
+                self.stdout.write('{} {}'.format('Dropping' if options['drop'] else 'Archiving', month.strftime('%Y-%m')))
+                if options['dry_run']:
+                    continue
+                # the authority reports of the month are left in place, as deleting
+                # them would scan and rewrite their table. The queries skip them
+                # once their reports are gone, see AuthorityReportQuerySet.unarchived.
+                with transaction.atomic():
+                    for table in PARTITIONED_TABLES:
+                        if month in list_partitions(cursor, table):
+                            detach_partition(cursor, table, month, drop=options['drop'])
@@ -0,0 +1,42 @@
+from argparse import ArgumentTypeError
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.rollups import rebuild_summaries
+
+
+def date_argument(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ArgumentTypeError('{} is not a valid date'.format(value))
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily district summaries for a date range from the reports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start_date', type=date_argument, required=True,
+                            help='First day to rebuild, as YYYY-MM-DD.')
+        parser.add_argument('--to', dest='end_date', type=date_argument, required=True,
+                            help='Last day to rebuild, as YYYY-MM-DD.')
+        parser.add_argument('--district', dest='district_ids', type=int, action='append',
+                            help='Only rebuild this district. May be given more than once.')
+
+    def handle(self, *args, **options):
+        start_date = options['start_date']
+        end_date = options['end_date']
+        if start_date > end_date:
+            raise CommandError('--from must not be after --to')
+
+        written = 0
+        # one month at a time keeps each rebuild transaction short
+        while start_date <= end_date:
+            chunk_end = min(start_date + timedelta(days=30), end_date)
+            written += rebuild_summaries(start_date, chunk_end, options['district_ids'])
+            start_date = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt {} district daily summaries'.format(written)))
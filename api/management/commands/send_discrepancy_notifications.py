@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from api.alerts import create_alert_dispatcher
+from api.notifications import send_notifications
+
+
+class Command(BaseCommand):
+    help = 'Drains the discrepancy notification outbox, sending one digest per authority.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of notifications claimed per batch.')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Number of attempts before a notification is marked as failed.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting once it is drained.')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait between polls when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        dispatcher = create_alert_dispatcher()
+        sent = 0
+        try:
+            while True:
+                processed = send_notifications(dispatcher, options['batch_size'], options['max_attempts'])
+                sent += processed
+                if processed:
+                    self.stdout.write('Processed {} notifications, dispatcher {}'.format(
+                        processed, dispatcher.stats()))
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            dispatcher.shutdown()
+
+        self.stdout.write(self.style.SUCCESS('Processed {} discrepancy notifications'.format(sent)))
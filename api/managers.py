@@ -1,4 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Abs, Greatest
 from django.utils.translation import ugettext as _
 from email_validator import validate_email, EmailNotValidError
 
@@ -18,13 +21,115 @@ class CustomUserManager(BaseUserManager):
             raise ValueError(_('The email must be set'))
         if not password:
             raise ValueError(_('The password must be set'))
+        email = self.clean_email(email)
+        user = self.model(username=username, email=email, **extra_fields)
+        user.set_password(password)
+        user.save()
+        return user
+
+    def clean_email(self, email):
+        """
+        Returns the email normalized and validated the way the users
+        are stored, raising EmailNotValidError when it is not valid.
+        """
         email = self.normalize_email(email)
         try:
-            valid = validate_email(email)
-            email = valid.email
+            return validate_email(email).email
         except EmailNotValidError:
             raise EmailNotValidError(_('The email address is not valid'))
-        user = self.model(username=username, email=email, **extra_fields)
-        user.set_password(password)
-        user.save()
-        return user
\ No newline at end of file
+
+
+class AuthorityReportQuerySet(models.QuerySet):
+    """
+    QuerySet for authority reports which evaluates the discrepancy
+    rule in the database instead of per instance.
+    """
+
+    def with_discrepancy(self):
+        """
+        Annotates each authority report with `computed_discrepant`,
+        which is true when the student counts of the estimate and
+        actual reports differ by 10% or more of the larger count.
+        """
+        return self.annotate(
+            student_count_diff=Abs(F('estimate__student_count') - F('actual__student_count')) * 10,
+            student_count_max=Greatest('estimate__student_count', 'actual__student_count'),
+        ).annotate(
+            computed_discrepant=Case(
+                When(Q(student_count_max__gt=0, student_count_diff__gte=F('student_count_max')), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+
+    def discrepant(self):
+        """
+        Returns only the authority reports that are discrepant,
+        using the stored discrepancy flag.
+        """
+        return self.filter(discrepant=True)
+
+    def unarchived(self):
+        """
+        Excludes the authority reports of archived months, which are
+        kept while their reports were detached with the partitions.
+        """
+        reports = self.model._meta.get_field('estimate').related_model.objects
+        return self.filter(Exists(reports.filter(pk=OuterRef('estimate_id'))))
+
+
+class ReportItemQuerySet(models.QuerySet):
+    """
+    QuerySet for report items, which copy the date of their report.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Fills in the date of the items created without it from their
+        report, loading the reports which are not cached at once.
+        """
+        objs = list(objs)
+        report_field = self.model._meta.get_field('report')
+        missing = [obj for obj in objs if obj.for_date is None]
+        uncached = {obj.report_id for obj in missing if not report_field.is_cached(obj)}
+        dates = dict(report_field.related_model.objects.filter(pk__in=uncached).values_list('pk', 'for_date')) \
+            if uncached else {}
+        for obj in missing:
+            obj.for_date = obj.report.for_date if report_field.is_cached(obj) else dates.get(obj.report_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class ReportItemManager(models.Manager.from_queryset(ReportItemQuerySet)):
+    """
+    Manager for report items which joins their menu item, so the
+    names are read with the items, also through `report.items`.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('item')
+
+
+class MenuItemManager(models.Manager):
+    """
+    Manager for the menu item dictionary.
+    """
+
+    # names looked up per query, within the parameter limit of SQLite
+    batch_size = 500
+
+    def get_ids(self, names):
+        """
+        Returns the ids of the menu items with the given names keyed by
+        name, adding the names which are not in the dictionary yet.
+        """
+        names = sorted(set(names))
+        ids = {}
+        for i in range(0, len(names), self.batch_size):
+            batch = names[i:i + self.batch_size]
+            ids.update(self.filter(name__in=batch).values_list('name', 'id'))
+            missing = [name for name in batch if name not in ids]
+            if missing:
+                # another request may add the same names meanwhile
+                self.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+                ids.update(self.filter(name__in=missing).values_list('name', 'id'))
+        return ids
@@ -0,0 +1,217 @@
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from .db import connection_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+def format_labels(labels):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Thread safe in-process histogram keyed by a single label,
+    rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name, documentation, label, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # one count per bucket plus the +Inf bucket, then the sum
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self, label_value):
+        """
+        Returns the number of observations and their sum.
+        """
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                return 0, 0
+            return sum(series[:-1]), series[-1]
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} histogram'.format(self.name),
+        ]
+        with self._lock:
+            series = [(label_value, list(values)) for label_value, values in self._series.items()]
+        for label_value, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append('{}_bucket{{{}}} {}'.format(
+                    self.name, format_labels([(self.label, label_value), ('le', bound)]), cumulative))
+            labels = format_labels([(self.label, label_value)])
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, format_value(values[-1])))
+            lines.append('{}_count{{{}}} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+request_duration = Histogram(
+    'mdm_request_duration_seconds', 'Time spent handling a request.', 'endpoint', LATENCY_BUCKETS)
+request_db_queries = Histogram(
+    'mdm_request_db_queries', 'Database queries made by a request.', 'endpoint', QUERY_COUNT_BUCKETS)
+request_db_duration = Histogram(
+    'mdm_request_db_duration_seconds', 'Time a request spent in database queries.', 'endpoint', LATENCY_BUCKETS)
+request_serializer_duration = Histogram(
+    'mdm_request_serializer_duration_seconds', 'Time a request spent serializing responses.', 'endpoint',
+    LATENCY_BUCKETS)
+
+REQUEST_HISTOGRAMS = [request_duration, request_db_queries, request_db_duration, request_serializer_duration]
+
+
+class RequestRecord:
+    """
+    What a request spent in the database and in serializers. The SQL
+    is only kept when `capture_sql` is set, for the slow request log.
+    """
+
+    def __init__(self, capture_sql=False, max_captured_queries=100):
+        self.capture_sql = capture_sql
+        self.max_captured_queries = max_captured_queries
+        self.queries = 0
+        self.db_duration = 0.0
+        self.serializer_duration = 0.0
+        self.serializer_depth = 0
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - started
+            self.queries += 1
+            if self.capture_sql and len(self.sql) < self.max_captured_queries:
+                self.sql.append(sql)
+
+
+_local = threading.local()
+
+
+def current_record():
+    return getattr(_local, 'record', None)
+
+
+def set_current_record(record):
+    _local.record = record
+
+
+@contextmanager
+def track_serializer():
+    """
+    Adds the time spent in the block to the serializer time of the
+    current request. Nested serializers are only counted once.
+    """
+    record = current_record()
+    if record is None:
+        yield
+        return
+
+    record.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.serializer_depth -= 1
+        if not record.serializer_depth:
+            record.serializer_duration += time.perf_counter() - started
+
+
+def observe_request(endpoint, duration, record):
+    request_duration.observe(endpoint, duration)
+    request_db_queries.observe(endpoint, record.queries)
+    request_db_duration.observe(endpoint, record.db_duration)
+    request_serializer_duration.observe(endpoint, record.serializer_duration)
+
+
+def log_slow_request(request, endpoint, duration, record):
+    logger.warning(
+        'Slow request %s %s (%s) took %.1f ms with %d queries in %.1f ms:\n%s',
+        request.method, request.path, endpoint, duration * 1000, record.queries, record.db_duration * 1000,
+        '\n'.join(record.sql),
+    )
+
+
+def render_counter(name, documentation, samples):
+    lines = ['# HELP {} {}'.format(name, documentation), '# TYPE {} counter'.format(name)]
+    lines.extend('{}{{{}}} {}'.format(name, format_labels(labels), format_value(value)) for labels, value in samples)
+    return lines
+
+
+def render_gauge(name, documentation, samples):
+    lines = ['# HELP {} {}'.format(name, documentation), '# TYPE {} gauge'.format(name)]
+    lines.extend('{}{{{}}} {}'.format(name, format_labels(labels), format_value(value)) for labels, value in samples)
+    return lines
+
+
+def cache_stats():
+    from .authentication import token_auth_cache_stats
+    from .cache import response_cache_stats, schedule_cache_stats
+    return [schedule_cache_stats, token_auth_cache_stats, response_cache_stats]
+
+
+def render_cache_stats(stats):
+    counts = [(stat.name, stat.as_dict()) for stat in stats]
+    lines = render_counter('mdm_cache_hits_total', 'Lookups answered by a cache.',
+                           [([('cache', name)], values['hits']) for name, values in counts])
+    lines += render_counter('mdm_cache_misses_total', 'Lookups a cache could not answer.',
+                            [([('cache', name)], values['misses']) for name, values in counts])
+    lines += render_gauge('mdm_cache_hit_ratio', 'Share of lookups answered by a cache.',
+                          [([('cache', name)], values['hit_ratio']) for name, values in counts])
+    return lines
+
+
+def render_connection_stats(stats):
+    lines = render_counter('mdm_db_connections_opened_total', 'Database connections opened.',
+                           [([('database', alias)], values['opened']) for alias, values in stats.items()])
+    lines += render_counter('mdm_db_connections_reused_total', 'Requests which reused an open database connection.',
+                            [([('database', alias)], values['reused']) for alias, values in stats.items()])
+    lines += render_counter('mdm_db_connections_unusable_total',
+                            'Open database connections a health check found broken.',
+                            [([('database', alias)], values['unusable']) for alias, values in stats.items()])
+    lines += render_gauge('mdm_db_connection_reuse_ratio', 'Share of connection uses which reused a connection.',
+                          [([('database', alias)], values['reuse_ratio']) for alias, values in stats.items()])
+    return lines
+
+
+def render_metrics():
+    """
+    Returns the metrics of this process in the Prometheus text format.
+    """
+    lines = []
+    for histogram in REQUEST_HISTOGRAMS:
+        lines += histogram.render()
+    lines += render_cache_stats(cache_stats())
+    lines += render_connection_stats(connection_stats.as_dict())
+    return '\n'.join(lines) + '\n'
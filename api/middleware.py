@@ -0,0 +1,156 @@
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+from .checks import is_shared_cache
+from .metrics import RequestRecord, log_slow_request, observe_request, set_current_record
+from .models import Authority, School
+from .routers import (
+    choose_replica, is_pinned_to_primary, pin_to_primary, read_from_primary, read_from_replica, read_replica_options,
+    request_credentials, stream_from,
+)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Principal:
+    """
+    The school or the authority of the user making the request.
+    """
+
+    def __init__(self, school=None, authority=None):
+        self.school = school
+        self.authority = authority
+
+    @property
+    def is_school(self):
+        return self.school is not None
+
+    @property
+    def is_authority(self):
+        return self.authority is not None
+
+    @property
+    def district(self):
+        if self.school is not None:
+            return self.school.district
+        if self.authority is not None:
+            return self.authority.district
+        return None
+
+
+def resolve_principal(user):
+    """
+    Loads the school or the authority of the user together with
+    its district, looking up the likely one first.
+    """
+    if user is None or not user.is_authenticated:
+        return Principal()
+
+    lookups = [('authority', Authority), ('school', School)]
+    if not user.is_authority:
+        lookups.reverse()
+    for name, model in lookups:
+        obj = model.objects.select_related('district').filter(user=user).first()
+        if obj is not None:
+            return Principal(**{name: obj})
+    return Principal()
+
+
+class PrincipalMiddleware:
+    """
+    Attaches `request.principal`, which is resolved at most once per
+    request on first access. DRF sets the token authenticated user on
+    the underlying request, so the lookup sees the API user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: resolve_principal(getattr(request, 'user', None)))
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, the database queries and time and the
+    serializer time of every request in histograms labelled by the
+    resolved URL name. Requests slower than `SLOW_REQUEST_MS` are
+    logged with their SQL. Streamed responses are measured up to
+    their first byte.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'REQUEST_METRICS', {})
+        self.enabled = options.get('ENABLED', True)
+        self.slow_request_ms = options.get('SLOW_REQUEST_MS')
+        self.max_captured_queries = options.get('MAX_CAPTURED_QUERIES', 100)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        record = RequestRecord(
+            capture_sql=self.slow_request_ms is not None, max_captured_queries=self.max_captured_queries)
+        set_current_record(record)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            set_current_record(None)
+        duration = time.perf_counter() - started
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        endpoint = (resolver_match and resolver_match.url_name) or 'unresolved'
+        observe_request(endpoint, duration, record)
+        if self.slow_request_ms is not None and duration * 1000 >= self.slow_request_ms:
+            log_slow_request(request, endpoint, duration, record)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Reads safe requests to the endpoints in `READ_REPLICA['URL_NAMES']`
+    from a replica. A client whose request changed data is pinned to
+    the primary for `PIN_SECONDS`, so it reads its own writes. The pins
+    are kept in the default cache, so without a shared cache backend
+    every request reads from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = read_replica_options()
+        self.aliases = options['ALIASES'] if is_shared_cache() else []
+        self.url_names = options['URL_NAMES']
+        self.pin_seconds = options['PIN_SECONDS']
+
+    def __call__(self, request):
+        request.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_primary()
+
+        if request.method not in SAFE_METHODS:
+            if response.status_code < 400:
+                pin_to_primary(request_credentials(request), self.pin_seconds)
+        elif request.replica is not None and response.streaming:
+            response.streaming_content = stream_from(request.replica, response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.aliases or request.method not in SAFE_METHODS:
+            return None
+        if request.resolver_match.url_name not in self.url_names:
+            return None
+        if is_pinned_to_primary(request_credentials(request)):
+            return None
+        request.replica = choose_replica(self.aliases)
+        read_from_replica(request.replica)
+        return None
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_authorityreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorityreport',
+            name='discrepancy_ratio',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='authorityreport',
+            name='discrepant',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='authorityreport',
+            index=models.Index(fields=['discrepant', 'for_date', 'school'], name='api_authrep_discrepant_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_authorityreport_discrepancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='authorityreport',
+            index=models.Index(fields=['for_date', 'school'], name='api_authrep_date_school_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['school', 'for_date', 'id'], name='api_report_school_date_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_report_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscrepancyNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('sent_on', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('authority_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='api.AuthorityReport')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='discrepancynotification',
+            index=models.Index(fields=['status', 'next_attempt_on'], name='api_notification_due_idx'),
+        ),
+    ]
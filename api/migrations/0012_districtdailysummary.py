@@ -0,0 +1,68 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    """
+    Summarizes the reports and authority reports stored before the
+    summaries were maintained, as api.rollups.rebuild_summaries does,
+    so that the signals only have to adjust them.
+    """
+    Report = apps.get_model('api', 'Report')
+    AuthorityReport = apps.get_model('api', 'AuthorityReport')
+    DistrictDailySummary = apps.get_model('api', 'DistrictDailySummary')
+    summaries = {}
+
+    def summary(district_id, for_date):
+        key = (district_id, for_date)
+        if key not in summaries:
+            summaries[key] = DistrictDailySummary(district_id=district_id, for_date=for_date)
+        return summaries[key]
+
+    reports = Report.objects.filter(school__district__isnull=False).order_by()
+    for row in reports.values('school__district', 'for_date', 'added_by_school').annotate(
+            report_count=Count('id'), student_count=Sum('student_count')):
+        district_summary = summary(row['school__district'], row['for_date'])
+        if row['added_by_school']:
+            district_summary.actual_report_count = row['report_count']
+            district_summary.actual_student_count = row['student_count']
+        else:
+            district_summary.estimate_report_count = row['report_count']
+            district_summary.estimated_student_count = row['student_count']
+
+    authority_reports = AuthorityReport.objects.filter(discrepant=True, school__district__isnull=False).order_by()
+    for row in authority_reports.values('school__district', 'for_date').annotate(discrepancy_count=Count('id')):
+        summary(row['school__district'], row['for_date']).discrepancy_count = row['discrepancy_count']
+
+    DistrictDailySummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_discrepancynotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictDailySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('for_date', models.DateField()),
+                ('actual_report_count', models.PositiveIntegerField(default=0)),
+                ('estimate_report_count', models.PositiveIntegerField(default=0)),
+                ('actual_student_count', models.PositiveIntegerField(default=0)),
+                ('estimated_student_count', models.PositiveIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='api.District')),
+            ],
+            options={
+                'unique_together': {('district', 'for_date')},
+            },
+        ),
+        # going back drops the table
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
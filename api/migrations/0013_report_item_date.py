@@ -0,0 +1,49 @@
+# Generated by Django 3.0.8 on 2026-10-18 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_districtdailysummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='actual_report',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estimate_report', to='api.Report'),
+        ),
+        migrations.AlterField(
+            model_name='authorityreport',
+            name='estimate',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='estimate', to='api.Report'),
+        ),
+        migrations.AlterField(
+            model_name='authorityreport',
+            name='actual',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='actual', to='api.Report'),
+        ),
+        migrations.AlterField(
+            model_name='reportitem',
+            name='report',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.Report'),
+        ),
+        migrations.AddField(
+            model_name='reportitem',
+            name='for_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE api_reportitem SET for_date = '
+            '(SELECT api_report.for_date FROM api_report WHERE api_report.id = api_reportitem.report_id)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='reportitem',
+            name='for_date',
+            field=models.DateField(),
+        ),
+    ]
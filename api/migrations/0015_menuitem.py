@@ -0,0 +1,31 @@
+# Generated by Django 3.0.8 on 2026-10-18 20:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_partition_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reportitem',
+            name='menu_item',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='api.MenuItem'),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='menu_item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='api.MenuItem'),
+        ),
+    ]
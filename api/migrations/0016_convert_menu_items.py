@@ -0,0 +1,52 @@
+# Generated by Django 3.0.8 on 2026-10-18 20:30
+
+from django.db import migrations
+from django.db.models import Max, Min, OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def update_in_batches(queryset, batch_size, **values):
+    """
+    Frozen copy of api.db.update_in_batches: updates the rows one range
+    of `batch_size` ids at a time. Returns the number of rows updated.
+    """
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        updated += queryset.filter(id__gte=start, id__lt=start + batch_size).update(**values)
+    return updated
+
+
+def convert_menu_items(apps, schema_editor):
+    """
+    Adds every distinct item name to the menu item dictionary and
+    points the rows at it, a range of ids at a time. The migration is
+    not atomic, so the converted ranges are kept when it is stopped,
+    and running it again only converts the rows left.
+    """
+    MenuItem = apps.get_model('api', 'MenuItem')
+    for model_name in ('Schedule', 'ReportItem'):
+        model = apps.get_model('api', model_name)
+        names = list(model.objects.filter(menu_item__isnull=True).order_by().values_list('item', flat=True).distinct())
+        for i in range(0, len(names), BATCH_SIZE):
+            MenuItem.objects.bulk_create(
+                [MenuItem(name=name) for name in names[i:i + BATCH_SIZE]], ignore_conflicts=True)
+
+        menu_item = MenuItem.objects.filter(name=OuterRef('item')).values('id')
+        update_in_batches(model.objects.filter(menu_item__isnull=True), BATCH_SIZE, menu_item=Subquery(menu_item))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0015_menuitem'),
+    ]
+
+    operations = [
+        # going back drops the menu item columns in 0015
+        migrations.RunPython(convert_menu_items, migrations.RunPython.noop),
+    ]
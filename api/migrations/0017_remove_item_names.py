@@ -0,0 +1,130 @@
+# Generated by Django 3.0.8 on 2026-10-18 20:30
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 10000
+
+
+def update_in_batches(queryset, batch_size, **values):
+    """
+    Frozen copy of api.db.update_in_batches: updates the rows one range
+    of `batch_size` ids at a time. Returns the number of rows updated.
+    """
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        updated += queryset.filter(id__gte=start, id__lt=start + batch_size).update(**values)
+    return updated
+
+
+def restore_item_names(apps, schema_editor):
+    MenuItem = apps.get_model('api', 'MenuItem')
+    for model_name in ('Schedule', 'ReportItem'):
+        model = apps.get_model('api', model_name)
+        name = MenuItem.objects.filter(pk=OuterRef('menu_item')).values('name')
+        update_in_batches(model.objects.all(), BATCH_SIZE, item=Subquery(name))
+
+
+def report_item_unique(schema_editor):
+    fields = ['report', 'item']
+    if schema_editor.connection.vendor == 'postgresql':
+        # the table is partitioned by for_date since 0014, which its
+        # unique constraints have to include
+        fields.append('for_date')
+    return fields
+
+
+def add_report_item_unique(apps, schema_editor):
+    ReportItem = apps.get_model('api', 'ReportItem')
+    schema_editor.alter_unique_together(ReportItem, [], [report_item_unique(schema_editor)])
+
+
+def remove_report_item_unique(apps, schema_editor):
+    ReportItem = apps.get_model('api', 'ReportItem')
+    schema_editor.alter_unique_together(ReportItem, [report_item_unique(schema_editor)], [])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_convert_menu_items'),
+    ]
+
+    operations = [
+        # the constraint is dropped along with the item column
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(migrations.RunPython.noop, add_report_item_unique),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='reportitem',
+                    unique_together=set(),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='schedule',
+            unique_together=set(),
+        ),
+        # going back adds the names as nullable columns, which are filled
+        # in before they are made required again
+        migrations.AlterField(
+            model_name='reportitem',
+            name='item',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='item',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_item_names),
+        migrations.RemoveField(
+            model_name='reportitem',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='schedule',
+            name='item',
+        ),
+        migrations.RenameField(
+            model_name='reportitem',
+            old_name='menu_item',
+            new_name='item',
+        ),
+        migrations.RenameField(
+            model_name='schedule',
+            old_name='menu_item',
+            new_name='item',
+        ),
+        migrations.AlterField(
+            model_name='reportitem',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='api.MenuItem'),
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.MenuItem'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_report_item_unique, remove_report_item_unique),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='reportitem',
+                    unique_together={('report', 'item')},
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='schedule',
+            unique_together={('district', 'day', 'item')},
+        ),
+    ]
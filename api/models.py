@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from .managers import CustomUserManager
+from .managers import CustomUserManager, AuthorityReportQuerySet, ReportItemManager, MenuItemManager
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -26,6 +27,13 @@ class Authority(models.Model):
     def __str__(self):
         return '{} - {}'.format(self.user.username, self.district.name)
 
+    def reassign_schools(self):
+        """
+        Makes this authority the authority of every school in its
+        district with a single UPDATE. Returns the number of schools.
+        """
+        return School.objects.filter(district_id=self.district_id).update(authority=self)
+
 
 class School(models.Model):
     user = models.OneToOneField(
@@ -39,64 +47,189 @@ class School(models.Model):
         return '{} - {}'.format(self.user.username, self.name)
 
 
-class Report(models.Model):
+class SavedValuesMixin:
+    """
+    Remembers the values of the `tracked_fields` as they were last loaded
+    from or saved to the database, so that the daily summaries can be
+    adjusted by the difference when a row changes or is deleted.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved_values()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_values()
+
+    def remember_saved_values(self):
+        # deferred fields are not in the instance dict and stay unknown
+        self.saved_values = {
+            name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__}
+
+    def saved_copy(self):
+        """
+        Returns an unsaved instance with the remembered values, or None
+        when some of them are not known, e.g. for bulk created rows.
+        """
+        saved_values = getattr(self, 'saved_values', {})
+        if len(saved_values) < len(self.tracked_fields):
+            return None
+        return type(self)(**saved_values)
+
+
+class Report(SavedValuesMixin, models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
     student_count = models.PositiveIntegerField(blank=False)
     for_date = models.DateField('date reported for', blank=False)
     on_datetime = models.DateTimeField(
         'date and time reported on', auto_now_add=True)
-    actual_report = models.OneToOneField('self', related_name='estimate_report', on_delete=models.CASCADE, null=True, blank=True)
+    # the reports are partitioned by date on PostgreSQL, which cannot enforce
+    # foreign keys to them, so relations to reports are not constrained
+    actual_report = models.OneToOneField('self', related_name='estimate_report', on_delete=models.CASCADE, null=True, blank=True, db_constraint=False)
     added_by_school = models.BooleanField(default=False)
 
+    tracked_fields = ('school_id', 'for_date', 'added_by_school', 'student_count')
+
+    def save(self, *args, create_authority_report=True, **kwargs):
+        """
+        Saves the report. A new report is compared with the other report
+        of its school and date in an authority report, unless the caller
+        passes `create_authority_report=False` to link them itself.
+        """
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        self.remember_saved_values()
+        if created and create_authority_report:
+            self.create_authority_report()
+
+    def create_authority_report(self):
+        """
+        Creates the authority report comparing this report with the
+        other report of its school and date, when that exists.
+        """
+        other_report = Report.objects.filter(
+            school=self.school_id, for_date=self.for_date, added_by_school=not self.added_by_school).first()
+        if other_report is None:
+            return None
+        actual, estimate = (self, other_report) if self.added_by_school else (other_report, self)
+        return AuthorityReport.objects.create(
+            school=self.school, estimate=estimate, actual=actual, for_date=self.for_date)
+
     def __str__(self):
         report_type = 'Actual report' if self.added_by_school == True else 'Estimate report'
         return '{} - {} - {}'.format(self.school_id, self.for_date, report_type)
 
     class Meta:
         unique_together = ('school', 'for_date', 'added_by_school')
+        indexes = [
+            models.Index(fields=['school', 'for_date', 'id'], name='api_report_school_date_idx'),
+        ]
 
 
-class AuthorityReport(models.Model):
+class AuthorityReport(SavedValuesMixin, models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
-    estimate = models.ForeignKey(Report, related_name='estimate', on_delete=models.CASCADE)
-    actual = models.ForeignKey(Report, related_name='actual', on_delete=models.CASCADE)
+    estimate = models.ForeignKey(Report, related_name='estimate', on_delete=models.CASCADE, db_constraint=False)
+    actual = models.ForeignKey(Report, related_name='actual', on_delete=models.CASCADE, db_constraint=False)
     for_date = models.DateField(blank=False)
+    discrepancy_ratio = models.FloatField(null=True, blank=True, db_index=True)
+    discrepant = models.BooleanField(default=False)
+
+    objects = AuthorityReportQuerySet.as_manager()
+
+    tracked_fields = ('school_id', 'for_date', 'discrepant')
 
     @property
     def is_discrepant(self):
         """
         Returns whether the estimate and actual reports differ.
         """
-        student_count_diff = abs(self.estimate.student_count - self.actual.student_count)
-        student_discrepancy_ratio = student_count_diff / max(self.estimate.student_count, self.actual.student_count)
+        return self.discrepant
 
-        if student_discrepancy_ratio >= 0.1:
-            return True
+    def update_discrepancy(self):
+        """
+        Recomputes the stored discrepancy ratio and flag from the
+        student counts of the estimate and actual reports.
+        """
+        student_count_max = max(self.estimate.student_count, self.actual.student_count)
+        if student_count_max == 0:
+            self.discrepancy_ratio = 0.0
+        else:
+            student_count_diff = abs(self.estimate.student_count - self.actual.student_count)
+            self.discrepancy_ratio = student_count_diff / student_count_max
+
+        self.discrepant = self.discrepancy_ratio >= 0.1
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the authority report with its discrepancy recomputed. A
+        notification is queued only when the report is new and
+        discrepant, or was not discrepant before, so re-saves do not
+        queue the same digest again.
+        """
+        # the notifications module imports the models
+        from .notifications import enqueue_discrepancy_notifications
 
-        return False
+        was_discrepant = not self._state.adding and self.discrepant
+        self.update_discrepancy()
+        super().save(*args, **kwargs)
+        self.remember_saved_values()
+        if self.discrepant and not was_discrepant:
+            enqueue_discrepancy_notifications([self])
 
     def __str__(self):
         return '{} - {}'.format(self.school_id, self.for_date)
 
     class Meta:
         unique_together = ('school', 'for_date')
+        indexes = [
+            models.Index(fields=['discrepant', 'for_date', 'school'], name='api_authrep_discrepant_idx'),
+            models.Index(fields=['for_date', 'school'], name='api_authrep_date_school_idx'),
+        ]
+
+
+class MenuItem(models.Model):
+    """
+    Dictionary of the menu item names. Report items and schedules
+    reference a name by its id instead of repeating it.
+    """
+    name = models.CharField(max_length=200, unique=True)
+
+    objects = MenuItemManager()
+
+    def __str__(self):
+        return self.name
 
 
 class ReportItem(models.Model):
-    report = models.ForeignKey(Report, related_name='items', on_delete=models.CASCADE)
-    item = models.CharField(max_length=200, blank=False, null=False)
+    report = models.ForeignKey(Report, related_name='items', on_delete=models.CASCADE, db_constraint=False)
+    # the date of the report, which the items are partitioned by
+    for_date = models.DateField(blank=False)
+    # items are only looked up by report, which the unique index covers
+    item = models.ForeignKey(MenuItem, on_delete=models.PROTECT, db_index=False)
+
+    objects = ReportItemManager()
+
+    def save(self, *args, **kwargs):
+        if self.for_date is None:
+            self.for_date = self.report.for_date
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return '{} - {}'.format(self.report_id, self.item)
 
     class Meta:
+        # on PostgreSQL the constraint also includes for_date, see api.partitions
         unique_together = ('report', 'item')
 
 
 class Schedule(models.Model):
     district = models.ForeignKey(District, on_delete=models.PROTECT)
     day = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(100)])
-    item = models.CharField(max_length=200, blank=False, null=False)
+    item = models.ForeignKey(MenuItem, on_delete=models.PROTECT)
 
     def __str__(self):
         return '{}'.format(self.district)
@@ -104,3 +237,54 @@ class Schedule(models.Model):
     class Meta:
         unique_together = ('district', 'day', 'item')
         
+
+
+class DiscrepancyNotification(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    authority_report = models.ForeignKey(AuthorityReport, related_name='notifications', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=timezone.now)
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return '{} - {}'.format(self.authority_report_id, self.status)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_on'], name='api_notification_due_idx'),
+        ]
+
+
+class DistrictDailySummary(models.Model):
+    district = models.ForeignKey(District, related_name='daily_summaries', on_delete=models.CASCADE)
+    for_date = models.DateField(blank=False)
+    actual_report_count = models.PositiveIntegerField(default=0)
+    estimate_report_count = models.PositiveIntegerField(default=0)
+    actual_student_count = models.PositiveIntegerField(default=0)
+    estimated_student_count = models.PositiveIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def meals_served(self):
+        """
+        Returns the number of meals served, one per student
+        reported by the schools.
+        """
+        return self.actual_student_count
+
+    def __str__(self):
+        return '{} - {}'.format(self.district_id, self.for_date)
+
+    class Meta:
+        unique_together = ('district', 'for_date')
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .alerts import Alert, AlertDropped
+from .models import AuthorityReport, DiscrepancyNotification
+
+# how long a worker may hold claimed notifications before others retry them
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue_discrepancy_notifications(authority_reports):
+    """
+    Writes a notification to the outbox for every discrepant authority
+    report once the current transaction commits.
+    """
+    authority_report_ids = [authority_report.pk for authority_report in authority_reports
+                            if authority_report.discrepant]
+    if not authority_report_ids:
+        return
+
+    transaction.on_commit(lambda: DiscrepancyNotification.objects.bulk_create([
+        DiscrepancyNotification(authority_report_id=authority_report_id)
+        for authority_report_id in authority_report_ids
+    ]))
+
+
+def format_items(report):
+    return ', '.join(item.item.name for item in report.items.all()) or '-'
+
+
+def format_discrepancy(authority_report):
+    """
+    Returns the text describing one discrepant authority report.
+    """
+    return """
+        Report given by school {school} for {for_date}:
+
+        Student count: {actual_count},
+        Food items: {actual_items}
+
+        Report predicted by the system:
+
+        Student count: {estimate_count},
+        Food items: {estimate_items}
+        """.format(
+        school=authority_report.school.name,
+        for_date=authority_report.for_date,
+        actual_count=authority_report.actual.student_count,
+        actual_items=format_items(authority_report.actual),
+        estimate_count=authority_report.estimate.student_count,
+        estimate_items=format_items(authority_report.estimate),
+    )
+
+
+def format_digest(authority_reports):
+    """
+    Returns the subject and the body of the digest sent to an
+    authority for its discrepant authority reports.
+    """
+    subject = 'Report Discrepancy: {} report(s)'.format(len(authority_reports))
+    body = """
+        Dear Sir/Madam,
+
+        There seems to be a discrepancy in the following reports.
+        """ + ''.join(format_discrepancy(authority_report) for authority_report in authority_reports)
+    return subject, body
+
+
+def claim_notifications(batch_size):
+    """
+    Claims a batch of due notifications, so that concurrent workers
+    do not send them twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            DiscrepancyNotification.objects.select_for_update(skip_locked=True)
+            .filter(status=DiscrepancyNotification.PENDING, next_attempt_on__lte=now,
+                    authority_report__in=AuthorityReport.objects.unarchived())
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        DiscrepancyNotification.objects.filter(id__in=ids).update(next_attempt_on=now + CLAIM_TIMEOUT)
+
+    return list(
+        DiscrepancyNotification.objects.filter(id__in=ids)
+        .select_related('authority_report__school__authority__user',
+                        'authority_report__estimate', 'authority_report__actual')
+        .prefetch_related('authority_report__estimate__items', 'authority_report__actual__items')
+        .order_by('id')
+    )
+
+
+def mark_failed(notifications, error, max_attempts):
+    now = timezone.now()
+    for notification in notifications:
+        notification.attempts += 1
+        notification.last_error = error
+        if notification.attempts >= max_attempts:
+            notification.status = DiscrepancyNotification.FAILED
+        else:
+            # exponential backoff between retries
+            notification.next_attempt_on = now + timedelta(minutes=2 ** notification.attempts)
+    DiscrepancyNotification.objects.bulk_update(
+        notifications, ['attempts', 'last_error', 'status', 'next_attempt_on'])
+
+
+def release_claim(notifications):
+    """
+    Makes claimed notifications due again without counting an attempt,
+    e.g. when their alert was dropped before it could be sent.
+    """
+    DiscrepancyNotification.objects.filter(id__in=[notification.id for notification in notifications]).update(
+        next_attempt_on=timezone.now())
+
+
+def mark_sent(notifications):
+    DiscrepancyNotification.objects.filter(id__in=[notification.id for notification in notifications]).update(
+        status=DiscrepancyNotification.SENT, sent_on=timezone.now())
+
+
+def send_notifications(dispatcher, batch_size=100, max_attempts=5):
+    """
+    Sends one digest per authority for a batch of due notifications
+    through the alert dispatcher. The digests are rendered from the
+    prefetched reports, so formatting does not query the database.
+    Returns the number of notifications processed.
+    """
+    notifications = claim_notifications(batch_size)
+
+    digests = OrderedDict()
+    for notification in notifications:
+        authority = notification.authority_report.school.authority
+        digests.setdefault(authority, []).append(notification)
+
+    # filled in by the dispatcher threads, applied in this thread
+    results = []
+    for authority, authority_notifications in digests.items():
+        if authority is None:
+            mark_failed(authority_notifications, 'The school does not report to an authority.', 1)
+            continue
+
+        subject, body = format_digest([notification.authority_report for notification in authority_notifications])
+        dispatcher.submit(
+            Alert(authority.user.email, subject, body),
+            lambda alert, error, authority_notifications=authority_notifications:
+                results.append((authority_notifications, error)),
+        )
+    dispatcher.join()
+
+    for authority_notifications, error in results:
+        if error is None:
+            mark_sent(authority_notifications)
+        elif isinstance(error, AlertDropped):
+            release_claim(authority_notifications)
+        else:
+            mark_failed(authority_notifications, str(error), max_attempts)
+
+    return len(notifications)
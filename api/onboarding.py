@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from .authentication import create_tokens
+from .hashing import hash_passwords
+from .models import CustomUser, School
+from .serializers import SchoolOnboardingRowSerializer
+
+BATCH_SIZE = 1000
+# a concurrent enrollment may take a username or email between the
+# check and the insert, after which the batch is checked again
+CREATE_ATTEMPTS = 2
+
+
+def validate_school_rows(rows):
+    """
+    Validates the rows of a bulk onboarding together. Returns the
+    per-row errors keyed by row index and the valid rows as
+    (index, validated_data) pairs.
+    """
+    errors = {}
+    valid_rows = []
+    for index, row in enumerate(rows):
+        serializer = SchoolOnboardingRowSerializer(data=row)
+        if serializer.is_valid():
+            valid_rows.append((index, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+    return errors, exclude_taken(valid_rows, errors)
+
+
+def exclude_taken(valid_rows, errors):
+    """
+    Returns the rows whose username and email are not taken by a user
+    or an earlier row, adding the errors of the others. Emails which
+    only differ in case are the same.
+    """
+    usernames = {data['username'] for _, data in valid_rows}
+    emails = {data['email'].lower() for _, data in valid_rows}
+    taken_usernames = set(CustomUser.objects.filter(username__in=usernames).values_list('username', flat=True))
+    taken_emails = set(CustomUser.objects.annotate(email_lower=Lower('email'))
+                       .filter(email_lower__in=emails).values_list('email_lower', flat=True))
+
+    accepted = []
+    for index, data in valid_rows:
+        row_errors = {}
+        if data['username'] in taken_usernames:
+            row_errors['username'] = ['A user with that username already exists.']
+        if data['email'].lower() in taken_emails:
+            row_errors['email'] = ['A user with that email already exists.']
+        if row_errors:
+            errors[index] = row_errors
+            continue
+        # later rows with the same username or email are rejected
+        taken_usernames.add(data['username'])
+        taken_emails.add(data['email'].lower())
+        accepted.append((index, data))
+    return accepted
+
+
+@transaction.atomic
+def create_schools(authority, accepted, passwords):
+    """
+    Creates the users, schools and tokens of the accepted rows with
+    their hashed passwords keyed by row index, all or none of them.
+    Returns the users and their tokens keyed by user id.
+    """
+    users = [
+        CustomUser(username=data['username'], email=data['email'], password=passwords[index])
+        for index, data in accepted
+    ]
+    CustomUser.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    if any(user.pk is None for user in users):
+        ids = CustomUser.objects.in_bulk([user.username for user in users], field_name='username')
+        for user in users:
+            user.pk = ids[user.username].pk
+
+    School.objects.bulk_create([
+        School(user=user, name=data['name'], district_id=authority.district_id, authority=authority)
+        for user, (_, data) in zip(users, accepted)
+    ], batch_size=BATCH_SIZE)
+
+    return users, create_tokens(users, batch_size=BATCH_SIZE)
+
+
+def bulk_onboard_schools(authority, rows):
+    """
+    Creates a user, a school in the district of the authority and a
+    token for every valid row. The passwords are hashed in parallel
+    before the transaction starts. Returns one result per input row.
+    """
+    errors, accepted = validate_school_rows(rows)
+    options = getattr(settings, 'SCHOOL_ONBOARDING', {})
+    hashed = hash_passwords((data['password'] for _, data in accepted), workers=options.get('HASH_WORKERS'))
+    passwords = {index: password for (index, _), password in zip(accepted, hashed)}
+
+    users, tokens = [], {}
+    for _ in range(CREATE_ATTEMPTS):
+        try:
+            users, tokens = create_schools(authority, accepted, passwords)
+            break
+        except IntegrityError:
+            accepted = exclude_taken(accepted, errors)
+    else:
+        for index, _ in accepted:
+            errors[index] = {'non_field_errors': ['The user could not be created, retry later.']}
+        accepted = []
+
+    results = [None] * len(rows)
+    for index, row_errors in errors.items():
+        results[index] = {'index': index, 'status': 'error', 'errors': row_errors}
+    for user, (index, _) in zip(users, accepted):
+        results[index] = {'index': index, 'status': 'created', 'id': user.pk, 'username': user.username,
+                          'token': tokens[user.pk]}
+    return results
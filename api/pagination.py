@@ -0,0 +1,120 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination which seeks on every field of the ordering,
+    so that deep pages cost the same as the first page.
+    The cursor is an opaque token holding the ordering values
+    of the last row of the previous page.
+    """
+    ordering = ('-id',)
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(cursor))
+
+        # fetch one extra row to know whether there is a next page
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_seek_filter(self, cursor):
+        """
+        Returns the filter selecting the rows strictly after the
+        cursor in the ordering, as (a < x) OR (a = x AND b < y) ...
+        """
+        seek_filter = Q()
+        equal_filter = Q()
+        for field, value in zip(self.ordering, cursor):
+            name = field.lstrip('-')
+            lookup = '{}__lt'.format(name) if field.startswith('-') else '{}__gt'.format(name)
+            seek_filter |= equal_filter & Q(**{lookup: value})
+            equal_filter &= Q(**{name: value})
+        return seek_filter
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            names = self.get_field_names()
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = [str(getattr(instance, name)) for name in self.get_field_names()]
+        return urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class ReportKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination for reports, newest first.
+    """
+    ordering = ('-for_date', '-id')
+
+
+class DistrictKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination for districts.
+    """
+    ordering = ('id',)
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON into a list of objects,
+    one object per non-empty line.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        rows = []
+        for line_number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError('NDJSON parse error on line {} - {}'.format(line_number, exc))
+        return rows
+
+
+class CSVParser(BaseParser):
+    """
+    Parses CSV with a header row into a list of objects keyed by
+    the column names.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            text = stream.read().decode(encoding)
+            return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ParseError('CSV parse error - {}'.format(exc))
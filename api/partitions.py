@@ -0,0 +1,191 @@
+"""
+Monthly range partitions of the report tables on PostgreSQL.
+
+`api_report` and `api_reportitem` are partitioned by `for_date`, one
+partition per month named like `api_report_p2020_08`, plus a default
+partition catching the dates no month partition covers. Queries which
+filter on `for_date` only read the partitions of those months, and an
+old month is archived by detaching its partitions instead of deleting
+its rows. On other databases the tables are left as they are.
+"""
+from datetime import date
+from django.db import connection as default_connection
+
+PARTITIONED_TABLES = ['api_report', 'api_reportitem']
+PARTITION_KEY = 'for_date'
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def month_range(first, last):
+    """
+    Returns the first day of every month from `first` to `last`.
+    """
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return '{}_p{:04d}_{:02d}'.format(table, month.year, month.month)
+
+
+def default_partition_name(table):
+    return '{}_default'.format(table)
+
+
+def supports_partitions(connection=default_connection):
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+        'WHERE c.relname = %s AND pg_table_is_visible(c.oid)', [table])
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """
+    Returns the months which have a partition of the table, in order.
+    """
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits i '
+        'JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid '
+        'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)', [table])
+    prefix = '{}_p'.format(table)
+    months = []
+    for name, in cursor.fetchall():
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('_')
+            months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def default_months(cursor, table):
+    """
+    Returns the months with rows in the default partition of the table.
+    """
+    qn = cursor.db.ops.quote_name
+    cursor.execute("SELECT DISTINCT date_trunc('month', {})::date FROM {}".format(
+        qn(PARTITION_KEY), qn(default_partition_name(table))))
+    return sorted(month for month, in cursor.fetchall())
+
+
+def create_partition(cursor, table, month):
+    """
+    Creates the partition of the table for a month, moving the rows of
+    that month out of the default partition. Returns False when the
+    partition already exists.
+    """
+    name = partition_name(table, month)
+    if month in list_partitions(cursor, table):
+        return False
+
+    qn = cursor.db.ops.quote_name
+    bounds = [month, add_months(month, 1)]
+    cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(qn(name), qn(table)))
+    cursor.execute(
+        'WITH moved AS (DELETE FROM {} WHERE {key} >= %s AND {key} < %s RETURNING *) '
+        'INSERT INTO {} SELECT * FROM moved'.format(qn(default_partition_name(table)), qn(name), key=qn(PARTITION_KEY)),
+        bounds)
+    cursor.execute(
+        'ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(qn(table), qn(name)), bounds)
+    return True
+
+
+def detach_partition(cursor, table, month, drop=False):
+    """
+    Detaches the partition of a month from the table, which only
+    changes the catalog. The detached table is moved to the archive
+    schema, to be dumped and dropped later, or dropped right away.
+    """
+    qn = cursor.db.ops.quote_name
+    name = partition_name(table, month)
+    cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(qn(table), qn(name)))
+    if drop:
+        cursor.execute('DROP TABLE {}'.format(qn(name)))
+    else:
+        cursor.execute('CREATE SCHEMA IF NOT EXISTS {}'.format(qn(ARCHIVE_SCHEMA)))
+        cursor.execute('ALTER TABLE {} SET SCHEMA {}'.format(qn(name), qn(ARCHIVE_SCHEMA)))
+
+
+def constraint_sql(qn, table, name, constraint):
+    """
+    Returns the SQL recreating a primary key, unique constraint, foreign
+    key or index on the partitioned table. Unique ones have to include
+    the partition key, which the report constraints do or can add
+    without changing their meaning, as the items and the estimate of a
+    report share its date.
+    """
+    columns = list(constraint['columns'])
+    if (constraint['primary_key'] or constraint['unique']) and PARTITION_KEY not in columns:
+        columns.append(PARTITION_KEY)
+    column_list = ', '.join(qn(column) for column in columns)
+
+    if constraint['primary_key']:
+        return 'ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ({})'.format(qn(table), qn(name), column_list)
+    if constraint['foreign_key']:
+        to_table, to_column = constraint['foreign_key']
+        return 'ALTER TABLE {} ADD CONSTRAINT {} FOREIGN KEY ({}) REFERENCES {} ({}) DEFERRABLE INITIALLY DEFERRED'.format(
+            qn(table), qn(name), column_list, qn(to_table), qn(to_column))
+    if constraint['unique'] and not constraint['index']:
+        return 'ALTER TABLE {} ADD CONSTRAINT {} UNIQUE ({})'.format(qn(table), qn(name), column_list)
+    if constraint['index']:
+        return 'CREATE {}INDEX {} ON {} ({})'.format(
+            'UNIQUE ' if constraint['unique'] else '', qn(name), qn(table), column_list)
+    return None
+
+
+def partition_table(cursor, table, months):
+    """
+    Replaces a plain table by a table partitioned by month on
+    `for_date`, with a partition for every month in `months` and a
+    default one, and copies its rows over. Its constraints and indexes
+    are recreated under the same names, so later migrations find them.
+    """
+    qn = cursor.db.ops.quote_name
+    constraints = cursor.db.introspection.get_constraints(cursor, table)
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+    sequence, = cursor.fetchone()
+
+    legacy = '{}_unpartitioned'.format(table)
+    cursor.execute('ALTER TABLE {} RENAME TO {}'.format(qn(table), qn(legacy)))
+    cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({})'.format(
+        qn(table), qn(legacy), qn(PARTITION_KEY)))
+    cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(qn(default_partition_name(table)), qn(table)))
+    for month in months:
+        create_partition(cursor, table, month)
+
+    cursor.execute('INSERT INTO {} SELECT * FROM {}'.format(qn(table), qn(legacy)))
+    cursor.execute('ALTER SEQUENCE {} OWNED BY {}.{}'.format(sequence, qn(table), qn('id')))
+    cursor.execute('DROP TABLE {}'.format(qn(legacy)))
+
+    for name, constraint in constraints.items():
+        if constraint['check']:
+            # copied along with the columns
+            continue
+        sql = constraint_sql(qn, table, name, constraint)
+        if sql is not None:
+            cursor.execute(sql)
+
+
+def data_months(cursor, table, ahead=3, today=None):
+    """
+    Returns the months from the oldest row of the table up to `ahead`
+    months after the current one.
+    """
+    qn = cursor.db.ops.quote_name
+    today = today or date.today()
+    cursor.execute('SELECT MIN({}) FROM {}'.format(qn(PARTITION_KEY), qn(table)))
+    oldest, = cursor.fetchone()
+    return list(month_range(min(oldest or today, today), add_months(today, ahead)))
@@ -13,7 +13,7 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the owner of the object
-        return obj.user == request.user
+        return obj.user_id == request.user.id
 
 class IsOwner(permissions.BasePermission):
     """
@@ -21,7 +21,7 @@ class IsOwner(permissions.BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.id
 
 class IsSchoolOwner(permissions.BasePermission):
     """
@@ -31,11 +31,9 @@ class IsSchoolOwner(permissions.BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        try:
-            school = School.objects.get(user=request.user)
-            return obj.school == school  
-        except School.DoesNotExist:
-            authority = Authority.objects.get(user=request.user)
-            return authority.school_set.filter(school=obj.school).exists()
-        except Exception as e:
-            return False
\ No newline at end of file
+        principal = request.principal
+        if principal.is_school:
+            return obj.school_id == principal.school.pk
+        if principal.is_authority:
+            return School.objects.filter(pk=obj.school_id, authority_id=principal.authority.pk).exists()
+        return False
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from .models import Report, AuthorityReport, DistrictDailySummary
+
+
+def apply_summary_deltas(deltas):
+    """
+    Adds the deltas, a mapping of (district_id, for_date) to a mapping
+    of summary field to increment, to the daily summaries. The
+    increments are done in the database so concurrent writers do
+    not lose updates. A missing summary is rebuilt from the reports,
+    which already include the changes.
+    """
+    for (district_id, for_date), fields in deltas.items():
+        if district_id is None:
+            continue
+        fields = {field: delta for field, delta in fields.items() if delta}
+        if not fields:
+            continue
+        increments = {field: F(field) + delta for field, delta in fields.items()}
+        summaries = DistrictDailySummary.objects.filter(district_id=district_id, for_date=for_date)
+        if summaries.update(**increments):
+            continue
+        # no summary yet, which the deltas cannot start from when rows of
+        # the day were written before, so the day is summarized in full
+        try:
+            refresh_summary(district_id, for_date)
+        except IntegrityError:
+            # a concurrent writer created the summary, which cannot
+            # include the uncommitted rows of this transaction
+            summaries.update(**increments)
+
+
+def merge_deltas(*deltas):
+    merged = defaultdict(lambda: defaultdict(int))
+    for delta in deltas:
+        for key, fields in delta.items():
+            for field, value in fields.items():
+                merged[key][field] += value
+    return merged
+
+
+def report_deltas(reports, district_ids, sign=1):
+    """
+    Returns the summary deltas for newly created reports, given the
+    districts of their schools keyed by school id. Pass `sign=-1`
+    for the deltas of removed reports.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for report in reports:
+        fields = deltas[(district_ids.get(report.school_id), report.for_date)]
+        if report.added_by_school:
+            fields['actual_report_count'] += sign
+            fields['actual_student_count'] += sign * report.student_count
+        else:
+            fields['estimate_report_count'] += sign
+            fields['estimated_student_count'] += sign * report.student_count
+    return deltas
+
+
+def discrepancy_deltas(authority_reports, district_ids, sign=1):
+    """
+    Returns the summary deltas for newly created authority reports, or
+    for removed ones with `sign=-1`.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for authority_report in authority_reports:
+        if authority_report.discrepant:
+            deltas[(district_ids.get(authority_report.school_id), authority_report.for_date)]['discrepancy_count'] += sign
+    return deltas
+
+
+def rebuild_summaries(start_date, end_date, district_ids=None):
+    """
+    Recomputes the daily summaries between the dates, both included,
+    from the reports and authority reports. Returns the number of
+    summaries written.
+    """
+    reports = Report.objects.filter(for_date__range=(start_date, end_date), school__district__isnull=False)
+    authority_reports = AuthorityReport.objects.unarchived().filter(
+        for_date__range=(start_date, end_date), discrepant=True, school__district__isnull=False)
+    summaries = DistrictDailySummary.objects.filter(for_date__range=(start_date, end_date))
+    if district_ids is not None:
+        reports = reports.filter(school__district__in=district_ids)
+        authority_reports = authority_reports.filter(school__district__in=district_ids)
+        summaries = summaries.filter(district__in=district_ids)
+
+    with transaction.atomic():
+        # the summaries are locked before the reports are read, so the
+        # deltas of concurrent writers are applied after the rebuild
+        list(summaries.select_for_update().values_list('id', flat=True))
+        rebuilt = aggregate_summaries(reports, authority_reports)
+        summaries.delete()
+        DistrictDailySummary.objects.bulk_create(rebuilt, batch_size=1000)
+    return len(rebuilt)
+
+
+def aggregate_summaries(reports, authority_reports):
+    """
+    Returns unsaved daily summaries aggregated from the reports and
+    the discrepant authority reports.
+    """
+    rebuilt = {}
+
+    def summary(district_id, for_date):
+        key = (district_id, for_date)
+        if key not in rebuilt:
+            rebuilt[key] = DistrictDailySummary(district_id=district_id, for_date=for_date)
+        return rebuilt[key]
+
+    for row in reports.order_by().values('school__district', 'for_date', 'added_by_school').annotate(
+            report_count=Count('id'), student_count=Sum('student_count')):
+        district_summary = summary(row['school__district'], row['for_date'])
+        if row['added_by_school']:
+            district_summary.actual_report_count = row['report_count']
+            district_summary.actual_student_count = row['student_count']
+        else:
+            district_summary.estimate_report_count = row['report_count']
+            district_summary.estimated_student_count = row['student_count']
+
+    for row in authority_reports.order_by().values('school__district', 'for_date').annotate(
+            discrepancy_count=Count('id')):
+        summary(row['school__district'], row['for_date']).discrepancy_count = row['discrepancy_count']
+
+    return list(rebuilt.values())
+
+
+def refresh_summary(district_id, for_date):
+    """
+    Recomputes the summary of one district for one day.
+    """
+    if district_id is not None:
+        rebuild_summaries(for_date, for_date, [district_id])
@@ -0,0 +1,118 @@
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_KEY = 'api:replica-pin:{}'
+
+_state = threading.local()
+
+
+def read_replica_options():
+    options = getattr(settings, 'READ_REPLICA', {})
+    return {
+        'ALIASES': options.get('ALIASES', []),
+        'URL_NAMES': set(options.get('URL_NAMES', [])),
+        'APPS': set(options.get('APPS', ['api'])),
+        'PIN_SECONDS': options.get('PIN_SECONDS', 5),
+    }
+
+
+def current_replica():
+    return getattr(_state, 'replica', None)
+
+
+@contextmanager
+def reading_from(alias):
+    """
+    Sends the reads of the block to the `alias` replica, or to the
+    primary when it is None.
+    """
+    previous = current_replica()
+    _state.replica = alias
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_from_replica(alias):
+    """
+    Sends the remaining reads of the current request to the `alias`
+    replica, or to the primary when it is None.
+    """
+    _state.replica = alias
+
+
+def read_from_primary():
+    read_from_replica(None)
+
+
+def stream_from(alias, iterable):
+    """
+    Reads from the `alias` replica while each item is produced, for
+    streamed responses which are iterated after the middleware returned.
+    """
+    iterator = iter(iterable)
+    while True:
+        with reading_from(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def pin_key(credentials):
+    return PIN_KEY.format(hashlib.sha1(credentials.encode('utf-8')).hexdigest())
+
+
+def request_credentials(request):
+    """
+    Returns what identifies the client of the request, its token or
+    its session, without querying the database.
+    """
+    return request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+
+def pin_to_primary(credentials, seconds):
+    if credentials and seconds:
+        cache.set(pin_key(credentials), True, seconds)
+
+
+def is_pinned_to_primary(credentials):
+    return bool(credentials) and cache.get(pin_key(credentials)) is not None
+
+
+def choose_replica(aliases):
+    return random.choice(aliases) if aliases else None
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request, if any.
+    Users, tokens and the other models outside `APPS` always read from
+    the primary, so a new login works at once. Replicas are never
+    written to or migrated, they copy the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is None or model._meta.label == settings.AUTH_USER_MODEL:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in read_replica_options()['APPS']:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in read_replica_options()['ALIASES']
@@ -1,9 +1,14 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
-from .models import CustomUser, Authority, School, Report, District, ReportItem, Schedule, AuthorityReport
+from .models import CustomUser, Authority, School, Report, District, MenuItem, ReportItem, Schedule, AuthorityReport, DistrictDailySummary
 from collections import OrderedDict
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from email_validator import EmailNotValidError
+from .cache import get_schedule_items
+from .metrics import track_serializer
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -28,7 +33,41 @@ class CustomUserSerializer(UserSerializer):
         ]
 
 
-class ReportItemSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Counts the time spent representing instances towards the
+    serializer time of the current request.
+    """
+
+    def to_representation(self, instance):
+        with track_serializer():
+            return super().to_representation(instance)
+
+
+class MenuItemNameField(serializers.CharField):
+    """
+    Represents a menu item by its name. Names are validated as they
+    are and mapped to menu items in bulk when the items are saved.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', MenuItem._meta.get_field('name').max_length)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return value.name
+
+
+def create_report_items(report, items_data):
+    ids = MenuItem.objects.get_ids(item_data['item'] for item_data in items_data)
+    ReportItem.objects.bulk_create([
+        ReportItem(report=report, for_date=report.for_date, item_id=ids[item_data['item']])
+        for item_data in items_data
+    ])
+
+
+class ReportItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    item = MenuItemNameField()
 
     class Meta:
         model = ReportItem
@@ -37,7 +76,7 @@ class ReportItemSerializer(serializers.ModelSerializer):
         ]
 
 
-class SchoolReportSerializer(serializers.ModelSerializer):
+class SchoolReportSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = ReportItemSerializer(many=True)
 
     class Meta:
@@ -50,7 +89,7 @@ class SchoolReportSerializer(serializers.ModelSerializer):
         ]
 
 
-class SchoolReportCreateSerializer(serializers.ModelSerializer):
+class SchoolReportCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Report
@@ -62,27 +101,27 @@ class SchoolReportCreateSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        # Should pass the items
         school = validated_data.get('school')
         for_date = validated_data.get('for_date')
-        for_day = for_date.weekday()
-        items_data = Schedule.objects.filter(district=school.district, day=for_day)
-        report = Report.objects.create(**validated_data, added_by_school=True)
-        try:
-            estimate_report = Report.objects.get(
-                school=school, for_date=for_date)
+        item_ids = get_schedule_items(school.district_id, for_date.weekday())
+        estimate_report = Report.objects.filter(
+            school=school, for_date=for_date, added_by_school=False).first()
+
+        report = Report(**validated_data, added_by_school=True)
+        # the estimate was loaded above, so the authority report is created below
+        report.save(create_authority_report=False)
+
+        ReportItem.objects.bulk_create([ReportItem(report=report, for_date=for_date, item_id=item_id) for item_id in item_ids])
+
+        if estimate_report is not None:
+            Report.objects.filter(pk=estimate_report.pk).update(actual_report=report)
             estimate_report.actual_report = report
-            estimate_report.save()
-        except:
-            pass
-        finally:
-            for item_data in items_data:
-                item = item_data.item
-                ReportItem.objects.create(report=report, item=item)
-            return report
+            AuthorityReport.objects.create(
+                school=school, estimate=estimate_report, actual=report, for_date=for_date)
+        return report
 
 
-class EstimateReportSerializer(serializers.ModelSerializer):
+class EstimateReportSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = ReportItemSerializer(many=True, required=False, allow_null=False)
 
     class Meta:
@@ -108,8 +147,7 @@ class EstimateReportSerializer(serializers.ModelSerializer):
         except Report.DoesNotExist:
             report = Report.objects.create(**validated_data)
         finally:
-            for item_data in items_data:
-                ReportItem.objects.create(report=report, **item_data)
+            create_report_items(report, items_data)
             return report
 
     @transaction.atomic
@@ -119,13 +157,58 @@ class EstimateReportSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         if items_data:
             instance.items.all().delete()
-            for item_data in items_data:
-                ReportItem.objects.create(report=instance, **item_data)
+            create_report_items(instance, items_data)
+        elif 'for_date' in validated_data:
+            instance.items.update(for_date=instance.for_date)
         instance.save()
         return instance
 
 
-class AuthoritySerializer(serializers.ModelSerializer):
+class EstimateReportBulkItemSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk estimate upload without touching
+    the database. The school and uniqueness checks are done for
+    the whole upload at once.
+    """
+    student_count = serializers.IntegerField(min_value=0)
+    for_date = serializers.DateField()
+    school = serializers.IntegerField()
+    items = ReportItemSerializer(many=True, required=False, allow_null=False)
+
+    def validate_items(self, value):
+        items = [item_data['item'] for item_data in value]
+        if len(items) != len(set(items)):
+            raise serializers.ValidationError('Items must be unique.')
+        return value
+
+
+class SchoolOnboardingRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk school onboarding without touching
+    the database. Uniqueness is checked for the whole batch at once.
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField()
+    password = serializers.CharField(max_length=128)
+    name = serializers.CharField(max_length=250)
+
+    def validate_email(self, value):
+        # as CustomUserManager.create_user stores it
+        try:
+            return CustomUser.objects.clean_email(value)
+        except EmailNotValidError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, data):
+        user = CustomUser(username=data['username'], email=data['email'])
+        try:
+            validate_password(data['password'], user)
+        except ValidationError as e:
+            raise serializers.ValidationError({'password': list(e.messages)})
+        return data
+
+
+class AuthoritySerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Authority
@@ -137,14 +220,21 @@ class AuthoritySerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         authority = Authority.objects.create(**validated_data)
-        schools = School.objects.filter(district=authority.district)
-        for school in schools:
-            school.authority = authority
-        School.objects.bulk_update(schools, ['authority'])
+        authority.reassign_schools()
+        return authority
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        district_id = instance.district_id
+        authority = super().update(instance, validated_data)
+        if authority.district_id != district_id:
+            # the schools of the old district are left without an authority
+            School.objects.filter(district_id=district_id, authority=authority).update(authority=None)
+            authority.reassign_schools()
         return authority
 
 
-class SchoolSerializer(serializers.ModelSerializer):
+class SchoolSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = School
@@ -165,7 +255,7 @@ class SchoolSerializer(serializers.ModelSerializer):
             pass
 
 
-class AuthorityReportSerializer(serializers.ModelSerializer):
+class AuthorityReportSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_discrepant = serializers.ReadOnlyField()
     school = SchoolSerializer()
     estimate = EstimateReportSerializer()
@@ -183,8 +273,37 @@ class AuthorityReportSerializer(serializers.ModelSerializer):
         ]
 
 
-class DistrictSerializer(serializers.ModelSerializer):
+class DistrictSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = District
         fields = '__all__'
+
+
+class ScheduleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    item = MenuItemNameField()
+
+    class Meta:
+        model = Schedule
+        fields = [
+            'day',
+            'item',
+        ]
+
+
+class DistrictDailySummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    meals_served = serializers.ReadOnlyField()
+
+    class Meta:
+        model = DistrictDailySummary
+        fields = [
+            'id',
+            'district',
+            'for_date',
+            'meals_served',
+            'actual_student_count',
+            'estimated_student_count',
+            'actual_report_count',
+            'estimate_report_count',
+            'discrepancy_count',
+        ]
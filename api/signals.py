@@ -1,43 +1,125 @@
-from django.db.models.signals import post_save
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from api.models import Report, AuthorityReport
+from rest_framework.authtoken.models import Token
+from api.authentication import invalidate_token
+from api.cache import invalidate_schedule_items
+from api.conditional import bump_versions_on_commit, district_scope, model_scope, school_scope
+from api.models import CustomUser, Report, AuthorityReport, Schedule, School, District, Authority
+from api.notifications import enqueue_discrepancy_notifications
+from api.rollups import apply_summary_deltas, discrepancy_deltas, merge_deltas, refresh_summary, report_deltas
 
-@receiver(post_save, sender=Report)
-def create_authority_report(sender, instance, created, **kwargs):
-    try:
-        # create authority report only when both actual and estimate report exists
-        other_report = Report.objects.get(school=instance.school, for_date=instance.for_date, added_by_school=(not instance.added_by_school))
+def update_authority_report_discrepancies(report):
+    """
+    Recomputes the stored discrepancies of the authority reports of a
+    report whose student count may have changed, and returns the
+    summary deltas of the flags that flipped.
+    """
+    authority_reports = list(AuthorityReport.objects.filter(
+        Q(estimate=report) | Q(actual=report)).select_related('estimate', 'actual'))
+    if not authority_reports:
+        return {}
+    district_ids = dict(School.objects.filter(
+        pk__in={authority_report.school_id for authority_report in authority_reports}).values_list('pk', 'district_id'))
+    # removing the old flags and adding the new ones leaves only the flips
+    removed = discrepancy_deltas(authority_reports, district_ids, sign=-1)
+    newly_discrepant = []
+    for authority_report in authority_reports:
+        was_discrepant = authority_report.discrepant
+        authority_report.update_discrepancy()
+        if authority_report.discrepant and not was_discrepant:
+            newly_discrepant.append(authority_report)
+    AuthorityReport.objects.bulk_update(authority_reports, ['discrepancy_ratio', 'discrepant'])
+    enqueue_discrepancy_notifications(newly_discrepant)
+    return merge_deltas(removed, discrepancy_deltas(authority_reports, district_ids))
+
+def school_district_id(instance):
+    """
+    Returns the district of the school of a report or an authority
+    report, without a query when the school is already loaded.
+    """
+    if type(instance).school.is_cached(instance):
+        return instance.school.district_id
+    return School.objects.filter(pk=instance.school_id).values_list('district_id', flat=True).first()
 
-        if instance.added_by_school:
-            AuthorityReport.objects.create(school=instance.school, actual=instance, estimate=other_report, for_date=instance.for_date)
-        else:
-            AuthorityReport.objects.create(school=instance.school, estimate=instance, actual=other_report, for_date=instance.for_date)
+@receiver(post_save, sender=Report)
+def update_district_daily_summary(sender, instance, created, **kwargs):
+    district_id = school_district_id(instance)
+    district_ids = {instance.school_id: district_id}
+    if created:
+        apply_summary_deltas(report_deltas([instance], district_ids))
+        return
 
-    except Report.DoesNotExist:
-        pass
+    # the summary is adjusted once for the report and the discrepancies
+    # it flipped, as a missing summary is rebuilt with both included
+    flipped = update_authority_report_discrepancies(instance)
+    previous = instance.saved_copy()
+    if previous is None:
+        # e.g. a bulk created report, whose previous values are not known
+        apply_summary_deltas(flipped)
+        refresh_summary(district_id, instance.for_date)
+        return
+    district_ids.setdefault(previous.school_id, school_district_id(previous))
+    apply_summary_deltas(merge_deltas(
+        flipped, report_deltas([previous], district_ids, sign=-1), report_deltas([instance], district_ids)))
 
 @receiver(post_save, sender=AuthorityReport)
-def send_discrepancy_email(sender, instance, created, **kwargs):
-    if instance.is_discrepant:
-        print(
-            'Report Discrepancy: School {} - {}'.format(instance.school.name, instance.for_date),
-            """
-            Dear Sir/Madam,
+def update_district_daily_discrepancies(sender, instance, created, **kwargs):
+    district_ids = {instance.school_id: school_district_id(instance)}
+    if created:
+        apply_summary_deltas(discrepancy_deltas([instance], district_ids))
+        return
+
+    previous = instance.saved_copy()
+    if previous is None:
+        refresh_summary(district_ids[instance.school_id], instance.for_date)
+        return
+    district_ids.setdefault(previous.school_id, school_district_id(previous))
+    apply_summary_deltas(merge_deltas(
+        discrepancy_deltas([previous], district_ids, sign=-1), discrepancy_deltas([instance], district_ids)))
+
+@receiver(post_delete, sender=Report)
+@receiver(post_delete, sender=AuthorityReport)
+def remove_from_district_daily_summary(sender, instance, **kwargs):
+    # the deleted row holds the values counted in the summary
+    removed = instance.saved_copy() or instance
+    district_ids = {removed.school_id: school_district_id(removed)}
+    if sender is Report:
+        apply_summary_deltas(report_deltas([removed], district_ids, sign=-1))
+    else:
+        apply_summary_deltas(discrepancy_deltas([removed], district_ids, sign=-1))
+
+@receiver([post_save, post_delete], sender=Schedule)
+def invalidate_schedule_cache(sender, instance, **kwargs):
+    invalidate_schedule_items(instance.district_id, instance.day)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
 
-            There seems to be a discrepancy in the {}'s report for the school {}. 
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # e.g. deactivation or a change of is_authority
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
 
-            Report given by school:
+@receiver([post_save, post_delete], sender=Report)
+@receiver([post_save, post_delete], sender=AuthorityReport)
+def bump_report_versions(sender, instance, **kwargs):
+    bump_versions_on_commit(school_scope(instance.school_id), district_scope(school_district_id(instance)))
 
-            Student count: {},
-            Food items: {}
+@receiver([post_save, post_delete], sender=School)
+def bump_school_versions(sender, instance, **kwargs):
+    # the school is nested in the authority reports of its district
+    bump_versions_on_commit(school_scope(instance.pk), district_scope(instance.district_id))
 
-            Report predicted by the system:
+@receiver([post_save, post_delete], sender=Authority)
+def bump_authority_versions(sender, instance, **kwargs):
+    bump_versions_on_commit(district_scope(instance.district_id))
 
-            Student count: {},
-            Food items: {}
-            """.format(instance.for_date, instance.school.name, 
-                       instance.actual.student_count, instance.actual.items.all(),
-                       instance.estimate.student_count, instance.estimate.items.all()),
-        )
-                
\ No newline at end of file
+@receiver([post_save, post_delete], sender=District)
+@receiver([post_save, post_delete], sender=Schedule)
+def bump_model_versions(sender, instance, **kwargs):
+    # invalidates the ETags and the cached responses built from the table
+    bump_versions_on_commit(model_scope(sender))
@@ -0,0 +1,52 @@
+import threading
+from io import StringIO
+from django.test import SimpleTestCase
+from api.alerts import Alert, AlertDispatcher, AlertDropped, ConsoleAlertBackend
+
+
+class BlockingAlertBackend:
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.sent = []
+
+    def send(self, alert):
+        self.release.wait()
+        self.sent.append(alert)
+
+
+class AlertDispatcherTest(SimpleTestCase):
+
+    def test_alerts_are_delivered(self):
+        stream = StringIO()
+        dispatcher = AlertDispatcher(ConsoleAlertBackend(stream), workers=2)
+        results = []
+        for i in range(5):
+            dispatcher.submit(Alert('a{}@test.com'.format(i), 'Subject', 'Body'),
+                              lambda alert, error: results.append(error))
+        dispatcher.join()
+        dispatcher.shutdown()
+
+        self.assertEqual(results, [None] * 5)
+        self.assertEqual(stream.getvalue().count('Subject'), 5)
+        self.assertEqual(dispatcher.stats(), {'queue_depth': 0, 'sent': 5, 'failed': 0, 'dropped': 0})
+
+    def test_full_queue_drops_alerts(self):
+        backend = BlockingAlertBackend()
+        dispatcher = AlertDispatcher(backend, workers=1, max_queue_size=1, enqueue_timeout=0.01)
+        errors = []
+
+        def callback(alert, error):
+            errors.append(error)
+
+        # one alert is being sent, one waits in the queue, the rest are dropped
+        queued = [dispatcher.submit(Alert('a@test.com', str(i), ''), callback) for i in range(4)]
+        self.assertEqual(dispatcher.stats()['dropped'], sum(1 for ok in queued if not ok))
+        self.assertGreaterEqual(dispatcher.stats()['dropped'], 2)
+        self.assertTrue(all(isinstance(error, AlertDropped) for error in errors))
+
+        backend.release.set()
+        dispatcher.join()
+        dispatcher.shutdown()
+        self.assertEqual(len(backend.sent), sum(1 for ok in queued if ok))
+        self.assertEqual(dispatcher.queue_depth, 0)
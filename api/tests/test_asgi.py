@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from datetime import date
+from unittest import mock
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from api.asgi import ReadPathASGIHandler
+from api.benchmarks.concurrency import Target, read_response
+from api.models import Authority, CustomUser, District, Report, School
+
+READ_THREADS = 2
+
+
+@override_settings(ASGI_READ_PATH={
+    'URL_NAMES': ['district_list', 'report_export'], 'DB_CONCURRENCY': READ_THREADS, 'MAX_WAITING': 5,
+})
+class ReadPathASGIHandlerTest(TransactionTestCase):
+
+    def setUp(self):
+        self.district = District.objects.create(name='XYZ')
+        self.handler = ReadPathASGIHandler()
+
+    def tearDown(self):
+        # each thread of the read pool closes its own connection
+        barrier = threading.Barrier(READ_THREADS)
+
+        def close_connections():
+            barrier.wait(5)
+            connections.close_all()
+        for future in [self.handler.read_executor.submit(close_connections) for _ in range(READ_THREADS)]:
+            future.result()
+        self.handler.read_executor.shutdown()
+
+    def request(self, path, method='GET', headers=(), body=b''):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'query_string': b'',
+            'headers': [(b'host', b'testserver')] + list(headers), 'server': ('testserver', 80),
+        }
+
+        async def communicate():
+            communicator = ApplicationCommunicator(self.handler, scope)
+            await communicator.send_input({'type': 'http.request', 'body': body})
+            start = await communicator.receive_output(5)
+            content = b''
+            while True:
+                message = await communicator.receive_output(5)
+                content += message.get('body', b'')
+                if not message.get('more_body', False):
+                    return start['status'], content
+        return async_to_sync(communicate)()
+
+    def test_read_path_runs_on_read_pool(self):
+        threads = []
+        get_sync_response = self.handler.get_sync_response
+
+        def record_thread(request):
+            threads.append(threading.current_thread().name)
+            return get_sync_response(request)
+        self.handler.get_sync_response = record_thread
+
+        with mock.patch('api.asgi.check_persistent_connections') as check_persistent_connections:
+            status, body = self.request('/api/districts/')
+        self.assertEqual(status, 200, body)
+        self.assertIn(b'XYZ', body)
+        self.assertTrue(threads[0].startswith('read-path'))
+        # the connections of the read threads are checked by the thread
+        check_persistent_connections.assert_called_once_with()
+        self.assertEqual(self.handler.waiting, 0)
+
+        status, _ = self.request('/api/districts/', method='POST')
+        self.assertEqual(status, 405)
+        self.assertEqual(len(threads), 2)
+        self.assertFalse(threads[1].startswith('read-path'))
+
+    def test_other_paths_are_served(self):
+        status, _ = self.request('/api/authorities/me/')
+        self.assertEqual(status, 401)
+
+    def test_writes_check_their_connection(self):
+        user = CustomUser.objects.create_user(username='school', email='school@test.com', password='Ltye$4T5')
+        School.objects.create(user=user, name='School', district=self.district)
+        token = Token.objects.create(user=user)
+        threads = []
+
+        def check_in_thread():
+            threads.append(threading.current_thread())
+        with mock.patch('api.asgi.check_persistent_connections', side_effect=check_in_thread):
+            status, body = self.request('/api/schools/me/', method='PATCH', body=b'{"name": "New"}', headers=[
+                (b'authorization', 'Token {}'.format(token.key).encode()),
+                (b'content-type', b'application/json'), (b'content-length', b'15'),
+            ])
+        self.assertEqual(status, 200, body)
+        self.assertEqual(School.objects.get(user=user).name, 'New')
+        # checked by the thread which served the request
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+        self.assertFalse(threads[0].name.startswith('read-path'))
+
+    def test_export_is_streamed_off_the_event_loop(self):
+        user = CustomUser.objects.create_user(
+            username='authority', email='authority@test.com', password='Ltye$4T5', is_authority=True)
+        authority = Authority.objects.create(user=user, district=self.district)
+        school_user = CustomUser.objects.create_user(username='school', email='school@test.com', password='Ltye$4T5')
+        school = School.objects.create(user=school_user, name='School', district=self.district, authority=authority)
+        Report.objects.create(school=school, student_count=45, for_date=date(2020, 8, 3), added_by_school=True)
+        token = Token.objects.create(user=user)
+
+        status, body = self.request('/api/authorities/me/export/reports',
+                                    headers=[(b'authorization', 'Token {}'.format(token.key).encode())])
+        self.assertEqual(status, 200, body)
+        # the header and the report
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_requests_are_shed_when_too_many_wait(self):
+        self.handler.waiting = 5
+
+        status, _ = self.request('/api/districts/')
+        self.assertEqual(status, 503)
+
+
+class LoadTestClientTest(SimpleTestCase):
+
+    def read(self, data):
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await read_response(reader)
+        return async_to_sync(read)()
+
+    def test_parse_target(self):
+        target = Target.parse('asgi=http://127.0.0.1:8001')
+        self.assertEqual((target.name, target.host, target.port), ('asgi', '127.0.0.1', 8001))
+        with self.assertRaises(ValueError):
+            Target.parse('http://127.0.0.1:8001')
+
+    def test_read_response(self):
+        self.assertEqual(self.read(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n[]'), (200, True))
+        self.assertEqual(self.read(
+            b'HTTP/1.1 503 Service Unavailable\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n'
+            b'2\r\n[]\r\n0\r\n\r\n'), (503, False))
+        self.assertEqual(self.read(b'HTTP/1.0 200 OK\r\n\r\n[]'), (200, False))
@@ -0,0 +1,305 @@
+import json
+from datetime import date
+from io import StringIO
+from unittest import mock
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from api.benchmarks.commands import write_results
+from api.benchmarks.connections import run_connection_benchmark
+from api.benchmarks.runner import ENDPOINTS, Scale, run_benchmark
+from api.benchmarks.storage import run_storage_benchmark
+from api.alerts import AlertDropped
+from api.notifications import claim_notifications, format_digest, send_notifications
+from api.models import CustomUser, District, School, MenuItem, Report, ReportItem, Schedule, AuthorityReport, Authority, DiscrepancyNotification, DistrictDailySummary
+
+
+class BackfillDiscrepancyTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        district = District.objects.create(name='XYZ')
+        for i, estimate_count in enumerate([45, 20, 44]):
+            user = CustomUser.objects.create_user(
+                username='school{}'.format(i),
+                email='school{}@test.com'.format(i),
+                password='Ltye$4T5',
+            )
+            school = School.objects.create(user=user, name='School {}'.format(i), district=district)
+            actual = Report.objects.create(
+                school=school, student_count=45, for_date=date(2020, 8, 3), added_by_school=True)
+            Report.objects.create(
+                school=school, student_count=estimate_count, for_date=date(2020, 8, 3), actual_report=actual)
+
+    def test_backfill_discrepancy(self):
+        AuthorityReport.objects.update(discrepancy_ratio=None, discrepant=False)
+
+        call_command('backfill_discrepancy', batch_size=2, stdout=StringIO())
+
+        self.assertFalse(AuthorityReport.objects.filter(discrepancy_ratio=None).exists())
+        self.assertEqual(AuthorityReport.objects.discrepant().count(), 1)
+        for report in AuthorityReport.objects.with_discrepancy():
+            self.assertEqual(report.computed_discrepant, report.discrepant)
+
+
+class SendDiscrepancyNotificationsTest(TransactionTestCase):
+
+    def setUp(self):
+        district = District.objects.create(name='XYZ')
+        authority_user = CustomUser.objects.create_user(
+            username='authority', email='authority@test.com', password='Ltye$4T5', is_authority=True)
+        authority = Authority.objects.create(user=authority_user, district=district)
+        idly = MenuItem.objects.create(name='idly')
+        for i, estimate_count in enumerate([45, 20, 30]):
+            user = CustomUser.objects.create_user(
+                username='school{}'.format(i),
+                email='school{}@test.com'.format(i),
+                password='Ltye$4T5',
+            )
+            school = School.objects.create(user=user, name='School {}'.format(i), district=district, authority=authority)
+            actual = Report.objects.create(
+                school=school, student_count=45, for_date=date(2020, 8, 3), added_by_school=True)
+            actual.items.create(item=idly)
+            Report.objects.create(
+                school=school, student_count=estimate_count, for_date=date(2020, 8, 3), actual_report=actual)
+
+    def test_discrepant_reports_are_queued_on_commit(self):
+        self.assertEqual(DiscrepancyNotification.objects.count(), 2)
+        self.assertFalse(DiscrepancyNotification.objects.exclude(status=DiscrepancyNotification.PENDING).exists())
+
+    def test_resaved_reports_are_not_queued_again(self):
+        for authority_report in AuthorityReport.objects.all():
+            authority_report.save()
+        self.assertEqual(DiscrepancyNotification.objects.count(), 2)
+
+        # the estimate changed after the report was loaded
+        authority_report = AuthorityReport.objects.select_related('estimate').get(discrepant=False)
+        authority_report.estimate.student_count = 10
+        authority_report.save()
+        self.assertEqual(DiscrepancyNotification.objects.count(), 3)
+
+    def test_send_digest_per_authority(self):
+        call_command('send_discrepancy_notifications', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['authority@test.com'])
+        self.assertIn('School 1', mail.outbox[0].body)
+        self.assertIn('School 2', mail.outbox[0].body)
+        self.assertEqual(DiscrepancyNotification.objects.filter(status=DiscrepancyNotification.SENT).count(), 2)
+
+    def test_digest_formatting_does_not_query(self):
+        notifications = claim_notifications(10)
+        with self.assertNumQueries(0):
+            subject, body = format_digest([notification.authority_report for notification in notifications])
+        self.assertEqual(subject, 'Report Discrepancy: 2 report(s)')
+        self.assertIn('Food items: idly', body)
+
+    def test_send_failure_is_retried_later(self):
+        with mock.patch('api.alerts.send_mail', side_effect=ConnectionRefusedError('SMTP down')):
+            call_command('send_discrepancy_notifications', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 0)
+        for notification in DiscrepancyNotification.objects.all():
+            self.assertEqual(notification.status, DiscrepancyNotification.PENDING)
+            self.assertEqual(notification.attempts, 1)
+            self.assertIn('SMTP down', notification.last_error)
+            self.assertGreater(notification.next_attempt_on, timezone.now())
+
+        # not due yet, so nothing is sent
+        call_command('send_discrepancy_notifications', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_dropped_alert_is_not_counted_as_attempt(self):
+        dispatcher = mock.Mock()
+        dispatcher.submit.side_effect = lambda alert, callback: callback(alert, AlertDropped('The alert queue is full.'))
+        self.assertEqual(send_notifications(dispatcher), 2)
+
+        for notification in DiscrepancyNotification.objects.all():
+            self.assertEqual(notification.status, DiscrepancyNotification.PENDING)
+            self.assertEqual(notification.attempts, 0)
+            self.assertLessEqual(notification.next_attempt_on, timezone.now())
+
+
+class RebuildDistrictSummariesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.district = District.objects.create(name='XYZ')
+        for i, estimate_count in enumerate([45, 20]):
+            user = CustomUser.objects.create_user(
+                username='school{}'.format(i),
+                email='school{}@test.com'.format(i),
+                password='Ltye$4T5',
+            )
+            school = School.objects.create(user=user, name='School {}'.format(i), district=cls.district)
+            for day in (3, 4):
+                actual = Report.objects.create(
+                    school=school, student_count=45, for_date=date(2020, 8, day), added_by_school=True)
+                Report.objects.create(
+                    school=school, student_count=estimate_count, for_date=date(2020, 8, day), actual_report=actual)
+
+    def assert_summary(self, summary):
+        self.assertEqual(summary.actual_report_count, 2)
+        self.assertEqual(summary.estimate_report_count, 2)
+        self.assertEqual(summary.meals_served, 90)
+        self.assertEqual(summary.estimated_student_count, 65)
+        self.assertEqual(summary.discrepancy_count, 1)
+
+    def test_summaries_maintained_incrementally(self):
+        self.assertEqual(DistrictDailySummary.objects.count(), 2)
+        for summary in DistrictDailySummary.objects.all():
+            self.assert_summary(summary)
+
+    def test_summaries_adjusted_on_updates_and_deletes(self):
+        def summaries():
+            return list(DistrictDailySummary.objects.order_by('for_date').values())
+
+        with mock.patch('api.signals.refresh_summary') as refresh_summary:
+            estimate = Report.objects.get(school__name='School 0', for_date=date(2020, 8, 3), added_by_school=False)
+            estimate.student_count = 20
+            estimate.save()
+            Report.objects.get(school__name='School 1', for_date=date(2020, 8, 4), added_by_school=True).delete()
+        refresh_summary.assert_not_called()
+
+        adjusted = summaries()
+        self.assertEqual(adjusted[0]['estimated_student_count'], 40)
+        self.assertEqual(adjusted[0]['discrepancy_count'], 2)
+        self.assertEqual(adjusted[1]['actual_report_count'], 1)
+        self.assertEqual(adjusted[1]['discrepancy_count'], 0)
+        call_command('rebuild_district_summaries', '--from', '2020-08-03', '--to', '2020-08-04', stdout=StringIO())
+        self.assertEqual([dict(summary, id=None) for summary in summaries()],
+                         [dict(summary, id=None) for summary in adjusted])
+
+    def test_reports_without_summary_updated_and_deleted(self):
+        # reports stored before the summaries were maintained
+        DistrictDailySummary.objects.all().delete()
+
+        estimate = Report.objects.get(school__name='School 0', for_date=date(2020, 8, 3), added_by_school=False)
+        estimate.student_count = 20
+        estimate.save()
+        Report.objects.get(school__name='School 1', for_date=date(2020, 8, 4), added_by_school=True).delete()
+
+        summaries = list(DistrictDailySummary.objects.order_by('for_date'))
+        self.assertEqual(len(summaries), 2)
+        self.assertEqual(summaries[0].actual_report_count, 2)
+        self.assertEqual(summaries[0].estimated_student_count, 40)
+        self.assertEqual(summaries[0].discrepancy_count, 2)
+        self.assertEqual(summaries[1].actual_report_count, 1)
+        self.assertEqual(summaries[1].actual_student_count, 45)
+        self.assertEqual(summaries[1].discrepancy_count, 0)
+
+    def test_rebuild_district_summaries(self):
+        DistrictDailySummary.objects.update(actual_report_count=0, discrepancy_count=7)
+
+        call_command('rebuild_district_summaries', '--from', '2020-08-01', '--to', '2020-08-03', stdout=StringIO())
+
+        self.assert_summary(DistrictDailySummary.objects.get(for_date=date(2020, 8, 3)))
+        untouched = DistrictDailySummary.objects.get(for_date=date(2020, 8, 4))
+        self.assertEqual(untouched.discrepancy_count, 7)
+
+
+class BenchmarkTest(TransactionTestCase):
+
+    def test_parse_scale(self):
+        scale = Scale.parse('2x30x7')
+        self.assertEqual((scale.districts, scale.schools_per_district, scale.days), (2, 30, 7))
+        self.assertEqual(str(scale), '2x30x7')
+        for value in ['2x30', '0x30x7', 'twoxthirtyxseven']:
+            with self.assertRaises(ValueError):
+                Scale.parse(value)
+
+    def test_write_results(self):
+        command = BaseCommand(stdout=StringIO())
+        write_results(command, '-', {'median_ms': 1.5}, database='sqlite', repeat=2)
+        output = json.loads(command.stdout.getvalue())
+        self.assertEqual(list(output), ['run_on', 'database', 'python', 'django', 'repeat', 'results'])
+        self.assertEqual(output['results'], {'median_ms': 1.5})
+
+    def test_run_benchmark(self):
+        results = run_benchmark([Scale(1, 3, 2)], repeat=4, warmup=1)
+
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertEqual(result['schools'], 3)
+        # two seeded days of actual and estimate reports, the estimates of
+        # the benchmarked days and the reports created by the benchmark
+        self.assertEqual(result['reports'], 3 * 2 * 2 + 3 * 2 + 5)
+        self.assertEqual(list(result['endpoints']), ENDPOINTS)
+        for timings in result['endpoints'].values():
+            self.assertEqual(timings['requests'], 4)
+            self.assertLessEqual(timings['min_ms'], timings['median_ms'])
+            self.assertLessEqual(timings['median_ms'], timings['max_ms'])
+        self.assertEqual(AuthorityReport.objects.filter(for_date__gt=date(2020, 8, 4)).count(), 5)
+
+    def test_run_connection_benchmark(self):
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        results = run_connection_benchmark(requests=3, warmup=1, conn_max_age=30)
+
+        self.assertEqual(list(results), ['per_request', 'persistent', 'saved_ms_per_request'])
+        self.assertEqual(results['persistent']['requests'], 3)
+        self.assertEqual(results['persistent']['connections_opened'], 0)
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], max_age)
+
+    def test_run_storage_benchmark(self):
+        results = run_storage_benchmark(schools=2, days=7, items_per_report=2)
+
+        self.assertEqual(results['report_items'], 2 * 7 * 2)
+        self.assertEqual(results['before']['api_menuitem'], 0)
+        self.assertGreater(results['after']['api_menuitem'], 0)
+        # the migrations kept the names, now stored once per menu item
+        self.assertEqual(MenuItem.objects.count(), Schedule.objects.values('item').distinct().count())
+        for report in Report.objects.prefetch_related('items'):
+            self.assertCountEqual(
+                [item.item.name for item in report.items.all()],
+                Schedule.objects.filter(day=report.for_date.weekday()).values_list('item__name', flat=True))
+        self.assertEqual(ReportItem.objects.count(), results['report_items'])
+
+
+class GenerateDataTest(TestCase):
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_data', districts=2, schools=6, days=3, stdout=out, **options)
+        return out.getvalue()
+
+    def test_generate_data(self):
+        output = self.generate(seed=1)
+
+        self.assertIn('rows/s', output)
+        self.assertEqual(District.objects.count(), 2)
+        self.assertEqual(Authority.objects.count(), 2)
+        self.assertEqual(School.objects.filter(district__authority__isnull=False).count(), 6)
+        self.assertEqual(Report.objects.filter(added_by_school=True).count(), 6 * 3)
+        self.assertEqual(Report.objects.filter(added_by_school=False, actual_report__isnull=False).count(), 6 * 3)
+        self.assertEqual(AuthorityReport.objects.count(), 6 * 3)
+        for authority_report in AuthorityReport.objects.select_related('estimate', 'actual'):
+            self.assertEqual(authority_report.estimate.actual_report_id, authority_report.actual_id)
+            self.assertEqual(authority_report.estimate.school_id, authority_report.school_id)
+        self.assertEqual(DistrictDailySummary.objects.count(), 2 * 3)
+        self.assertTrue(CustomUser.objects.get(username='school0-0').check_password('mdm-fixture'))
+        # the report items follow the menu of the district
+        report = Report.objects.filter(added_by_school=True).select_related('school').first()
+        self.assertEqual(
+            sorted(report.items.values_list('item__name', flat=True)),
+            sorted(report.school.district.schedule_set.filter(day=report.for_date.weekday()).values_list('item__name', flat=True)),
+        )
+
+    def generated_counts(self, seed):
+        with transaction.atomic():
+            self.generate(seed=seed)
+            counts = list(Report.objects.order_by('school__user__username', 'for_date', 'added_by_school')
+                          .values_list('student_count', flat=True))
+            transaction.set_rollback(True)
+        return counts
+
+    def test_generate_data_is_reproducible(self):
+        self.assertEqual(self.generated_counts(7), self.generated_counts(7))
+        self.assertNotEqual(self.generated_counts(7), self.generated_counts(8))
+
+    def test_generate_data_into_generated_database(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,75 @@
+from unittest import mock
+from django.core.signals import request_started
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from api.db import connection_stats, iterate_rows
+from api.models import District
+from mdm.database import postgres_database
+
+
+class DatabaseSettingsTest(SimpleTestCase):
+
+    def test_defaults(self):
+        database = postgres_database({})
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['OPTIONS'], {'connect_timeout': 5})
+
+    def test_pgbouncer_transaction_pooling(self):
+        database = postgres_database({
+            'DJANGO_DB_POOL_MODE': 'transaction', 'DJANGO_DB_CONN_MAX_AGE': '0', 'DJANGO_DB_HEALTH_CHECKS': 'off',
+            'DJANGO_POSTGRES_PORT': '6432',
+        })
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(database['PORT'], '6432')
+
+        with self.assertRaises(ValueError):
+            postgres_database({'DJANGO_DB_POOL_MODE': 'statement'})
+
+
+class ConnectionHealthCheckTest(TransactionTestCase):
+
+    def setUp(self):
+        connection.ensure_connection()
+        # a persistent connection, which Django does not close itself
+        connection.close_at = None
+        connection_stats.reset()
+
+    def test_open_connection_is_reused(self):
+        with mock.patch.dict(connection.settings_dict, {'CONN_HEALTH_CHECKS': True}):
+            request_started.send(sender=self.__class__)
+        self.assertIsNotNone(connection.connection)
+        # not counted until the request queries it
+        self.assertEqual(connection_stats.as_dict(), {})
+
+        District.objects.count()
+        District.objects.count()
+        self.assertEqual(connection_stats.as_dict()['default']['reused'], 1)
+        request_started.send(sender=self.__class__)
+        self.assertEqual(connection_stats.as_dict()['default']['reused'], 1)
+
+    def test_broken_connection_is_closed(self):
+        with mock.patch.dict(connection.settings_dict, {'CONN_HEALTH_CHECKS': True}), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            request_started.send(sender=self.__class__)
+
+        close.assert_called_once_with()
+        self.assertEqual(connection_stats.as_dict()['default']['unusable'], 1)
+
+
+class IterateRowsTest(TransactionTestCase):
+
+    def setUp(self):
+        District.objects.bulk_create([District(name='District{}'.format(i)) for i in range(7)])
+
+    def test_pages_without_server_side_cursors(self):
+        expected = list(District.objects.order_by('id').values_list('id', 'name'))
+        self.assertEqual(list(iterate_rows(District.objects.all(), ['id', 'name'], 3)), expected)
+
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}), \
+                self.assertNumQueries(3):
+            self.assertEqual(list(iterate_rows(District.objects.all(), ['id', 'name'], 3)), expected)
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.metrics import Histogram, REQUEST_HISTOGRAMS, request_db_queries, request_duration, request_serializer_duration
+from api.models import CustomUser, District
+
+
+class HistogramTest(APITestCase):
+
+    def test_render(self):
+        histogram = Histogram('test_seconds', 'Test.', 'endpoint', (0.1, 1.0))
+        histogram.observe('a', 0.05)
+        histogram.observe('a', 0.5)
+        histogram.observe('a', 5)
+
+        self.assertEqual(histogram.snapshot('a'), (3, 5.55))
+        self.assertEqual(histogram.render(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{endpoint="a",le="0.1"} 1',
+            'test_seconds_bucket{endpoint="a",le="1.0"} 2',
+            'test_seconds_bucket{endpoint="a",le="+Inf"} 3',
+            'test_seconds_sum{endpoint="a"} 5.55',
+            'test_seconds_count{endpoint="a"} 3',
+        ])
+
+
+class MetricsMiddlewareTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        for histogram in REQUEST_HISTOGRAMS:
+            histogram.reset()
+        for i in range(3):
+            District.objects.create(name='District{}'.format(i))
+
+    def test_request_is_recorded_by_url_name(self):
+        response = self.client.get(reverse('district_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(request_duration.snapshot('district_list')[0], 1)
+        self.assertEqual(request_db_queries.snapshot('district_list'), (1, 1))
+        count, serializer_duration = request_serializer_duration.snapshot('district_list')
+        self.assertEqual(count, 1)
+        self.assertGreater(serializer_duration, 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('district_list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        staff = CustomUser.objects.create_user(
+            username='staff', email='staff@test.com', password='Ltye$4T5', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('mdm_request_db_queries_count{endpoint="district_list"} 1', body)
+        self.assertIn('# TYPE mdm_request_duration_seconds histogram', body)
+        self.assertIn('mdm_cache_hit_ratio{cache="schedule"}', body)
+        self.assertIn('mdm_cache_hits_total{cache="token_auth"}', body)
+        self.assertIn('# TYPE mdm_db_connections_opened_total counter', body)
+
+    @override_settings(REQUEST_METRICS={'METRICS_TOKEN': 'secret'})
+    def test_metrics_endpoint_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(REQUEST_METRICS={'SLOW_REQUEST_MS': 0})
+    def test_slow_request_log(self):
+        with self.assertLogs('api.metrics', 'WARNING') as logs:
+            self.client.get(reverse('district_list'))
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('district_list', logs.output[0])
+        self.assertIn('api_district', logs.output[0])
@@ -1,7 +1,8 @@
 from django.test import TestCase
 from django.db import IntegrityError
 from django.core.exceptions import ValidationError
-from api.models import CustomUser
+from api.models import CustomUser, District, School, MenuItem, Report, AuthorityReport
+from datetime import date
 from email_validator import EmailNotValidError
 
 
@@ -70,3 +71,85 @@ class CustomUserTest(TestCase):
                 email=self.email,
                 password='',
             )
+
+
+class AuthorityReportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        district = District.objects.create(name='XYZ')
+        cls.pairs = [(45, 45), (45, 41), (45, 40), (50, 45), (0, 0), (0, 10)]
+        for i, (actual_count, estimate_count) in enumerate(cls.pairs):
+            user = CustomUser.objects.create_user(
+                username='school{}'.format(i),
+                email='school{}@test.com'.format(i),
+                password='Ltye$4T5',
+            )
+            school = School.objects.create(user=user, name='School {}'.format(i), district=district)
+            actual = Report.objects.create(
+                school=school, student_count=actual_count, for_date=date(2020, 8, 3), added_by_school=True)
+            Report.objects.create(
+                school=school, student_count=estimate_count, for_date=date(2020, 8, 3), actual_report=actual)
+
+    def test_discrepancy_annotation_matches_stored_flag(self):
+        authority_reports = AuthorityReport.objects.with_discrepancy()
+        self.assertEqual(len(authority_reports), len(self.pairs))
+        for report in authority_reports:
+            self.assertEqual(report.computed_discrepant, report.is_discrepant)
+
+    def test_discrepant_filter(self):
+        discrepant_ids = set(AuthorityReport.objects.discrepant().values_list('id', flat=True))
+        expected_ids = {report.id for report in AuthorityReport.objects.all() if report.is_discrepant}
+        self.assertEqual(discrepant_ids, expected_ids)
+        self.assertEqual(len(discrepant_ids), 3)
+
+    def test_unarchived_filter(self):
+        # archiving detaches the reports without deleting the authority reports
+        Report.objects.filter(school__name='School 5')._raw_delete('default')
+
+        self.assertEqual(AuthorityReport.objects.count(), len(self.pairs))
+        self.assertEqual(AuthorityReport.objects.unarchived().count(), len(self.pairs) - 1)
+        self.assertFalse(AuthorityReport.objects.unarchived().filter(school__name='School 5').exists())
+
+    def test_discrepancy_ratio_stored_on_create(self):
+        report = AuthorityReport.objects.get(actual__student_count=50)
+        self.assertAlmostEqual(report.discrepancy_ratio, 0.1)
+        self.assertTrue(report.discrepant)
+
+    def test_discrepancy_recomputed_on_student_count_change(self):
+        report = AuthorityReport.objects.get(actual__student_count=45, estimate__student_count=41)
+        self.assertFalse(report.discrepant)
+
+        estimate = report.estimate
+        estimate.student_count = 30
+        estimate.save()
+
+        report.refresh_from_db()
+        self.assertAlmostEqual(report.discrepancy_ratio, 15 / 45)
+        self.assertTrue(report.discrepant)
+
+    def test_authority_report_created_unless_the_caller_links_it(self):
+        school = School.objects.get(name='School 0')
+        actual = Report.objects.create(school=school, student_count=45, for_date=date(2020, 8, 4), added_by_school=True)
+        estimate = Report(school=school, student_count=40, for_date=date(2020, 8, 4))
+        estimate.save(create_authority_report=False)
+        self.assertFalse(AuthorityReport.objects.filter(for_date=date(2020, 8, 4)).exists())
+
+        estimate.delete()
+        estimate = Report.objects.create(school=school, student_count=40, for_date=date(2020, 8, 4))
+        authority_report = AuthorityReport.objects.get(for_date=date(2020, 8, 4))
+        self.assertEqual((authority_report.actual, authority_report.estimate), (actual, estimate))
+
+
+class MenuItemTest(TestCase):
+
+    def test_get_ids_adds_missing_names(self):
+        idly = MenuItem.objects.create(name='idly')
+
+        with self.assertNumQueries(3):
+            ids = MenuItem.objects.get_ids(['idly', 'dosa', 'idly'])
+
+        self.assertEqual(ids, {'idly': idly.pk, 'dosa': MenuItem.objects.get(name='dosa').pk})
+        with self.assertNumQueries(1):
+            self.assertEqual(MenuItem.objects.get_ids(['dosa', 'idly']), ids)
+        self.assertEqual(MenuItem.objects.get_ids([]), {})
@@ -0,0 +1,148 @@
+from datetime import date
+from io import StringIO
+from unittest import skipIf, skipUnless
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from api.models import CustomUser, District, School, MenuItem, Report, ReportItem, AuthorityReport, DistrictDailySummary
+from api.partitions import add_months, constraint_sql, month_range, month_start, partition_name
+from api.serializers import EstimateReportSerializer
+
+
+def quote_name(name):
+    return '"{}"'.format(name)
+
+
+def create_school():
+    district = District.objects.create(name='XYZ')
+    user = CustomUser.objects.create_user(username='school', email='school@test.com', password='Ltye$4T5')
+    return School.objects.create(user=user, name='School', district=district)
+
+
+def create_reports(school, for_date):
+    actual = Report.objects.create(school=school, student_count=45, for_date=for_date, added_by_school=True)
+    actual.items.create(item=MenuItem.objects.get_or_create(name='idly')[0])
+    estimate = Report.objects.create(school=school, student_count=40, for_date=for_date, actual_report=actual)
+    estimate.items.create(item=MenuItem.objects.get_or_create(name='dosa')[0])
+    return actual, estimate
+
+
+class PartitionHelpersTest(SimpleTestCase):
+
+    def test_months(self):
+        self.assertEqual(add_months(date(2020, 11, 1), 3), date(2021, 2, 1))
+        self.assertEqual(month_start(date(2020, 8, 17)), date(2020, 8, 1))
+        self.assertEqual(list(month_range(date(2020, 11, 17), date(2021, 1, 1))),
+                         [date(2020, 11, 1), date(2020, 12, 1), date(2021, 1, 1)])
+        self.assertEqual(partition_name('api_report', date(2020, 8, 1)), 'api_report_p2020_08')
+
+    def test_unique_constraints_include_the_partition_key(self):
+        constraint = {'columns': ['id'], 'primary_key': True, 'unique': True, 'foreign_key': None, 'index': False}
+        self.assertEqual(constraint_sql(quote_name, 'api_report', 'api_report_pkey', constraint),
+                         'ALTER TABLE "api_report" ADD CONSTRAINT "api_report_pkey" PRIMARY KEY ("id", "for_date")')
+
+        constraint = {'columns': ['report_id', 'item'], 'primary_key': False, 'unique': True, 'foreign_key': None,
+                      'index': False}
+        self.assertEqual(constraint_sql(quote_name, 'api_reportitem', 'uniq', constraint),
+                         'ALTER TABLE "api_reportitem" ADD CONSTRAINT "uniq" UNIQUE ("report_id", "item", "for_date")')
+
+        constraint = {'columns': ['school_id', 'for_date', 'id'], 'primary_key': False, 'unique': False,
+                      'foreign_key': None, 'index': True}
+        self.assertEqual(constraint_sql(quote_name, 'api_report', 'idx', constraint),
+                         'CREATE INDEX "idx" ON "api_report" ("school_id", "for_date", "id")')
+
+
+class ReportItemDateTest(TestCase):
+
+    def test_items_copy_the_report_date(self):
+        school = create_school()
+        actual, estimate = create_reports(school, date(2020, 8, 3))
+        self.assertEqual(set(ReportItem.objects.values_list('for_date', flat=True)), {date(2020, 8, 3)})
+
+        rice = MenuItem.objects.create(name='rice')
+        with self.assertNumQueries(2):
+            ReportItem.objects.bulk_create([
+                ReportItem(report=actual, item=rice),
+                ReportItem(report_id=estimate.pk, item=rice),
+            ])
+        self.assertFalse(ReportItem.objects.exclude(for_date=date(2020, 8, 3)).exists())
+
+    def test_items_follow_the_report_date(self):
+        _, estimate = create_reports(create_school(), date(2020, 8, 3))
+
+        serializer = EstimateReportSerializer(estimate, data={'for_date': '2020-08-04', 'items': []}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(list(estimate.items.values_list('for_date', flat=True)), [date(2020, 8, 4)])
+
+
+@skipIf(connection.vendor == 'postgresql', 'Partitions are only skipped on other databases')
+class ManagePartitionsOtherDatabaseTest(SimpleTestCase):
+
+    def test_command_needs_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('manage_partitions', stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitions need PostgreSQL')
+class ManagePartitionsTest(TransactionTestCase):
+
+    def setUp(self):
+        self.school = create_school()
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP SCHEMA IF EXISTS archive CASCADE')
+
+    def partition_of(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM {} WHERE id = %s'.format(model._meta.db_table), [pk])
+            return cursor.fetchone()[0]
+
+    def test_create_partitions(self):
+        actual, _ = create_reports(self.school, date(2020, 8, 3))
+        self.assertEqual(self.partition_of(Report, actual.pk), 'api_report_default')
+
+        call_command('manage_partitions', ahead=1, stdout=StringIO())
+
+        self.assertEqual(self.partition_of(Report, actual.pk), 'api_report_p2020_08')
+        self.assertEqual(self.partition_of(ReportItem, actual.items.get().pk), 'api_reportitem_p2020_08')
+        self.assertEqual(Report.objects.filter(for_date=date(2020, 8, 3)).count(), 2)
+
+        next_month = add_months(date.today(), 1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [partition_name('api_report', next_month)])
+            self.assertIsNotNone(cursor.fetchone()[0])
+
+    def test_current_month_reads_one_partition(self):
+        call_command('manage_partitions', ahead=1, stdout=StringIO())
+        this_month = month_start(date.today())
+
+        plan = Report.objects.filter(for_date__gte=this_month, for_date__lt=add_months(this_month, 1)).explain()
+
+        self.assertIn(partition_name('api_report', this_month), plan)
+        self.assertNotIn(partition_name('api_report', add_months(this_month, 1)), plan)
+        self.assertNotIn('api_report_default', plan)
+
+    def test_archive_detaches_old_months(self):
+        create_reports(self.school, date(2020, 8, 3))
+        create_reports(self.school, date(2020, 9, 3))
+        call_command('manage_partitions', ahead=0, stdout=StringIO())
+        self.assertEqual(AuthorityReport.objects.count(), 2)
+        summaries = list(DistrictDailySummary.objects.order_by('for_date').values())
+
+        call_command('manage_partitions', archive_before=date(2020, 9, 1), stdout=StringIO())
+
+        # the archived month keeps its summaries
+        self.assertEqual(list(DistrictDailySummary.objects.order_by('for_date').values()), summaries)
+        self.assertEqual(summaries[0]['discrepancy_count'], 1)
+
+        self.assertEqual(list(Report.objects.values_list('for_date', flat=True).distinct()), [date(2020, 9, 3)])
+        # the authority reports of the month are kept, but not listed
+        self.assertEqual(AuthorityReport.objects.count(), 2)
+        self.assertEqual(list(AuthorityReport.objects.unarchived().values_list('for_date', flat=True)),
+                         [date(2020, 9, 3)])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM archive.api_report_p2020_08')
+            self.assertEqual(cursor.fetchone()[0], 2)
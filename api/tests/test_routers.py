@@ -0,0 +1,111 @@
+import os
+import tempfile
+from datetime import date
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITransactionTestCase
+from api.checks import check_read_replica_cache
+from api.conditional import bump_version, district_scope, version_key
+from api.models import CustomUser, Authority, District, School, Report
+from api.routers import ReplicaRouter, reading_from
+
+
+# the pins have to be shared by the workers, which the file cache is
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'mdm-test-cache'),
+}}
+
+
+@override_settings(READ_REPLICA={
+    'ALIASES': ['replica'], 'URL_NAMES': ['authority_report_list', 'report_export'], 'PIN_SECONDS': 5,
+}, CACHES=SHARED_CACHES)
+class ReplicaRoutingTests(APITransactionTestCase):
+    # the replica is a test mirror of the primary
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.district = District.objects.create(name='XYZ')
+        user = CustomUser.objects.create_user(
+            username='authority', email='authority@test.com', password='Ltye$4T5', is_authority=True)
+        authority = Authority.objects.create(user=user, district=self.district)
+        for i in range(2):
+            school_user = CustomUser.objects.create_user(
+                username='school{}'.format(i), email='school{}@test.com'.format(i), password='Ltye$4T5')
+            school = School.objects.create(
+                user=school_user, name='School {}'.format(i), district=self.district, authority=authority)
+            actual = Report.objects.create(
+                school=school, student_count=45, for_date=date(2020, 8, 3), added_by_school=True)
+            Report.objects.create(school=school, student_count=40, for_date=date(2020, 8, 3), actual_report=actual)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        # the reports were not changed in the last PIN_SECONDS
+        cache.set(version_key(district_scope(self.district.id)), 1)
+
+    def get(self, url_name, table):
+        """
+        Returns the response to a GET, its content and the databases
+        which read `table`.
+        """
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse(url_name))
+            # streamed rows are read while the response is consumed
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        aliases = {alias for alias, queries in [('default', primary), ('replica', replica)]
+                   if any(table in query['sql'] for query in queries)}
+        return response, content, aliases
+
+    def test_list_reads_from_replica(self):
+        response, content, aliases = self.get('authority_report_list', 'api_authorityreport')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(aliases, {'replica'})
+
+        response, content, aliases = self.get('district_list', 'api_district')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {'default'})
+
+    def test_export_streams_from_replica(self):
+        response, content, aliases = self.get('report_export', 'api_report')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the header and the actual and estimate reports of both schools
+        self.assertEqual(len(content.splitlines()), 5)
+        self.assertEqual(aliases, {'replica'})
+
+    def test_client_reads_own_writes_from_primary(self):
+        response = self.client.patch(reverse('authority_me_retrieve_update'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response, content, aliases = self.get('authority_report_list', 'api_authorityreport')
+        self.assertEqual(aliases, {'default'})
+
+    def test_recently_changed_list_reads_from_primary(self):
+        bump_version(district_scope(self.district.id))
+
+        response, content, aliases = self.get('authority_report_list', 'api_authorityreport')
+        self.assertEqual(aliases, {'default'})
+
+    def test_replicas_need_shared_cache(self):
+        self.assertEqual(check_read_replica_cache(None), [])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in check_read_replica_cache(None)], ['api.E001'])
+            response, content, aliases = self.get('authority_report_list', 'api_authorityreport')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {'default'})
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Report), DEFAULT_DB_ALIAS)
+        with reading_from('replica'):
+            self.assertEqual(router.db_for_read(Report), 'replica')
+            self.assertEqual(router.db_for_read(CustomUser), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(Token), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_write(Report), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'api'))
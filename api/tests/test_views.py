@@ -1,14 +1,31 @@
+import csv
+import io
 import json
 from datetime import date, timedelta
+from unittest import mock
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.test import APITestCase
-from api.models import CustomUser, Authority, Report, District, School, ReportItem, Schedule
+from rest_framework.test import APITestCase, APITransactionTestCase
+from api.models import CustomUser, Authority, Report, District, School, MenuItem, ReportItem, Schedule, AuthorityReport, DistrictDailySummary
 from api.serializers import AuthoritySerializer, SchoolSerializer, SchoolReportSerializer, SchoolReportCreateSerializer, DistrictSerializer, AuthorityReportSerializer, EstimateReportSerializer
+from api.authentication import local_token_cache, token_auth_cache_stats
+from api.cache import response_cache_stats, response_cache_timeout, schedule_cache_stats, warm_schedule_cache
+from api import onboarding
+from api.hashing import MIN_PARALLEL_PASSWORDS, hash_passwords
+from api.views import ReportExport
 import datetime 
 import calendar 
 
+
+def menu_item(name):
+    return MenuItem.objects.get_or_create(name=name)[0]
+
+
 class AuthorityTests(APITestCase):
 
     def setUp(self):
@@ -58,19 +75,19 @@ class AuthorityTests(APITestCase):
         )
         items = ['idly', 'dosa', 'chutney']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
         return report
 
-    def create_estimate_report_for_actual_report(self, actual_report):
+    def create_estimate_report_for_actual_report(self, actual_report, student_count=45):
         report = Report.objects.create(
             school=actual_report.school,
-            student_count=45,
+            student_count=student_count,
             for_date=actual_report.for_date,
             actual_report=actual_report
         )
         items = ['idly', 'dosa']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
         return report
 
     def test_authority_enroll_with_auth(self):
@@ -131,22 +148,350 @@ class AuthorityTests(APITestCase):
         response_data = json.loads(response.content)
         self.assertEqual(response_data, authority_serializer_data)
 
+    def test_authority_enroll_reassigns_schools(self):
+        other_district = District.objects.create(name='ABC')
+        schools = self.create_schools_reporting_to_authority(None, 3)
+        other_school = School.objects.create(
+            user=CustomUser.objects.create_user(username='other', email='other@gmail.com', password='Tv#jlI2O*F'),
+            name='Other', district=other_district)
+
+        self.api_authenticate()
+        # the token, validation, the user and its tokens, then the authority
+        # and a single update of the schools in a savepoint
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('authority_enroll'), {'district': self.district.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        authority = Authority.objects.get()
+        self.assertEqual(School.objects.filter(authority=authority).count(), len(schools))
+        other_school.refresh_from_db()
+        self.assertIsNone(other_school.authority)
+
+    def test_authority_district_change_reassigns_schools(self):
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        old_schools = self.create_schools_reporting_to_authority(authority, 2)
+        new_district = District.objects.create(name='ABC')
+        new_school = School.objects.create(
+            user=CustomUser.objects.create_user(username='other', email='other@gmail.com', password='Tv#jlI2O*F'),
+            name='Other', district=new_district)
+
+        response = self.client.patch(reverse('authority_me_retrieve_update'), {'district': new_district.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        new_school.refresh_from_db()
+        self.assertEqual(new_school.authority_id, authority.pk)
+        self.assertFalse(School.objects.filter(pk__in=[school.pk for school in old_schools], authority__isnull=False).exists())
+
     def test_authority_update_without_auth(self):
         url = reverse('authority_me_retrieve_update')
 
         response = self.client.put(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_token_authentication_cache(self):
+        url = reverse('authority_me_retrieve_update')
+
+        self.api_authenticate()
+        self.create_authority_with_current_user()
+        token_auth_cache_stats.reset()
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(token_auth_cache_stats.as_dict()['hits'], 1)
+        self.assertEqual(token_auth_cache_stats.as_dict()['misses'], 1)
+        # the password hash is not cached
+        self.assertNotIn(self.user.password, local_token_cache.get(self.token.key)[1])
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.token.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_authority_report_list_without_auth(self):
         url = reverse('authority_report_list')
 
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def create_authority_reports(self, schools, for_date):
+        for school in schools:
+            actual_report = self.create_actual_report_with_school_for_date(school, for_date)
+            self.create_estimate_report_for_actual_report(actual_report)
+
+    def test_authority_report_list_with_auth(self):
+        url = reverse('authority_report_list')
+
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 3)
+        self.create_authority_reports(schools, date(2020, 8, 3))
+
+        other_district = District.objects.create(name='ABC')
+        other_user = CustomUser.objects.create_user(
+            username='other', email='other@gmail.com', password='Ltye$4T5')
+        other_school = School.objects.create(user=other_user, name='Other School', district=other_district)
+        self.create_authority_reports([other_school], date(2020, 8, 3))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        authority_reports = AuthorityReport.objects.filter(school__in=schools)
+        authority_report_serializer_data = AuthorityReportSerializer(authority_reports, many=True).data
+        response_data = json.loads(response.content)['results']
+        self.assertCountEqual(response_data, authority_report_serializer_data)
+
+    def test_authority_report_list_query_count_is_constant(self):
+        url = reverse('authority_report_list')
+
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 5)
+        self.create_authority_reports(schools[:1], date(2020, 8, 3))
+
+        # token lookup, authority reports, estimate items and actual items
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(json.loads(response.content)['results']), 1)
+
+        self.create_authority_reports(schools[1:], date(2020, 8, 3))
+        self.create_authority_reports(schools, date(2020, 8, 4))
+
+        # the token is now served from the authentication cache
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(json.loads(response.content)['results']), 10)
+
+    def test_authority_report_discrepancy_list_with_auth(self):
+        url = reverse('authority_report_discrepancy_list')
+
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 6)
+        estimate_counts = [45, 41, 40, 20, 0, 50]
+        for school, student_count in zip(schools, estimate_counts):
+            actual_report = self.create_actual_report_with_school_for_date(school, date(2020, 8, 3))
+            self.create_estimate_report_for_actual_report(actual_report, student_count)
+
+        # token lookup, authority reports, estimate items and actual items
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected = [report for report in AuthorityReport.objects.all() if report.is_discrepant]
+        authority_report_serializer_data = AuthorityReportSerializer(expected, many=True).data
+        response_data = json.loads(response.content)['results']
+        self.assertCountEqual(response_data, authority_report_serializer_data)
+        self.assertEqual(len(response_data), 4)
+
+    def test_district_daily_summary_list_with_auth(self):
+        url = reverse('district_daily_summary_list')
+
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 2)
+        for day in (3, 4, 5):
+            self.create_authority_reports(schools, date(2020, 8, day))
+
+        response = self.client.get(url, {'for_date__gte': '2020-08-04'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = json.loads(response.content)['results']
+        self.assertEqual([summary['for_date'] for summary in response_data], ['2020-08-05', '2020-08-04'])
+        self.assertEqual(response_data[0]['meals_served'], 90)
+        self.assertEqual(response_data[0]['estimated_student_count'], 90)
+        self.assertEqual(response_data[0]['discrepancy_count'], 0)
+
+    def test_authority_report_retrieve_of_own_school(self):
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        school = self.create_schools_reporting_to_authority(authority, 1)[0]
+        report = self.create_actual_report_with_school_for_date(school, date(2020, 8, 3))
+
+        url = reverse('school_report_retrieve', kwargs={'pk': report.pk})
+        # token, report, principal, school ownership check and items
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), SchoolReportSerializer(report).data)
+
+    def test_authority_report_retrieve_of_other_school(self):
+        self.api_authenticate()
+        self.create_authority_with_current_user()
+        other_user = CustomUser.objects.create_user(
+            username='other', email='other@gmail.com', password='Ltye$4T5')
+        other_school = School.objects.create(user=other_user, name='Other School', district=self.district)
+        report = self.create_actual_report_with_school_for_date(other_school, date(2020, 8, 3))
+
+        url = reverse('school_report_retrieve', kwargs={'pk': report.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_export_csv(self):
+        url = reverse('report_export')
+
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 2)
+        self.create_authority_reports(schools, date(2020, 8, 3))
+        self.create_authority_reports(schools, date(2020, 8, 4))
+
+        response = self.client.get(url, {'for_date__gte': '2020-08-04'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="reports.csv"')
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['for_date'] for row in rows}, {'2020-08-04'})
+        self.assertCountEqual([int(row['id']) for row in rows],
+                              Report.objects.filter(for_date=date(2020, 8, 4)).values_list('id', flat=True))
+
+    def test_report_export_in_pages_without_server_side_cursors(self):
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 2)
+        self.create_authority_reports(schools, date(2020, 8, 3))
+        self.create_authority_reports(schools, date(2020, 8, 4))
+
+        with mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}), \
+                mock.patch.object(ReportExport, 'chunk_size', 3):
+            response = self.client.get(reverse('report_export'))
+            rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+
+        self.assertEqual([int(row['id']) for row in rows], list(Report.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_report_item_and_authority_report_export_ndjson(self):
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        schools = self.create_schools_reporting_to_authority(authority, 2)
+        self.create_authority_reports(schools, date(2020, 8, 3))
+
+        response = self.client.get(reverse('report_item_export'), {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), ReportItem.objects.count())
+        self.assertEqual(set(rows[0].keys()), {'id', 'report_id', 'report__school_id', 'report__for_date', 'item'})
+        self.assertEqual({row['item'] for row in rows}, {'idly', 'dosa', 'chutney'})
+        response = self.client.get(reverse('report_item_export'), {'format': 'ndjson', 'for_date__gte': '2020-08-04'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = self.client.get(reverse('authority_report_export'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertCountEqual([row['id'] for row in rows], AuthorityReport.objects.values_list('id', flat=True))
+
+    def test_report_export_without_auth(self):
+        response = self.client.get(reverse('report_export'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_authority_report_discrepancy_list_without_auth(self):
+        url = reverse('authority_report_discrepancy_list')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_school_bulk_enroll(self):
+        self.api_authenticate()
+        authority = self.create_authority_with_current_user()
+        self.create_schools_reporting_to_authority(authority, 1)
+        rows = [
+            {'username': 'new1', 'email': 'new1@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'New 1'},
+            {'username': 'schooluser1', 'email': 'other@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'Taken'},
+            {'username': 'new2', 'email': 'new2@gmail.com', 'password': '', 'name': 'No password'},
+            {'username': 'new3', 'email': 'new1@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'Same email'},
+            {'username': 'new4', 'email': 'new4@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'New 4'},
+        ]
+
+        response = self.client.post(reverse('school_bulk_enroll'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'error', 'created'])
+        self.assertIn('username', results[1]['errors'])
+        self.assertIn('password', results[2]['errors'])
+        self.assertIn('email', results[3]['errors'])
+
+        school = School.objects.get(user__username='new1')
+        self.assertEqual((school.district_id, school.authority_id), (self.district.id, authority.pk))
+        self.assertTrue(school.user.check_password('Tv#jlI2O*F'))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + results[4]['token'])
+        response = self.client.get(reverse('school_me_retrieve_update'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'New 4')
+
+    def test_school_bulk_enroll_csv(self):
+        self.api_authenticate()
+        self.create_authority_with_current_user()
+        body = 'username,email,password,name\nnew1,new1@gmail.com,Tv#jlI2O*F,New 1\nnew2,not-an-email,Tv#jlI2O*F,New 2\n'
+
+        response = self.client.post(reverse('school_bulk_enroll'), body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertIn('email', response.data['results'][1]['errors'])
+        self.assertTrue(Token.objects.filter(user__username='new1').exists())
+
+    def test_school_bulk_enroll_normalizes_emails(self):
+        self.api_authenticate()
+        self.create_authority_with_current_user()
+        rows = [
+            {'username': 'new1', 'email': 'New1@GMAIL.com', 'password': 'Tv#jlI2O*F', 'name': 'New 1'},
+            {'username': 'new2', 'email': 'new1@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'Same email'},
+        ]
+
+        response = self.client.post(reverse('school_bulk_enroll'), rows, format='json')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertIn('email', response.data['results'][1]['errors'])
+        self.assertEqual(CustomUser.objects.get(username='new1').email, 'New1@gmail.com')
+
+    def test_school_bulk_enroll_retries_concurrent_insert(self):
+        self.api_authenticate()
+        self.create_authority_with_current_user()
+        rows = [
+            {'username': 'new1', 'email': 'new1@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'New 1'},
+            {'username': 'new2', 'email': 'new2@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'New 2'},
+        ]
+        create_schools = onboarding.create_schools
+
+        def create_after_concurrent_insert(*args):
+            # another request enrolls the first username after the check
+            if not CustomUser.objects.filter(username='new1').exists():
+                CustomUser.objects.create_user(username='new1', email='other@gmail.com', password='Tv#jlI2O*F')
+            return create_schools(*args)
+
+        with mock.patch('api.onboarding.create_schools', side_effect=create_after_concurrent_insert):
+            response = self.client.post(reverse('school_bulk_enroll'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+        self.assertIn('username', response.data['results'][0]['errors'])
+        self.assertTrue(School.objects.filter(user__username='new2').exists())
+
+    def test_school_bulk_enroll_requires_authority(self):
+        self.api_authenticate()
+        rows = [{'username': 'new1', 'email': 'new1@gmail.com', 'password': 'Tv#jlI2O*F', 'name': 'New 1'}]
+
+        response = self.client.post(reverse('school_bulk_enroll'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(CustomUser.objects.filter(username='new1').exists())
+
+    def test_hash_passwords_in_parallel(self):
+        passwords = ['password{}'.format(i) for i in range(MIN_PARALLEL_PASSWORDS)]
+
+        hashes = hash_passwords(passwords, workers=2)
+        self.assertEqual(len(hashes), len(passwords))
+        for password, encoded in zip(passwords, hashes):
+            self.assertTrue(check_password(password, encoded))
+
 
 class SchoolTests(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.district = District.objects.create(name='XYZ')
         self.user = CustomUser.objects.create_user(
             username='user1',
@@ -169,7 +514,7 @@ class SchoolTests(APITestCase):
             )
             items = ['idly', 'dosa']
             report.items.bulk_create(
-                [ReportItem(report=report, item=item) for item in items])
+                [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
             reports.append(report)
         return reports
 
@@ -189,7 +534,7 @@ class SchoolTests(APITestCase):
             Schedule.objects.create(
                 district=district, 
                 day=day, 
-                item=items[day]
+                item=menu_item(items[day])
             )
 
 
@@ -285,6 +630,58 @@ class SchoolTests(APITestCase):
                          data['student_count'])
         self.assertEqual(report.for_date, date(2020, 1, 10))
 
+    def test_school_report_create_links_estimate_report(self):
+        url = reverse('school_report_create')
+        data = {
+            'student_count': 45,
+            'for_date': '2020-01-10',
+        }
+
+        self.api_authenticate()
+        school = self.create_school_with_current_user()
+        self.create_schedule()
+        Schedule.objects.create(district=self.district, day=self.findDay(data['for_date']), item=menu_item('rice'))
+        estimate_report = Report.objects.create(school=school, student_count=44, for_date=date(2020, 1, 10))
+
+        # token, school, estimate, report insert, summary update, schedule, items insert,
+        # estimate link update and authority report insert within a savepoint
+        with self.assertNumQueries(11):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        report = Report.objects.get(added_by_school=True)
+        self.assertCountEqual([item.item.name for item in report.items.all()], ['chappati', 'rice'])
+        estimate_report.refresh_from_db()
+        self.assertEqual(estimate_report.actual_report, report)
+        authority_report = AuthorityReport.objects.get()
+        self.assertEqual(authority_report.estimate, estimate_report)
+        self.assertEqual(authority_report.actual, report)
+        self.assertFalse(authority_report.discrepant)
+
+    def test_school_report_create_reads_cached_schedule(self):
+        url = reverse('school_report_create')
+
+        self.api_authenticate()
+        self.create_school_with_current_user()
+        self.create_schedule()
+        warm_schedule_cache()
+        schedule_cache_stats.reset()
+        DistrictDailySummary.objects.create(district=self.district, for_date=date(2020, 1, 10))
+
+        # token, school, estimate, report insert, summary update and items insert within a savepoint
+        with self.assertNumQueries(8):
+            response = self.client.post(url, {'student_count': 45, 'for_date': '2020-01-10'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(schedule_cache_stats.as_dict()['hits'], 1)
+        self.assertEqual(schedule_cache_stats.as_dict()['misses'], 0)
+
+        Schedule.objects.create(district=self.district, day=self.findDay('2020-01-17'), item=menu_item('rice'))
+        response = self.client.post(url, {'student_count': 45, 'for_date': '2020-01-17'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(schedule_cache_stats.as_dict()['misses'], 1)
+        report = Report.objects.get(for_date=date(2020, 1, 17))
+        self.assertCountEqual([item.item.name for item in report.items.all()], ['chappati', 'rice'])
+
     def test_school_report_create_without_auth(self):
         url = reverse('school_report_create')
         data = {
@@ -308,9 +705,57 @@ class SchoolTests(APITestCase):
 
         report_serializer_data = SchoolReportSerializer(
             reports, many=True).data
-        response_data = json.loads(response.content)
+        response_data = json.loads(response.content)['results']
         self.assertCountEqual(response_data, report_serializer_data)
 
+    def test_school_report_list_pagination(self):
+        url = reverse('school_report_list')
+
+        self.api_authenticate()
+        school = self.create_school_with_current_user()
+        reports = self.create_reports_by_school(school, 5)
+
+        ids = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response_data = json.loads(response.content)
+            self.assertLessEqual(len(response_data['results']), 2)
+            ids.extend(report['id'] for report in response_data['results'])
+            if response_data['next'] is None:
+                break
+            response = self.client.get(response_data['next'])
+
+        # newest first, every report exactly once
+        self.assertEqual(ids, [report.id for report in reports])
+
+    def test_school_report_list_date_range_filter(self):
+        url = reverse('school_report_list')
+
+        self.api_authenticate()
+        school = self.create_school_with_current_user()
+        reports = self.create_reports_by_school(school, 5)
+
+        response = self.client.get(url, {
+            'for_date__gte': str(reports[3].for_date),
+            'for_date__lte': str(reports[1].for_date),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = json.loads(response.content)['results']
+        self.assertEqual([report['id'] for report in response_data], [report.id for report in reports[1:4]])
+
+    def test_school_report_list_invalid_filters(self):
+        url = reverse('school_report_list')
+
+        self.api_authenticate()
+        self.create_school_with_current_user()
+
+        response = self.client.get(url, {'for_date__gte': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_school_report_list_without_auth(self):
         url = reverse('school_report_list')
 
@@ -328,7 +773,7 @@ class SchoolTests(APITestCase):
         )
         items = ['idly', 'dosa', 'chutney']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
         
         url = reverse('school_report_retrieve',
                       kwargs={"pk": report.pk})
@@ -350,7 +795,7 @@ class SchoolTests(APITestCase):
         )
         items = ['idly', 'dosa', 'chutney']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
 
         url = reverse('school_report_retrieve',
                       kwargs={"pk": report.pk})
@@ -364,6 +809,7 @@ class SchoolTests(APITestCase):
 class DistrictTests(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.districts = []
         for i in range(3):
             self.districts.append(District.objects.create(
@@ -377,7 +823,7 @@ class DistrictTests(APITestCase):
 
         district_serializer_data = DistrictSerializer(
             self.districts, many=True).data
-        response_data = json.loads(response.content)
+        response_data = json.loads(response.content)['results']
         self.assertEqual(response_data, district_serializer_data)
 
 
@@ -396,9 +842,17 @@ class EstimateReportTests(APITestCase):
         )
         items = ['idly', 'dosa']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
         return report
 
+    def authenticate_authority(self):
+        user = CustomUser.objects.create_user(
+            username='authority', email='authority@gmail.com', password='Ltye$4T5', is_authority=True)
+        authority = Authority.objects.create(user=user, district=self.district)
+        authority.reassign_schools()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+        return authority
+
     def test_estimate_report_create(self):
         url = reverse('estimate_report_list_create')
         school = self.school
@@ -421,7 +875,7 @@ class EstimateReportTests(APITestCase):
         test_items_list = list(map((lambda d: d['item']), data['items']))
         for i, item in enumerate(report.items.all()):
             self.assertEqual(item.report.id, report.id)
-            self.assertTrue(item.item in test_items_list)
+            self.assertTrue(item.item.name in test_items_list)
         self.assertEqual(report.for_date, date(2020, 1, 10))
 
     def test_estimate_report_retrieve(self):
@@ -433,7 +887,7 @@ class EstimateReportTests(APITestCase):
         )
         items = ['idly', 'dosa', 'chutney']
         report.items.bulk_create(
-            [ReportItem(report=report, item=item) for item in items])
+            [ReportItem(report=report, item_id=item_id) for item_id in MenuItem.objects.get_ids(items).values()])
 
         url = reverse('estimate_report_retrieve_update',
                       kwargs={"pk": report.pk})
@@ -444,3 +898,251 @@ class EstimateReportTests(APITestCase):
         report_serializer_data = EstimateReportSerializer(report).data
         response_data = json.loads(response.content)
         self.assertEqual(response_data, report_serializer_data)
+
+    def test_estimate_report_bulk_create(self):
+        url = reverse('estimate_report_bulk_create')
+        self.authenticate_authority()
+        actual_report = Report.objects.create(
+            school=self.school, student_count=45, for_date=date(2020, 1, 10), added_by_school=True)
+        self.create_estimated_report()
+        data = [
+            {'student_count': 20, 'for_date': '2020-01-10', 'school': self.school.pk},
+            {'student_count': 40, 'for_date': '2020-01-11', 'school': self.school.pk,
+             'items': [{'item': 'idly'}, {'item': 'dosa'}]},
+            {'student_count': 40, 'for_date': '2020-01-11', 'school': self.school.pk},
+            {'student_count': 40, 'for_date': '2020-01-12', 'school': 9999},
+            {'student_count': -1, 'for_date': '2020-01-13', 'school': self.school.pk},
+        ]
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_data = json.loads(response.content)
+        self.assertEqual(response_data['created'], 1)
+        self.assertEqual(response_data['failed'], 4)
+        self.assertEqual([result['status'] for result in response_data['results']],
+                         ['error', 'created', 'error', 'error', 'error'])
+        self.assertIn('school', response_data['results'][3]['errors'])
+        self.assertIn('student_count', response_data['results'][4]['errors'])
+
+        report = Report.objects.get(pk=response_data['results'][1]['id'])
+        self.assertFalse(report.added_by_school)
+        self.assertCountEqual([item.item.name for item in report.items.all()], ['idly', 'dosa'])
+
+    def test_estimate_report_bulk_create_links_actual_reports(self):
+        url = reverse('estimate_report_bulk_create')
+        self.authenticate_authority()
+        actual_report = Report.objects.create(
+            school=self.school, student_count=45, for_date=date(2020, 1, 10), added_by_school=True)
+        data = '\n'.join(json.dumps(row) for row in [
+            {'student_count': 20, 'for_date': '2020-01-10', 'school': self.school.pk, 'items': [{'item': 'idly'}]},
+            {'student_count': 45, 'for_date': '2020-01-11', 'school': self.school.pk},
+        ])
+
+        response = self.client.post(url, data, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)['created'], 2)
+
+        estimate_report = Report.objects.get(for_date=date(2020, 1, 10), added_by_school=False)
+        self.assertEqual(estimate_report.actual_report, actual_report)
+        authority_report = AuthorityReport.objects.get()
+        self.assertEqual(authority_report.estimate, estimate_report)
+        self.assertEqual(authority_report.actual, actual_report)
+        self.assertTrue(authority_report.discrepant)
+
+    def test_estimate_report_bulk_create_rejects_non_list(self):
+        url = reverse('estimate_report_bulk_create')
+        self.authenticate_authority()
+
+        response = self.client.post(url, {'student_count': 45}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_estimate_report_bulk_create_requires_authority(self):
+        url = reverse('estimate_report_bulk_create')
+        data = [{'student_count': 20, 'for_date': '2020-01-10', 'school': self.school.pk}]
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Report.objects.exists())
+
+    def test_estimate_report_bulk_create_rejects_other_schools(self):
+        url = reverse('estimate_report_bulk_create')
+        self.authenticate_authority()
+        other_district = District.objects.create(name='ABC')
+        other_school = School.objects.create(
+            user=CustomUser.objects.create_user(username='other', email='other@gmail.com', password='Ltye$4T5'),
+            name='Other', district=other_district)
+
+        response = self.client.post(url, [
+            {'student_count': 20, 'for_date': '2020-01-10', 'school': other_school.pk},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('school', json.loads(response.content)['results'][0]['errors'])
+        self.assertFalse(Report.objects.exists())
+
+
+@override_settings(CONDITIONAL_REQUESTS={'ENABLED': True})
+class ConditionalGetTests(APITransactionTestCase):
+    # versions are bumped on commit, so the test needs real transactions
+
+    def setUp(self):
+        cache.clear()
+        self.district = District.objects.create(name='XYZ')
+        self.authority_user = CustomUser.objects.create_user(
+            username='auth', email='auth@gmail.com', password='Ltye$4T5', is_authority=True)
+        self.authority = Authority.objects.create(user=self.authority_user, district=self.district)
+        self.school_user = CustomUser.objects.create_user(
+            username='school', email='school@gmail.com', password='Ltye$4T5')
+        self.school = School.objects.create(
+            user=self.school_user, name='AAA', district=self.district, authority=self.authority)
+        self.actual = Report.objects.create(
+            school=self.school, student_count=45, for_date=date(2020, 8, 3), added_by_school=True)
+        self.estimate = Report.objects.create(
+            school=self.school, student_count=45, for_date=date(2020, 8, 3), actual_report=self.actual)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(user=user)[0].key)
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_district_list(self):
+        url = reverse('district_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        self.assertNotModified(url, etag)
+        self.district.name = 'Renamed'
+        self.district.save()
+        etag = self.assertModified(url, etag)
+        District.objects.create(name='ABC')
+        etag = self.assertModified(url, etag)
+        # the query string is part of the ETag
+        self.assertEqual(self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+    @override_settings(CONDITIONAL_REQUESTS={'ENABLED': None})
+    def test_content_etags_with_cache_per_process(self):
+        url = reverse('district_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        self.assertNotModified(url, etag)
+        # another process computes the same ETag without the cache
+        cache.clear()
+        self.assertNotModified(url, etag)
+        self.district.name = 'Renamed'
+        self.district.save()
+        cache.clear()
+        self.assertModified(url, etag)
+
+    @override_settings(CONDITIONAL_REQUESTS={'ENABLED': False})
+    def test_no_validators_when_disabled(self):
+        response = self.client.get(reverse('district_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_school_report_list(self):
+        url = reverse('school_report_list')
+        self.authenticate(self.school_user)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'no-cache, private')
+
+        # the token is cached, so only the fingerprint is queried
+        with self.assertNumQueries(1):
+            self.assertNotModified(url, etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+        self.actual.student_count = 40
+        self.actual.save()
+        etag = self.assertModified(url, etag)
+        self.assertNotModified(url, etag)
+
+    def test_authority_report_list(self):
+        url = reverse('authority_report_list')
+        self.authenticate(self.authority_user)
+        etag = self.client.get(url)['ETag']
+
+        self.assertNotModified(url, etag)
+        self.school.name = 'BBB'
+        self.school.save()
+        etag = self.assertModified(url, etag)
+        self.assertNotModified(url, etag)
+
+        self.estimate.student_count = 20
+        self.estimate.save()
+        self.assertModified(url, etag)
+
+
+@override_settings(CONDITIONAL_REQUESTS={'ENABLED': True})
+class ResponseCacheTests(APITransactionTestCase):
+    # the cached responses are invalidated on commit
+
+    def setUp(self):
+        cache.clear()
+        response_cache_stats.reset()
+        self.district = District.objects.create(name='XYZ')
+        for day, item in [(1, 'dosa'), (0, 'idly'), (0, 'egg')]:
+            Schedule.objects.create(district=self.district, day=day, item=menu_item(item))
+
+    def test_district_list_is_cached(self):
+        url = reverse('district_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response_cache_stats.as_dict()['hits'], 2)
+
+        self.district.name = 'Renamed'
+        self.district.save()
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['results'][0]['name'], 'Renamed')
+
+    def test_district_schedule_list(self):
+        url = reverse('district_schedule_list', args=[self.district.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), [
+            {'day': 0, 'item': 'idly'}, {'day': 0, 'item': 'egg'}, {'day': 1, 'item': 'dosa'}])
+        self.assertEqual(json.loads(self.client.get(url, {'day': 1}).content), [{'day': 1, 'item': 'dosa'}])
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        Schedule.objects.create(district=self.district, day=1, item=menu_item('rice'))
+        self.assertEqual(len(json.loads(self.client.get(url, {'day': 1}).content)), 2)
+        self.assertEqual(response_cache_stats.as_dict(), {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+    def test_response_cache_timeout(self):
+        self.assertEqual(response_cache_timeout(), 5)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/mdm-cache'}}):
+            self.assertEqual(response_cache_timeout(), 60 * 60)
+
+    def test_district_schedule_list_of_unknown_district(self):
+        response = self.client.get(reverse('district_schedule_list', args=[self.district.id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -6,6 +6,11 @@ urlpatterns = [
   path('authorities/me/', views.AuthorityMeRetrieveUpdate.as_view(), name='authority_me_retrieve_update'),
   path('authorities/me/reports/', views.AuthorityReportList.as_view(), name='authority_report_list'),
   path('authorities/me/reports/discrepants', views.AuthorityReportDiscrepancyList.as_view(), name='authority_report_discrepancy_list'),
+  path('authorities/me/export/reports', views.ReportExport.as_view(), name='report_export'),
+  path('authorities/me/export/report-items', views.ReportItemExport.as_view(), name='report_item_export'),
+  path('authorities/me/export/authority-reports', views.AuthorityReportExport.as_view(), name='authority_report_export'),
+  path('authorities/me/schools/bulk', views.SchoolBulkEnroll.as_view(), name='school_bulk_enroll'),
+  path('authorities/me/summaries/', views.DistrictDailySummaryList.as_view(), name='district_daily_summary_list'),
   path('schools/', views.SchoolEnroll.as_view(), name='school_enroll'),
   path('schools/me/', views.SchoolMeRetrieveUpdate.as_view(), name='school_me_retrieve_update'),
   path('schools/me/reports/', views.SchoolReportCreate.as_view(), name='school_report_create'),
@@ -13,6 +18,8 @@ urlpatterns = [
   path('schools/me/reports/<int:pk>', views.SchoolReportRetrieve.as_view(), name='school_report_retrieve'),
   # path('schools/me/reports/update/<int:pk>', views.SchoolReportUpdate.as_view(), name='school_report_update'),
   path('districts/', views.DistrictList.as_view(), name='district_list'),
+  path('districts/<int:pk>/schedule', views.DistrictScheduleList.as_view(), name='district_schedule_list'),
   path('estimate/reports/',views.EstimateReportListCreate.as_view(), name='estimate_report_list_create'),
+  path('estimate/reports/bulk', views.EstimateReportBulkCreate.as_view(), name='estimate_report_bulk_create'),
   path('estimate/reports/<int:pk>', views.EstimateReportRetrieveUpdate.as_view(), name='estimate_report_retrieve_update'),
 ]
\ No newline at end of file
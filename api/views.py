@@ -4,10 +4,26 @@ from rest_framework.views import APIView
 from rest_framework import generics
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
-from django.http import Http404
+from django.db.models import Prefetch, prefetch_related_objects
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser
+from .cache import CachedResponseMixin
+from .conditional import ConditionalListMixin, district_scope, model_scope, school_scope
+from .db import iterate_rows
+from .filters import QueryParamFilterBackend, REPORT_FILTER_LOOKUPS
+from .ingestion import bulk_create_estimate_reports
+from .metrics import render_metrics
+from .onboarding import bulk_onboard_schools
+from .parsers import CSVParser, NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .pagination import ReportKeysetPagination, DistrictKeysetPagination
 from .permissions import IsOwnerOrReadOnly, IsSchoolOwner, IsOwner
-from .serializers import SchoolReportSerializer, SchoolReportCreateSerializer, AuthoritySerializer, SchoolSerializer, DistrictSerializer, AuthorityReportSerializer, EstimateReportSerializer
-from .models import Report, School, Authority, District, AuthorityReport
+from .serializers import SchoolReportSerializer, SchoolReportCreateSerializer, AuthoritySerializer, SchoolSerializer, DistrictSerializer, AuthorityReportSerializer, EstimateReportSerializer, DistrictDailySummarySerializer, ScheduleSerializer
+from .models import Report, School, Authority, District, AuthorityReport, DistrictDailySummary, ReportItem, Schedule
 
 
 class MeRetrieveUpdate(generics.RetrieveUpdateAPIView):
@@ -15,18 +31,18 @@ class MeRetrieveUpdate(generics.RetrieveUpdateAPIView):
     RetrieveUpdateAPIView for read and update of objects with 
     logged in user.
     """
+    # the attribute of the request principal holding the object
+    principal_attribute = None
 
     def get_object(self):
         """
         Returns the object of the current logged in user.
         """
-        queryset = self.filter_queryset(self.get_queryset())
-        try:
-            obj = get_object_or_404(queryset, user=self.request.user)
-            self.check_object_permissions(self.request, obj)
-            return obj
-        except (TypeError, ValueError, ValidationError):
+        obj = getattr(self.request.principal, self.principal_attribute)
+        if obj is None:
             raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
 
 
 class AuthorityEnroll(generics.CreateAPIView):
@@ -48,24 +64,165 @@ class AuthorityMeRetrieveUpdate(MeRetrieveUpdate):
     queryset = Authority.objects.all()
     serializer_class = AuthoritySerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    principal_attribute = 'authority'
 
 
-class AuthorityReportList(generics.ListAPIView):
-    queryset = AuthorityReport.objects.all()
+class ReportItemsPrefetchMixin:
+    """
+    Prefetches the items of the reports on each page, restricted to
+    the dates of the page, so that only the partitions of those
+    months are read.
+    """
+    # the lookups from the listed objects to report items
+    item_lookups = ['items']
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page:
+            items = ReportItem.objects.filter(for_date__in={obj.for_date for obj in page})
+            prefetch_related_objects(page, *[Prefetch(lookup, queryset=items) for lookup in self.item_lookups])
+        return page
+
+
+class AuthorityScopedReportList(ReportItemsPrefetchMixin, ConditionalListMixin, generics.ListAPIView):
+    """
+    ListAPIView for authority reports of the schools under the
+    logged in authority. The whole serializer tree is loaded
+    with a fixed number of queries. Unchanged lists are answered
+    with 304 Not Modified.
+    """
+    queryset = AuthorityReport.objects.unarchived().select_related('school', 'estimate', 'actual')
+    item_lookups = ['estimate__items', 'actual__items']
     serializer_class = AuthorityReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReportKeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_lookups = REPORT_FILTER_LOOKUPS
 
+    def get_queryset(self):
+        """
+        Returns the authority reports of schools reporting to the
+        current logged in authority.
+        """
+        # Authority uses the user as its primary key
+        return super().get_queryset().filter(school__authority_id=self.request.user.id)
 
-class AuthorityReportDiscrepancyList(generics.ListAPIView):
-    queryset = AuthorityReport.objects.all()
-    serializer_class = AuthorityReportSerializer
+    def get_version_scopes(self):
+        authority = self.request.principal.authority
+        return [district_scope(authority.district_id)] if authority is not None else []
+
+
+class AuthorityReportList(AuthorityScopedReportList):
+    """
+    Lists the authority reports of the logged in authority.
+    """
+
+
+class AuthorityReportDiscrepancyList(AuthorityScopedReportList):
+    """
+    Lists the authority reports of the logged in authority whose
+    estimate and actual reports are discrepant.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().discrepant()
+
+class DistrictDailySummaryList(generics.ListAPIView):
+    """
+    Lists the daily totals of the logged in authority's district.
+    """
+    queryset = DistrictDailySummary.objects.all()
+    serializer_class = DistrictDailySummarySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReportKeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_lookups = {
+        'for_date__gte': 'for_date__gte',
+        'for_date__lte': 'for_date__lte',
+    }
+
+    def get_queryset(self):
+        # Authority uses the user as its primary key
+        return super().get_queryset().filter(district__authority=self.request.user.id)
 
-    def list(self, request):
-        queryset = self.get_queryset()
 
-        serializer = AuthorityReportSerializer([x for x in queryset if x.is_discrepant], many=True)
-        return Response(serializer.data)
+class AuthorityExport(generics.GenericAPIView):
+    """
+    Streams rows of the schools under the logged in authority as CSV
+    or NDJSON. Rows are read as tuples in chunks, without building
+    model instances, so memory stays flat for any number of rows.
+    `export_fields` has to start with the id, rows are read by it.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    filter_backends = [QueryParamFilterBackend]
+    # the lookup from the exported model to the school
+    school_lookup = 'school'
+    export_fields = []
+    # the column names, when they differ from the fields
+    export_headers = None
+    export_name = None
+    chunk_size = 2000
+
+    def get_queryset(self):
+        # Authority uses the user as its primary key
+        return super().get_queryset().filter(
+            **{'{}__authority_id'.format(self.school_lookup): self.request.user.id})
+
+    def get(self, request, *args, **kwargs):
+        rows = iterate_rows(self.filter_queryset(self.get_queryset()), self.export_fields, self.chunk_size)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream_rows(self.export_headers or self.export_fields, rows),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset),
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(self.export_name, renderer.format)
+        return response
+
+
+class ReportExport(AuthorityExport):
+    """
+    Exports the actual and estimate reports.
+    """
+    queryset = Report.objects.all()
+    export_name = 'reports'
+    export_fields = [
+        'id', 'school_id', 'for_date', 'student_count', 'added_by_school', 'actual_report_id', 'on_datetime',
+    ]
+    filter_lookups = REPORT_FILTER_LOOKUPS
+
+
+class ReportItemExport(AuthorityExport):
+    """
+    Exports the items of the actual and estimate reports.
+    """
+    queryset = ReportItem.objects.all()
+    school_lookup = 'report__school'
+    export_name = 'report_items'
+    # the items carry the date of their report, which partitions them
+    export_fields = ['id', 'report_id', 'report__school_id', 'for_date', 'item__name']
+    export_headers = ['id', 'report_id', 'report__school_id', 'report__for_date', 'item']
+    filter_lookups = {
+        'for_date__gte': 'for_date__gte',
+        'for_date__lte': 'for_date__lte',
+        'school': 'report__school',
+    }
+
+
+class AuthorityReportExport(AuthorityExport):
+    """
+    Exports the authority reports with the student counts of
+    their estimate and actual reports.
+    """
+    queryset = AuthorityReport.objects.unarchived()
+    export_name = 'authority_reports'
+    export_fields = [
+        'id', 'school_id', 'for_date', 'estimate_id', 'actual_id',
+        'estimate__student_count', 'actual__student_count', 'discrepancy_ratio', 'discrepant',
+    ]
+    filter_lookups = REPORT_FILTER_LOOKUPS
+
 
 class SchoolEnroll(generics.CreateAPIView):
     queryset = School.objects.all()
@@ -76,6 +233,38 @@ class SchoolEnroll(generics.CreateAPIView):
         return serializer.save(user=self.request.user)
 
 
+class SchoolBulkEnroll(APIView):
+    """
+    Enrolls schools in bulk into the district of the current
+    authority from a JSON array or CSV, creating their users and
+    returning their tokens along with the errors of every row.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser]
+
+    def post(self, request):
+        authority = request.principal.authority
+        if authority is None:
+            raise PermissionDenied('Only authorities can enroll schools.')
+
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of schools.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'SCHOOL_ONBOARDING', {}).get('MAX_ROWS', 5000)
+        if len(rows) > max_rows:
+            return Response({'detail': 'At most {} schools can be enrolled at once.'.format(max_rows)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_onboard_schools(authority, rows)
+        created = sum(1 for result in results if result['status'] == 'created')
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=response_status)
+
+
 class SchoolMeRetrieveUpdate(MeRetrieveUpdate):
     """
     Retrieve or update the current logged in school details.
@@ -83,6 +272,7 @@ class SchoolMeRetrieveUpdate(MeRetrieveUpdate):
     queryset = School.objects.all()
     serializer_class = SchoolSerializer
     permission_classes = [IsAuthenticated, IsOwner]
+    principal_attribute = 'school'
 
 
 class SchoolReportCreate(generics.CreateAPIView):
@@ -95,25 +285,35 @@ class SchoolReportCreate(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, IsSchoolOwner]
 
     def perform_create(self, serializer):
-        user = self.request.user
-        school = School.objects.get(user=user)
+        school = self.request.principal.school
+        if school is None:
+            raise PermissionDenied('Only schools can create reports.')
         return serializer.save(school=school)
 
 
-class SchoolReportList(generics.ListAPIView):
+class SchoolReportList(ReportItemsPrefetchMixin, ConditionalListMixin, generics.ListAPIView):
     """
     Lists all the reports created by a school.
     Request has to be initiated by the owner school.
+    Unchanged lists are answered with 304 Not Modified.
     """
-    queryset = Report.objects.all()
+    queryset = Report.objects.filter(added_by_school=True)
     serializer_class = SchoolReportSerializer
     permission_classes = [IsAuthenticated, IsSchoolOwner]
+    pagination_class = ReportKeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_lookups = {
+        'for_date__gte': 'for_date__gte',
+        'for_date__lte': 'for_date__lte',
+    }
+
+    last_modified_field = 'on_datetime'
 
-    def list(self, request):
-        queryset = self.get_queryset()
-        serializer = SchoolReportSerializer(queryset.filter(
-            school__user=request.user, added_by_school=True), many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return super().get_queryset().filter(school__user=self.request.user)
+
+    def get_version_scopes(self):
+        return [school_scope(self.request.user.id)]
 
 
 class SchoolReportRetrieve(generics.RetrieveAPIView):
@@ -126,24 +326,47 @@ class SchoolReportRetrieve(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated, IsSchoolOwner]
 
 
-class DistrictList(generics.ListAPIView):
+class DistrictList(CachedResponseMixin, ConditionalListMixin, generics.ListAPIView):
     """
     List all the districts.
+    Responses are cached until a district changes and unchanged
+    lists are answered with 304 Not Modified.
     """
     queryset = District.objects.all()
     serializer_class = DistrictSerializer
+    pagination_class = DistrictKeysetPagination
+    cache_models = [District]
+
+    def get_version_scopes(self):
+        return [model_scope(District)]
 
-class EstimateReportListCreate(generics.ListCreateAPIView):
+
+class DistrictScheduleList(CachedResponseMixin, generics.ListAPIView):
+    """
+    Lists the menu of a district for every day of the week.
+    Responses are cached until the schedule or the district changes.
+    """
+    queryset = Schedule.objects.select_related('item').order_by('day', 'id')
+    serializer_class = ScheduleSerializer
+    filter_backends = [QueryParamFilterBackend]
+    filter_lookups = {
+        'day': 'day',
+    }
+    cache_models = [District, Schedule]
+
+    def get_queryset(self):
+        district = get_object_or_404(District, pk=self.kwargs['pk'])
+        return super().get_queryset().filter(district=district)
+
+class EstimateReportListCreate(ReportItemsPrefetchMixin, generics.ListCreateAPIView):
     """
     Lists all the estimated reports.
     """
-    queryset = Report.objects.all()
+    queryset = Report.objects.filter(added_by_school=False)
     serializer_class = EstimateReportSerializer
-
-    def list(self, request):
-        queryset = self.get_queryset()
-        serializer = EstimateReportSerializer(queryset.filter(added_by_school=False), many=True)
-        return Response(serializer.data)
+    pagination_class = ReportKeysetPagination
+    filter_backends = [QueryParamFilterBackend]
+    filter_lookups = REPORT_FILTER_LOOKUPS
 
     def perform_create(self, serializer):
         return serializer.save()
@@ -152,3 +375,44 @@ class EstimateReportRetrieveUpdate(generics.RetrieveUpdateAPIView):
 
     queryset = Report.objects.filter(added_by_school=False)
     serializer_class = EstimateReportSerializer
+
+
+class EstimateReportBulkCreate(APIView):
+    """
+    Creates estimate reports in bulk from a JSON array or an
+    NDJSON stream, returning the result of every row. Only the
+    current authority can upload estimates, for its own schools.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request):
+        authority = request.principal.authority
+        if authority is None:
+            raise PermissionDenied('Only authorities can upload estimate reports.')
+
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of estimate reports.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_create_estimate_reports(rows, authority)
+        created = sum(1 for result in results if result['status'] == 'created')
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=response_status)
+
+
+def metrics(request):
+    """
+    Exposes the request histograms and cache statistics of this
+    process in the Prometheus text format to staff users and to
+    scrapers sending `METRICS_TOKEN` as a bearer token.
+    """
+    token = getattr(settings, 'REQUEST_METRICS', {}).get('METRICS_TOKEN')
+    has_token = token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer {}'.format(token))
+    if not has_token and not request.user.is_staff:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
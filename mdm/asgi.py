@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from api.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mdm.settings')
 
+# The polling endpoints in ASGI_READ_PATH are served from a bounded pool
+# of database threads, run it with e.g. `uvicorn mdm.asgi:application`.
+
 application = get_asgi_application()
+
+# the models can only be imported once the application has set up Django
+from api.cache import warm_schedule_cache_on_startup  # noqa: E402
+
+warm_schedule_cache_on_startup()
@@ -0,0 +1,59 @@
+"""
+Builds the database settings from the environment.
+
+DJANGO_DB_CONN_MAX_AGE       seconds a connection is kept open and reused
+                             across requests, 0 to close it after every
+                             request (default 60)
+DJANGO_DB_HEALTH_CHECKS      check a reused connection before each request
+                             and reconnect if the server dropped it (default on)
+DJANGO_DB_POOL_MODE          `transaction` when connecting through pgbouncer
+                             in transaction pooling mode, which cannot hold
+                             server side cursors across transactions
+DJANGO_DB_CONNECT_TIMEOUT    seconds to wait for a new connection (default 5)
+DJANGO_POSTGRES_REPLICA_HOST host of a streaming replica of the database, the
+                             list, export and summary endpoints read from it
+"""
+import os
+
+POOL_MODES = ('session', 'transaction')
+
+
+def env_flag(value, default):
+    if value is None or value == '':
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def postgres_database(env=os.environ):
+    pool_mode = env.get('DJANGO_DB_POOL_MODE') or 'session'
+    if pool_mode not in POOL_MODES:
+        raise ValueError('DJANGO_DB_POOL_MODE must be one of {}, not {}'.format(', '.join(POOL_MODES), pool_mode))
+
+    return {
+        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'NAME': env.get('DJANGO_POSTGRES_DATABASE') or 'mdm',
+        'USER': env.get('DJANGO_POSTGRES_USER') or 'mdm_user',
+        'PASSWORD': env.get('DJANGO_POSTGRES_PASSWORD') or 'InchOwiL',
+        'HOST': env.get('DJANGO_POSTGRES_HOST') or 'localhost',
+        'PORT': env.get('DJANGO_POSTGRES_PORT') or '',
+        'CONN_MAX_AGE': int(env.get('DJANGO_DB_CONN_MAX_AGE') or 60),
+        # read by api.db, Django 3.0 does not check connections itself
+        'CONN_HEALTH_CHECKS': env_flag(env.get('DJANGO_DB_HEALTH_CHECKS'), True),
+        # a named cursor outlives the transaction which pgbouncer pins
+        # the server connection for, so rows are fetched in pages instead
+        'DISABLE_SERVER_SIDE_CURSORS': pool_mode == 'transaction',
+        'OPTIONS': {
+            'connect_timeout': int(env.get('DJANGO_DB_CONNECT_TIMEOUT') or 5),
+        },
+    }
+
+
+def postgres_replica(env=os.environ):
+    """
+    The replica shares the settings of the primary but its host. The
+    tests read the primary through it.
+    """
+    database = postgres_database(env)
+    database['HOST'] = env.get('DJANGO_POSTGRES_REPLICA_HOST') or database['HOST']
+    database['TEST'] = {'MIRROR': 'default'}
+    return database
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from .database import postgres_database, postgres_replica
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -44,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.PrincipalMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,17 +82,89 @@ WSGI_APPLICATION = 'mdm.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Connections are kept open for DJANGO_DB_CONN_MAX_AGE seconds and
+# checked before reuse, see mdm/database.py for the other options.
 DATABASES = {
+    'default': postgres_database(),
+    'replica': postgres_replica(),
+}
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Safe requests to these endpoints read from one of ALIASES, which is
+# only used when DJANGO_POSTGRES_REPLICA_HOST is set and the default cache
+# is shared by the workers. After a write the client reads from the
+# primary for PIN_SECONDS, as do the ETag lists whose data changed in
+# that time.
+READ_REPLICA = {
+    'ALIASES': ['replica'] if os.environ.get('DJANGO_POSTGRES_REPLICA_HOST') else [],
+    'URL_NAMES': [
+        'authority_report_list',
+        'authority_report_discrepancy_list',
+        'district_daily_summary_list',
+        'report_export',
+        'report_item_export',
+        'authority_report_export',
+    ],
+    'APPS': ['api'],
+    'PIN_SECONDS': 5,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': os.environ.get('DJANGO_POSTGRES_DATABASE') or 'mdm',
-        'USER': os.environ.get('DJANGO_POSTGRES_USER') or 'mdm_user',
-        'PASSWORD': os.environ.get('DJANGO_POSTGRES_PASSWORD') or 'InchOwiL',
-        'HOST': os.environ.get('DJANGO_POSTGRES_HOST') or 'localhost',
-        'PORT': '',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mdm',
     }
 }
 
+# The local memory cache is per process, so signal invalidation only
+# reaches the current worker. Other workers pick up schedule changes
+# after this many seconds, unless a shared cache backend is configured.
+SCHEDULE_CACHE_TIMEOUT = 60 * 60
+
+# The list endpoints answer conditional requests unless ENABLED is False.
+# Their ETags are built from versions kept in the default cache when its
+# backend is shared by the workers, and otherwise hash the listed data.
+# ENABLED True forces the versions, e.g. for a single process with the
+# local memory cache.
+CONDITIONAL_REQUESTS = {
+    'ENABLED': None,
+}
+
+# Warmed by mdm/wsgi.py and mdm/asgi.py when the server loads the application.
+SCHEDULE_CACHE_WARM_ON_STARTUP = True
+
+# Rendered responses of the district and schedule lists are cached for at
+# most this many seconds, and are invalidated when the tables change. The
+# invalidation only reaches the other workers through a shared cache, so
+# with the local memory cache LOCAL_TIMEOUT applies instead.
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+RESPONSE_CACHE_LOCAL_TIMEOUT = 5
+
+
+# Email
+# https://docs.djangoproject.com/en/3.0/topics/email/
+
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND') or 'django.core.mail.backends.console.EmailBackend'
+
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL') or 'noreply@mdm.local'
+
+# Discrepancy alerts are delivered by the send_discrepancy_notifications
+# worker through BACKEND: api.alerts.ConsoleAlertBackend,
+# api.alerts.SMTPAlertBackend (uses the email settings above) or
+# api.alerts.WebhookAlertBackend (OPTIONS: {'url': ...}).
+DISCREPANCY_ALERTS = {
+    'BACKEND': os.environ.get('DJANGO_ALERT_BACKEND') or 'api.alerts.SMTPAlertBackend',
+    'OPTIONS': {},
+    'WORKERS': 4,
+    'MAX_QUEUE_SIZE': 1000,
+    'ENQUEUE_TIMEOUT': 5.0,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -138,7 +215,49 @@ DJOSER = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
 }
 
+# Under ASGI (mdm/asgi.py) these read-only endpoints run on a pool of
+# DB_CONCURRENCY threads. Once MAX_WAITING requests are queued or running
+# further ones are answered with 503.
+ASGI_READ_PATH = {
+    'URL_NAMES': [
+        'school_report_list',
+        'authority_report_list',
+        'authority_report_discrepancy_list',
+        'district_list',
+        'district_schedule_list',
+    ],
+    'DB_CONCURRENCY': int(os.environ.get('DJANGO_ASGI_DB_CONCURRENCY') or 10),
+    'MAX_WAITING': 1000,
+}
+
+# Bulk school enrollment. Passwords are hashed by a pool of HASH_WORKERS
+# threads shared by the requests, None uses one per CPU.
+SCHOOL_ONBOARDING = {
+    'MAX_ROWS': 5000,
+    'HASH_WORKERS': None,
+}
+
+# Per endpoint request histograms, served on /metrics to staff users and
+# to scrapers sending METRICS_TOKEN as a bearer token. Requests slower
+# than SLOW_REQUEST_MS are logged with their SQL, None disables the log.
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': int(os.environ['DJANGO_SLOW_REQUEST_MS']) if os.environ.get('DJANGO_SLOW_REQUEST_MS') else None,
+    'MAX_CAPTURED_QUERIES': 100,
+    'METRICS_TOKEN': os.environ.get('DJANGO_METRICS_TOKEN'),
+}
+
+# Tokens are cached per process for TTL seconds and, when a cache alias
+# is given, in that shared cache for SHARED_TTL seconds. Deleting a token
+# or saving its user invalidates both tiers of the current process.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE_ALIAS': None,
+    'SHARED_TTL': 300,
+}
+
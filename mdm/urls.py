@@ -16,10 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.conf.urls import url, include
+from api.views import metrics
 
 urlpatterns = [
     url(r'^api/', include('djoser.urls')),
     url(r'^api/', include('djoser.urls.authtoken')),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
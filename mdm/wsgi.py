@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mdm.settings')
 
 application = get_wsgi_application()
+
+# the models can only be imported once the application has set up Django
+from api.cache import warm_schedule_cache_on_startup  # noqa: E402
+
+warm_schedule_cache_on_startup()